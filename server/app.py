@@ -1,19 +1,100 @@
-import os
-from fastapi import FastAPI, HTTPException, Header, Query, Request
+import os, asyncio, gzip, hashlib, logging, math, time
+from collections import OrderedDict
+
+import brotli
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Header, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask, BackgroundTasks
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 # import fungsi dari modul kamu
 from myxl.api_request import (
-    get_otp, submit_otp, get_new_token,
-    get_profile, get_balance, get_family, get_package, purchase_package
+    get_otp_async, submit_otp_async,
+    get_profile_async, get_balance_async, get_package_async,
+    purchase_package_async, get_quota_details_async, settlement_unknown, upstream_flight,
+    UpstreamAuthError,
+)
+from myxl import http_client
+from myxl.codec import get_codec
+from myxl.catalog import get_family_cached
+from myxl.concurrency import gather_bounded
+from myxl.memo import family_memo
+from myxl.snapshot import catalog_snapshot
+from myxl.my_package import fetch_my_packages_async, iter_my_packages
+from myxl.paket_xut import get_package_xut_async
+from myxl.token_manager import token_manager
+from myxl.auth_guard import api_key_rejection, id_token_rejection
+from myxl.metrics import ROUTE_LATENCY, render_metrics, server_timing, start_request_timings
+from myxl.resilience import CircuitOpenError, retry_after_seconds
+from myxl.deadline import DeadlineExceeded, reset_deadline, set_deadline
+from myxl.admission import (
+    api_key_limiter, contact_limiter, inflight, otp_cooldown, retry_after, subscriber_limiter,
 )
+from myxl.idempotency import IdempotencyError, purchase_idempotency
+from myxl.jobs import job_queue
+from myxl.crawler import catalog_crawler
+from myxl.catalog_index import catalog_index
+from myxl.fleet import FLEET_MAX_ACCOUNTS, SECTIONS, FleetSummary, iter_fleet
+from myxl.jwt_util import token_fingerprint
+from myxl.jsonfast import dumps
+from myxl.log import get_logger, reset_request_id, set_request_id, setup_logging, shutdown_logging
 # kalau kamu mau pakai API_KEY default dari crypto_helper
 from myxl.crypto_helper import API_KEY as DEFAULT_MYXL_API_KEY
 
 # ---------- FastAPI setup ----------
-app = FastAPI(title="myXL Bridge API", version="1.2.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    # pilih backend codec xdata sekarang supaya salah konfigurasi gagal saat startup
+    get_codec()
+    await asyncio.to_thread(family_memo.load)
+    # snapshot katalog dibaca di background: service langsung melayani request
+    await catalog_snapshot.start()
+    await token_manager.start()
+    await job_queue.start()
+    await catalog_crawler.start()
+    # buka koneksi keep-alive ke upstream di background, startup tidak menunggu
+    warmup = asyncio.create_task(http_client.warmup())
+    yield
+    warmup.cancel()
+    await catalog_crawler.stop()
+    await job_queue.stop()
+    await token_manager.stop()
+    await catalog_snapshot.stop()
+    await http_client.aclose()
+    shutdown_logging()
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse lewat myxl.jsonfast (orjson): body langsung jadi bytes tanpa
+    encoder stdlib.
+    """
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+log = get_logger("app")
+
+app = FastAPI(
+    title="myXL Bridge API", version="1.2.0", lifespan=lifespan, default_response_class=FastJSONResponse
+)
+
+BATCH_MAX_ITEMS = int(os.getenv("MYXL_BATCH_MAX_ITEMS", "50"))
+BATCH_CONCURRENCY = int(os.getenv("MYXL_BATCH_CONCURRENCY", "8"))
+ENRICH_CONCURRENCY = int(os.getenv("MYXL_ENRICH_CONCURRENCY", "8"))
+
+# deadline default per request (detik); client bisa memperpendek lewat X-Request-Deadline
+REQUEST_DEADLINE = float(os.getenv("MYXL_REQUEST_DEADLINE", "25"))
+MAX_REQUEST_DEADLINE = float(os.getenv("MYXL_MAX_REQUEST_DEADLINE", "120"))
+ROUTE_DEADLINES = {
+    "/purchase/": float(os.getenv("MYXL_PURCHASE_DEADLINE", "45")),
+    "/packages/batch": float(os.getenv("MYXL_BATCH_DEADLINE", "40")),
+    "/my-packages": float(os.getenv("MYXL_MY_PACKAGES_DEADLINE", "40")),
+    "/fleet/": float(os.getenv("MYXL_FLEET_DEADLINE", "120")),
+}
 
 # Origins yang diizinkan untuk CORS
 allowed_origins = {"http://localhost:5173", "http://127.0.0.1:5173"}
@@ -23,11 +104,194 @@ if os.getenv("WEB_ORIGIN"):
         if item:
             allowed_origins.add(item)
 
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request: Request, exc: CircuitOpenError):
+    # upstream sedang dianggap mati: gagal cepat, jangan tunggu timeout
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Upstream {exc.upstream} sedang tidak tersedia, coba lagi nanti."},
+        headers={"Retry-After": str(retry_after_seconds(exc))},
+    )
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": f"Deadline request terlewati: {exc}"})
+
+def request_budget(request: Request) -> float:
+    """
+    Budget waktu request dalam detik. X-Request-Deadline boleh berisi epoch
+    (detik atau milidetik) atau sisa waktu relatif dalam detik; nilai yang
+    tidak valid atau tidak hingga (nan, inf, 1e400) diabaikan. Tidak pernah
+    melebihi MYXL_MAX_REQUEST_DEADLINE.
+    """
+    budget = REQUEST_DEADLINE
+    for prefix, seconds in ROUTE_DEADLINES.items():
+        if request.url.path.startswith(prefix):
+            budget = seconds
+            break
+
+    header = request.headers.get("x-request-deadline")
+    if header:
+        try:
+            value = float(header)
+        except ValueError:
+            value = None
+        if value is not None and math.isfinite(value):
+            if value > 1e12:
+                value = value / 1000 - time.time()
+            elif value > 1e9:
+                value = value - time.time()
+            budget = value
+    return min(budget, MAX_REQUEST_DEADLINE)
+
+@app.middleware("http")
+async def deadline_middleware(request: Request, call_next):
+    # semua hop upstream di request ini hanya mendapat sisa budget; kalau budget
+    # habis, pekerjaan yang masih jalan dibatalkan dan client dapat 504
+    budget = request_budget(request)
+    if budget <= 0:
+        return JSONResponse(status_code=504, content={"detail": "Deadline request sudah lewat."})
+    token = set_deadline(budget)
+    try:
+        async with asyncio.timeout(budget):
+            return await call_next(request)
+    except TimeoutError:
+        return JSONResponse(status_code=504, content={"detail": "Deadline request terlewati."})
+    finally:
+        reset_deadline(token)
+
+# endpoint operasional tidak ikut dibatasi supaya tetap bisa dipantau saat penuh
+ADMISSION_EXEMPT = {"/health", "/metrics", "/metrics/coalesce"}
+
+def subscriber_rate_key(request: Request, id_token: str) -> str:
+    """
+    Bucket subscriber: subject dari token manager kalau id_token dikenal,
+    selain itu IP client. Claim `sub` tidak diverifikasi, jadi tidak dipakai:
+    siapa pun bisa memalsukannya untuk menghabiskan bucket orang lain, dan
+    token acak per request tidak boleh mendapat bucket baru tiap kali.
+    """
+    subject = token_manager.subject_for(id_token)
+    if subject:
+        return subject
+    return f"ip:{request.client.host if request.client else '-'}"
+
+def rate_limit_wait(request: Request) -> Optional[float]:
+    """
+    Cek token bucket subscriber lalu API key. Return detik tunggu kalau
+    ditolak. API key hanya dibatasi kalau client mengirimnya sendiri; request
+    tanpa key memakai key default bersama dan cukup dibatasi per subscriber.
+    """
+    auth = request.headers.get("authorization") or ""
+    id_token = request.query_params.get("id_token")
+    if not id_token and auth.lower().startswith("bearer "):
+        id_token = auth.split(" ", 1)[1].strip()
+    if id_token:
+        wait = subscriber_limiter.acquire(subscriber_rate_key(request, id_token))
+        if wait is not None:
+            return wait
+
+    api_key = request.headers.get("x_api_key") or request.headers.get("x-api-key")
+    if api_key:
+        return api_key_limiter.acquire(token_fingerprint(api_key))
+    return None
+
+def _chain_background(background: Optional[BackgroundTask], fn) -> BackgroundTasks:
+    tasks = BackgroundTasks()
+    if background is not None:
+        tasks.add_task(background)
+    tasks.add_task(fn)
+    return tasks
+
+@app.middleware("http")
+async def admission_middleware(request: Request, call_next):
+    if request.url.path in ADMISSION_EXEMPT:
+        return await call_next(request)
+    if not inflight.try_acquire():
+        return JSONResponse(
+            status_code=503, content={"detail": "Server sedang penuh, coba lagi."}, headers={"Retry-After": "1"}
+        )
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            inflight.release()
+
+    response = None
+    try:
+        wait = rate_limit_wait(request)
+        if wait is not None:
+            return JSONResponse(
+                status_code=429, content={"detail": "Terlalu banyak request."}, headers={"Retry-After": retry_after(wait)}
+            )
+        response = await call_next(request)
+        # body (NDJSON/SSE) masih diproduksi setelah header dikirim: slot baru
+        # dilepas saat body selesai, atau lewat background kalau client putus
+        body = response.body_iterator
+
+        async def body_then_release():
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                release()
+
+        response.body_iterator = body_then_release()
+        response.background = _chain_background(response.background, release)
+        return response
+    finally:
+        if response is None:
+            release()
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    # latency per route + header Server-Timing berisi waktu tiap hop upstream
+    timings = start_request_timings()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        total = time.perf_counter() - start
+        route = request.scope.get("route")
+        ROUTE_LATENCY.observe(
+            total, route=getattr(route, "path", "unmatched"), method=request.method, status=status
+        )
+    response.headers["Server-Timing"] = server_timing(timings, total)
+    return response
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    # id korelasi untuk semua log request ini (lihat myxl.log); paling luar
+    # supaya log dari middleware lain juga membawanya
+    rid, token = set_request_id(request.headers.get("x-request-id"))
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+        response.headers["X-Request-Id"] = rid
+        level = logging.WARNING if response.status_code >= 500 else logging.DEBUG
+        log.log(level, "request", extra={
+            "method": request.method, "path": request.url.path, "status": response.status_code,
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        })
+        return response
+    except Exception:
+        log.exception("unhandled error", extra={"method": request.method, "path": request.url.path})
+        raise
+    finally:
+        reset_request_id(token)
+
+# CORS didaftarkan terakhir supaya jadi middleware paling luar: respons yang
+# dibuat middleware lain (429/503 admission, 504 deadline) juga membawa
+# Access-Control-Allow-Origin dan Retry-After yang bisa dibaca browser
 app.add_middleware(
     CORSMiddleware,
     allow_origins=list(allowed_origins),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Cache", "X-Refreshed-Id-Token", "X-Refreshed-Access-Token", "Server-Timing", "Retry-After", "X-OTP-Cooldown", "ETag", "X-Request-Id", "Idempotent-Replayed"],
 )
 
 # ---------- Schemas ----------
@@ -45,6 +309,26 @@ class TokensBody(BaseModel):
     access_token: str
     id_token: str
 
+class PackageBatchBody(BaseModel):
+    package_option_codes: List[str]
+
+class PurchaseJobBody(TokensBody):
+    package_option_code: str
+
+class FleetAccount(BaseModel):
+    id_token: str
+    access_token: Optional[str] = None
+    label: Optional[str] = None  # dikembalikan apa adanya untuk mengenali akun
+
+class FleetBody(BaseModel):
+    accounts: List[FleetAccount]
+    include: List[str] = ["balance", "quotas"]
+
+class JobBatchBody(BaseModel):
+    jobs: List[PurchaseJobBody]
+    run_at: Optional[float] = None  # epoch detik; kosong = secepatnya
+    max_attempts: Optional[int] = None
+
 # ---------- Helpers ----------
 def resolve_myxl_key(x_api_key: Optional[str]) -> str:
     """
@@ -53,7 +337,11 @@ def resolve_myxl_key(x_api_key: Optional[str]) -> str:
     2) ENV MYXL_API_KEY (jika diset di hosting)
     3) DEFAULT_MYXL_API_KEY dari crypto_helper
     """
-    return x_api_key or os.getenv("MYXL_API_KEY") or DEFAULT_MYXL_API_KEY
+    key = x_api_key or os.getenv("MYXL_API_KEY") or DEFAULT_MYXL_API_KEY
+    reason = api_key_rejection(key)
+    if reason:
+        raise HTTPException(401, reason)
+    return key
 
 def get_id_token_from_request(request: Request, id_token_qs: Optional[str]) -> str:
     """
@@ -67,13 +355,45 @@ def get_id_token_from_request(request: Request, id_token_qs: Optional[str]) -> s
         return auth.split(" ", 1)[1].strip()
     raise HTTPException(401, "id_token missing (supply ?id_token=... or Authorization: Bearer <id_token>)")
 
+REFRESHED_ID_TOKEN_HEADER = "X-Refreshed-Id-Token"
+REFRESHED_ACCESS_TOKEN_HEADER = "X-Refreshed-Access-Token"
+
+async def managed_tokens(response: Response, id_token: str, access_token: Optional[str] = None) -> dict:
+    """
+    Kalau id_token dikenal token manager, pakai token set terbarunya (sudah
+    di-refresh kalau hampir kedaluwarsa) dan kirim token baru ke client lewat
+    header X-Refreshed-*, supaya client tidak perlu siklus 401 -> refresh -> retry.
+    """
+    tokens = {"id_token": id_token, "access_token": access_token}
+    current = await token_manager.current_tokens(id_token)
+    if current and current["id_token"] != id_token:
+        tokens = {"id_token": current["id_token"], "access_token": current.get("access_token") or access_token}
+        response.headers[REFRESHED_ID_TOKEN_HEADER] = current["id_token"]
+        if current.get("access_token"):
+            response.headers[REFRESHED_ACCESS_TOKEN_HEADER] = current["access_token"]
+
+    # token kedaluwarsa / baru ditolak upstream: tolak di sini tanpa hop upstream
+    reason = id_token_rejection(tokens["id_token"])
+    if reason:
+        raise HTTPException(401, reason)
+    return tokens
+
+async def resolve_session(
+    request: Request, response: Response, id_token_qs: Optional[str], access_token: Optional[str] = None
+) -> dict:
+    return await managed_tokens(response, get_id_token_from_request(request, id_token_qs), access_token)
+
+def refreshed_headers(response: Response) -> dict:
+    names = (REFRESHED_ID_TOKEN_HEADER.lower(), REFRESHED_ACCESS_TOKEN_HEADER.lower())
+    return {k: v for k, v in response.headers.items() if k.lower() in names}
+
 # ---------- Health & Root ----------
 @app.get("/health")
-def health():
+async def health():
     return {"ok": True}
 
 @app.get("/")
-def root():
+async def root():
     return {
         "service": "myXL Bridge API",
         "version": "1.2.0",
@@ -81,143 +401,572 @@ def root():
         "health": "/health"
     }
 
+@app.get("/metrics/coalesce")
+async def coalesce_metrics():
+    return upstream_flight.stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    coalesce = upstream_flight.stats()
+    extra = [
+        "# HELP myxl_coalesce_inflight Panggilan upstream yang sedang berjalan (single-flight).",
+        "# TYPE myxl_coalesce_inflight gauge",
+        f"myxl_coalesce_inflight {coalesce['inflight']}",
+        "# HELP myxl_coalesce_calls_total Panggilan upstream per label single-flight.",
+        "# TYPE myxl_coalesce_calls_total counter",
+    ]
+    for label, stat in sorted(coalesce["by_label"].items()):
+        extra.append(f'myxl_coalesce_calls_total{{label="{label}"}} {stat["calls"]}')
+    extra += [
+        "# HELP myxl_coalesce_coalesced_total Request yang menumpang panggilan yang sedang berjalan.",
+        "# TYPE myxl_coalesce_coalesced_total counter",
+    ]
+    for label, stat in sorted(coalesce["by_label"].items()):
+        extra.append(f'myxl_coalesce_coalesced_total{{label="{label}"}} {stat["coalesced"]}')
+    extra += [
+        "# HELP myxl_breaker_open Status circuit breaker per upstream (1 = open/half-open).",
+        "# TYPE myxl_breaker_open gauge",
+    ]
+    for upstream, state in sorted(http_client.breaker_states().items()):
+        extra.append(f'myxl_breaker_open{{upstream="{upstream}"}} {int(state["state"] != "closed")}')
+    extra += [
+        "# HELP myxl_jobs_queued Job pembelian yang menunggu giliran atau jadwal.",
+        "# TYPE myxl_jobs_queued gauge",
+        f"myxl_jobs_queued {job_queue.stats()['queued']}",
+    ]
+    return PlainTextResponse(render_metrics(extra), media_type="text/plain; version=0.0.4")
+
 # ---------- Auth / OTP ----------
+def admit_contact(action: str, contact: str):
+    wait = contact_limiter.acquire(f"{action}:{contact}")
+    if wait is not None:
+        raise HTTPException(429, "Terlalu banyak percobaan untuk nomor ini.", headers={"Retry-After": retry_after(wait)})
+
 @app.post("/auth/otp")
-def route_get_otp(body: ContactBody):
-    sid = get_otp(body.contact)
+async def route_get_otp(response: Response, body: ContactBody):
+    # OTP yang baru dikirim masih berlaku: jawab lokal, jangan minta CIAM kirim ulang
+    cached = otp_cooldown.get(body.contact)
+    if cached:
+        sid, left = cached
+        response.headers["X-OTP-Cooldown"] = retry_after(left)
+        return {"subscriber_id": sid}
+
+    admit_contact("otp", body.contact)
+    sid = await upstream_flight.do(("otp", body.contact), lambda: get_otp_async(body.contact), label="otp")
     if not sid:
         raise HTTPException(400, "Gagal meminta OTP (cek nomor atau rate limit).")
+    otp_cooldown.set(body.contact, sid)
     return {"subscriber_id": sid}
 
 @app.post("/auth/token")
-def route_submit_otp(body: OTPBody):
-    tokens = submit_otp(body.contact, body.code)
+async def route_submit_otp(body: OTPBody):
+    admit_contact("login", body.contact)
+    tokens = await submit_otp_async(body.contact, body.code)
     if not tokens:
         raise HTTPException(400, "OTP salah/kadaluarsa atau format salah.")
+    # OTP sudah terpakai; request OTP berikutnya harus ke CIAM lagi
+    otp_cooldown.clear(body.contact)
+    token_manager.remember(tokens)
     return tokens
 
 @app.post("/auth/token/refresh")
-def route_refresh_token(body: RefreshBody):
+async def route_refresh_token(body: RefreshBody):
     try:
-        tokens = get_new_token(body.refresh_token)
+        tokens = await token_manager.refresh(body.refresh_token)
         return tokens
+    except (CircuitOpenError, DeadlineExceeded):
+        raise
     except Exception as e:
         raise HTTPException(400, f"Gagal refresh token: {e}")
 
 # ---------- Profile / Balance ----------
 @app.get("/profile")
-def route_profile(
+async def route_profile(
     request: Request,
+    response: Response,
     access_token: str = Query(...),
     id_token: Optional[str] = Query(None),
     x_api_key: Optional[str] = Header(default=None, convert_underscores=False),
 ):
     myxl_key = resolve_myxl_key(x_api_key)
-    idt = get_id_token_from_request(request, id_token)
+    tokens = await resolve_session(request, response, id_token, access_token)
 
     try:
-        data = get_profile(myxl_key, access_token, idt)
+        data = await get_profile_async(myxl_key, tokens["access_token"], tokens["id_token"])
         if data is None:
             raise HTTPException(401, "Unauthorized (token expired/invalid or API key invalid)")
         return data
-    except HTTPException:
+    except (HTTPException, CircuitOpenError, DeadlineExceeded):
         raise
-    except Exception as e:
-        import traceback
-        print("[/profile] internal error:", e)
-        traceback.print_exc()
+    except Exception:
+        log.exception("/profile internal error")
         raise HTTPException(502, "Downstream error")
 
 @app.get("/balance")
-def route_balance(
+async def route_balance(
     request: Request,
+    response: Response,
     id_token: Optional[str] = Query(None),
     x_api_key: Optional[str] = Header(default=None, convert_underscores=False),
 ):
     myxl_key = resolve_myxl_key(x_api_key)
-    idt = get_id_token_from_request(request, id_token)
+    tokens = await resolve_session(request, response, id_token)
 
     try:
-        bal = get_balance(myxl_key, idt)
+        bal = await get_balance_async(myxl_key, tokens["id_token"])
         if not bal:
             raise HTTPException(401, "Unauthorized / token expired / API key invalid")
         return bal
-    except HTTPException:
+    except (HTTPException, CircuitOpenError, DeadlineExceeded):
         raise
-    except Exception as e:
-        import traceback
-        print("[/balance] internal error:", e)
-        traceback.print_exc()
+    except Exception:
+        log.exception("/balance internal error")
+        raise HTTPException(502, "Downstream error")
+
+# ---------- Dashboard ----------
+def _section(result, name: str) -> dict:
+    if isinstance(result, (CircuitOpenError, DeadlineExceeded)):
+        return {"ok": False, "error": str(result)}
+    if isinstance(result, Exception):
+        log.error("/dashboard %s internal error", name, exc_info=result)
+        return {"ok": False, "error": "Downstream error"}
+    if result is None:
+        return {"ok": False, "error": "Unauthorized / token expired / API key invalid"}
+    return {"ok": True, "data": result}
+
+@app.get("/dashboard")
+async def route_dashboard(
+    request: Request,
+    response: Response,
+    access_token: str = Query(...),
+    id_token: Optional[str] = Query(None),
+    x_api_key: Optional[str] = Header(default=None, convert_underscores=False),
+):
+    """
+    Profile, balance dan quota dalam satu round trip; ketiganya diambil paralel.
+    Bagian yang gagal ditandai ok=false tanpa menggagalkan yang lain.
+    """
+    myxl_key = resolve_myxl_key(x_api_key)
+    tokens = await resolve_session(request, response, id_token, access_token)
+    idt = tokens["id_token"]
+
+    profile, balance, quotas = await asyncio.gather(
+        get_profile_async(myxl_key, tokens["access_token"], idt),
+        get_balance_async(myxl_key, idt),
+        get_quota_details_async(myxl_key, idt),
+        return_exceptions=True,
+    )
+    sections = {
+        "profile": _section(profile, "profile"),
+        "balance": _section(balance, "balance"),
+        "quotas": _section(quotas, "quotas"),
+    }
+
+    if not any(section["ok"] for section in sections.values()):
+        if all(isinstance(result, (CircuitOpenError, DeadlineExceeded)) for result in (profile, balance, quotas)):
+            raise profile
+        if all(result is None for result in (profile, balance, quotas)):
+            raise HTTPException(401, "Unauthorized (token expired/invalid or API key invalid)")
         raise HTTPException(502, "Downstream error")
 
+    sections["partial"] = not all(section["ok"] for section in sections.values())
+    return sections
+
+# ---------- Conditional GET / compression ----------
+COMPRESS_MIN_BYTES = int(os.getenv("MYXL_COMPRESS_MIN_BYTES", "1024"))
+ENCODED_CACHE_SIZE = int(os.getenv("MYXL_ENCODED_CACHE_SIZE", "256"))
+
+# (hash payload, encoding) -> body terkompresi; katalog yang sama dikirim berulang kali
+_encoded_bodies: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+def _accepted_encodings(header: Optional[str]) -> dict:
+    accepted = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+def negotiate_encoding(header: Optional[str]) -> Optional[str]:
+    accepted = _accepted_encodings(header)
+    for encoding in ("br", "gzip"):
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+def _encode(body: bytes, digest: str, encoding: str) -> bytes:
+    key = (digest, encoding)
+    encoded = _encoded_bodies.get(key)
+    if encoded is None:
+        encoded = brotli.compress(body, quality=5) if encoding == "br" else gzip.compress(body, compresslevel=6)
+        _encoded_bodies[key] = encoded
+        while len(_encoded_bodies) > ENCODED_CACHE_SIZE:
+            _encoded_bodies.popitem(last=False)
+    else:
+        _encoded_bodies.move_to_end(key)
+    return encoded
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+def catalog_response(request: Request, response: Response, data) -> Response:
+    """
+    JSON katalog dengan ETag kuat (hash payload, ditambah content-coding
+    seperti `"<hash>-br"` karena tiap representasi beda byte), 304 untuk
+    If-None-Match yang cocok, dan kompresi br/gzip sesuai Accept-Encoding.
+    Header yang sudah dipasang di `response` (X-Cache, token refresh) ikut
+    terbawa.
+    """
+    body = dumps(data)
+    digest = hashlib.sha256(body).hexdigest()[:32]
+    encoding = negotiate_encoding(request.headers.get("accept-encoding")) if len(body) >= COMPRESS_MIN_BYTES else None
+    etag = f'"{digest}-{encoding}"' if encoding else f'"{digest}"'
+    headers = {"ETag": etag, "Vary": "Accept-Encoding, Authorization", "Cache-Control": "private, no-cache"}
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        result = Response(status_code=304, headers=headers)
+    else:
+        if encoding:
+            body = _encode(body, digest, encoding)
+            headers["Content-Encoding"] = encoding
+        result = Response(content=body, media_type="application/json", headers=headers)
+
+    for name, value in response.headers.items():
+        if name.lower() not in ("content-length", "content-type"):
+            result.headers[name] = value
+    return result
+
 # ---------- Packages ----------
 @app.get("/packages/family/{family_code}")
-def route_get_family(
+async def route_get_family(
     request: Request,
+    response: Response,
     family_code: str,
     access_token: str = Query(...),
     id_token: Optional[str] = Query(None),
     x_api_key: Optional[str] = Header(default=None, convert_underscores=False),
 ):
     myxl_key = resolve_myxl_key(x_api_key)
-    idt = get_id_token_from_request(request, id_token)
-    tokens = {"access_token": access_token, "id_token": idt}
+    tokens = await resolve_session(request, response, id_token, access_token)
 
     try:
-        data = get_family(myxl_key, tokens, family_code)
+        data, cache_status = await get_family_cached(myxl_key, tokens, family_code)
+        response.headers["X-Cache"] = cache_status
         if data is None:
             raise HTTPException(401, f"Failed to get family {family_code} (token/API key)")
-        return data
-    except HTTPException:
+        return catalog_response(request, response, data)
+    except (HTTPException, CircuitOpenError, DeadlineExceeded):
         raise
-    except Exception as e:
-        import traceback
-        print("[/packages/family] internal error:", e)
-        traceback.print_exc()
+    except UpstreamAuthError as e:
+        raise HTTPException(e.status_code, f"Failed to get family {family_code} (token/API key)")
+    except Exception:
+        log.exception("/packages/family internal error")
         raise HTTPException(502, "Downstream error")
 
+# harus sebelum /packages/{package_option_code}
+@app.get("/packages/search")
+async def route_search_packages(
+    q: Optional[str] = Query(None, max_length=100),
+    max_price: Optional[float] = Query(None, ge=0),
+    min_price: Optional[float] = Query(None, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """
+    Cari paket di index katalog (nama, kode opsi, rentang harga) tanpa
+    memanggil upstream. Index diisi crawler katalog dan family yang pernah
+    diambil lewat /packages/family/{code}.
+    """
+    result = catalog_index.search(q=q, max_price=max_price, min_price=min_price, limit=limit)
+    return {**result, "crawler": catalog_crawler.stats()}
+
 @app.get("/packages/{package_option_code}")
-def route_get_package(
+async def route_get_package(
     request: Request,
+    response: Response,
     package_option_code: str,
     id_token: Optional[str] = Query(None),
     x_api_key: Optional[str] = Header(default=None, convert_underscores=False),
 ):
     myxl_key = resolve_myxl_key(x_api_key)
-    idt = get_id_token_from_request(request, id_token)
-    tokens = {"id_token": idt}
+    tokens = await resolve_session(request, response, id_token)
 
     try:
-        data = get_package(myxl_key, tokens, package_option_code)
+        data = await get_package_async(myxl_key, tokens, package_option_code)
         if data is None:
             raise HTTPException(401, f"Failed to get package {package_option_code} (token/API key)")
         return data
-    except HTTPException:
+    except (HTTPException, CircuitOpenError, DeadlineExceeded):
         raise
-    except Exception as e:
-        import traceback
-        print("[/packages/detail] internal error:", e)
-        traceback.print_exc()
+    except Exception:
+        log.exception("/packages/detail internal error")
+        raise HTTPException(502, "Downstream error")
+
+@app.post("/packages/batch")
+async def route_get_packages_batch(
+    request: Request,
+    response: Response,
+    body: PackageBatchBody,
+    id_token: Optional[str] = Query(None),
+    x_api_key: Optional[str] = Header(default=None, convert_underscores=False),
+):
+    """
+    Detail banyak paket sekaligus. Diambil paralel (maks MYXL_BATCH_CONCURRENCY
+    sekaligus); kegagalan satu paket hanya menandai item itu.
+    """
+    myxl_key = resolve_myxl_key(x_api_key)
+    tokens = await resolve_session(request, response, id_token)
+
+    codes = body.package_option_codes
+    if not codes:
+        raise HTTPException(400, "package_option_codes kosong")
+    if len(codes) > BATCH_MAX_ITEMS:
+        raise HTTPException(400, f"Maksimal {BATCH_MAX_ITEMS} package_option_codes per batch")
+
+    results = await gather_bounded(
+        codes, lambda code: get_package_async(myxl_key, tokens, code), BATCH_CONCURRENCY
+    )
+
+    items = []
+    for code, data in zip(codes, results):
+        if isinstance(data, Exception):
+            log.error("/packages/batch %s internal error", code, exc_info=data)
+            items.append({"package_option_code": code, "ok": False, "error": "Downstream error"})
+        elif data is None:
+            items.append({"package_option_code": code, "ok": False, "error": "Failed to get package (token/API key)"})
+        else:
+            items.append({"package_option_code": code, "ok": True, "data": data})
+
+    succeeded = sum(1 for item in items if item["ok"])
+    return {"items": items, "succeeded": succeeded, "failed": len(items) - succeeded}
+
+# ---------- My packages / XUT ----------
+def stream_items(items, mode: str, headers: Optional[dict] = None) -> StreamingResponse:
+    """
+    Kirim item dari async iterator satu per satu: NDJSON (satu JSON per baris)
+    atau SSE (event `item`, ditutup event `done`).
+    """
+    async def ndjson():
+        async for item in items:
+            yield dumps(item) + b"\n"
+
+    async def sse():
+        async for item in items:
+            yield b"event: item\ndata: " + dumps(item) + b"\n\n"
+        yield b"event: done\ndata: {}\n\n"
+
+    headers = dict(headers or {})
+    if mode == "sse":
+        headers["Cache-Control"] = "no-cache"
+        return StreamingResponse(sse(), media_type="text/event-stream", headers=headers)
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson", headers=headers)
+
+@app.get("/my-packages")
+async def route_my_packages(
+    request: Request,
+    response: Response,
+    id_token: Optional[str] = Query(None),
+    stream: Optional[str] = Query(None, pattern="^(ndjson|sse)$"),
+    x_api_key: Optional[str] = Header(default=None, convert_underscores=False),
+):
+    """
+    Paket aktif milik user. Dengan ?stream=ndjson atau ?stream=sse tiap paket
+    dikirim begitu family code-nya selesai dicari.
+    """
+    myxl_key = resolve_myxl_key(x_api_key)
+    tokens = await resolve_session(request, response, id_token)
+
+    try:
+        if stream:
+            quotas = await get_quota_details_async(myxl_key, tokens["id_token"])
+            if quotas is None:
+                raise HTTPException(401, "Failed to fetch packages (token/API key)")
+            items = iter_my_packages(myxl_key, tokens, quotas, ENRICH_CONCURRENCY)
+            return stream_items(items, stream, headers=refreshed_headers(response))
+
+        packages = await fetch_my_packages_async(myxl_key, tokens, ENRICH_CONCURRENCY)
+        if packages is None:
+            raise HTTPException(401, "Failed to fetch packages (token/API key)")
+        return packages
+    except (HTTPException, CircuitOpenError, DeadlineExceeded):
+        raise
+    except Exception:
+        log.exception("/my-packages internal error")
+        raise HTTPException(502, "Downstream error")
+
+@app.get("/xut-packages")
+async def route_xut_packages(
+    request: Request,
+    response: Response,
+    id_token: Optional[str] = Query(None),
+    x_api_key: Optional[str] = Header(default=None, convert_underscores=False),
+):
+    myxl_key = resolve_myxl_key(x_api_key)
+    tokens = await resolve_session(request, response, id_token)
+
+    try:
+        packages, cache_status = await get_package_xut_async(myxl_key, tokens)
+        response.headers["X-Cache"] = cache_status
+        if packages is None:
+            raise HTTPException(401, "Failed to get XUT packages (token/API key)")
+        return catalog_response(request, response, packages)
+    except (HTTPException, CircuitOpenError, DeadlineExceeded):
+        raise
+    except UpstreamAuthError as e:
+        raise HTTPException(e.status_code, "Failed to get XUT packages (token/API key)")
+    except Exception:
+        log.exception("/xut-packages internal error")
         raise HTTPException(502, "Downstream error")
 
 # ---------- Purchase ----------
 @app.post("/purchase/{package_option_code}")
-def route_purchase(
+async def route_purchase(
+    response: Response,
     package_option_code: str,
     body: TokensBody,
+    reuse_detail: bool = Query(True),
     x_api_key: Optional[str] = Header(default=None, convert_underscores=False),
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
 ):
+    """
+    reuse_detail=true (default) memakai detail paket yang baru diambil lewat
+    /packages/{code} atau /packages/batch, sehingga pembelian langsung mulai
+    dari payment-option. Waktu tiap tahap ada di header Server-Timing.
+
+    Dengan header Idempotency-Key, request ulang dengan key yang sama ikut
+    menunggu pembelian yang masih berjalan atau langsung mendapat hasil yang
+    tersimpan (header Idempotent-Replayed: true); lihat myxl.idempotency.
+    Settlement yang sudah terkirim tapi hasilnya tidak diketahui dijawab
+    502/504 dengan "outcome": "unknown" dan ikut dicatat untuk key tersebut.
+    """
     myxl_key = resolve_myxl_key(x_api_key)
-    tokens = {"access_token": body.access_token, "id_token": body.id_token}
-    try:
-        result = purchase_package(myxl_key, tokens, package_option_code)
+    tokens = await managed_tokens(response, body.id_token, body.access_token)
+
+    async def purchase():
+        # raise = gagal sebelum settlement terkirim, key dilepas dan boleh
+        # diulang; return = hasil yang dicatat untuk key ini
+        try:
+            result = await purchase_package_async(myxl_key, tokens, package_option_code, reuse_detail=reuse_detail)
+        except (HTTPException, CircuitOpenError, DeadlineExceeded):
+            raise
+        except Exception:
+            log.exception("/purchase internal error")
+            raise HTTPException(502, "Downstream error")
         if not result:
             raise HTTPException(502, "Gagal melakukan pembelian.")
-        return result
-    except HTTPException:
-        raise
-    except Exception as e:
-        import traceback
-        print("[/purchase] internal error:", e)
-        traceback.print_exc()
-        raise HTTPException(502, "Downstream error")
+        if settlement_unknown(result):
+            # settlement sudah terkirim: jangan sampai diulang dengan key yang sama
+            return (504 if result.get("deadline") else 502), {
+                "detail": "Status pembelian tidak diketahui; cek riwayat transaksi sebelum mencoba lagi.",
+                "outcome": "unknown", "result": result,
+            }
+        return 200, result
+
+    replayed = False
+    if idempotency_key is None:
+        # task terpisah: deadline middleware boleh memutus respons ke client,
+        # tapi settlement yang sudah terkirim dibiarkan selesai
+        status, content = await asyncio.shield(asyncio.ensure_future(purchase()))
+    else:
+        try:
+            (status, content), replayed = await purchase_idempotency.run(
+                token_manager.scope(body.id_token), idempotency_key, package_option_code, purchase
+            )
+        except IdempotencyError as e:
+            raise HTTPException(e.status_code, e.detail)
+
+    headers = refreshed_headers(response)
+    if replayed:
+        headers["Idempotent-Replayed"] = "true"
+    return FastJSONResponse(status_code=status, content=content, headers=headers)
+
+# ---------- Fleet ----------
+@app.post("/fleet/poll")
+async def route_fleet_poll(
+    body: FleetBody,
+    summary: bool = Query(False),
+    stream: str = Query("ndjson", pattern="^(ndjson|sse)$"),
+    x_api_key: Optional[str] = Header(default=None, convert_underscores=False),
+):
+    """
+    Balance dan quota-details untuk banyak akun sekaligus. Default: satu
+    baris NDJSON (atau event SSE) per akun begitu selesai, ditutup baris
+    ringkasan. ?summary=true hanya mengembalikan ringkasannya.
+    """
+    myxl_key = resolve_myxl_key(x_api_key)
+    if not body.accounts or len(body.accounts) > FLEET_MAX_ACCOUNTS:
+        raise HTTPException(400, f"accounts harus berisi 1-{FLEET_MAX_ACCOUNTS} akun")
+    unknown = set(body.include) - set(SECTIONS)
+    if unknown or not body.include:
+        raise HTTPException(400, f"include hanya boleh berisi {', '.join(SECTIONS)}")
+
+    accounts = [account.model_dump() for account in body.accounts]
+    results = iter_fleet(myxl_key, accounts, body.include)
+    start = time.perf_counter()
+
+    if summary:
+        totals = FleetSummary()
+        async for result in results:
+            totals.add(result)
+        return totals.as_dict(time.perf_counter() - start)
+
+    async def items():
+        totals = FleetSummary()
+        async for result in results:
+            totals.add(result)
+            yield {"type": "account", **result}
+        yield {"type": "summary", **totals.as_dict(time.perf_counter() - start)}
+
+    return stream_items(items(), stream)
+
+# ---------- Jobs ----------
+@app.post("/jobs", status_code=202)
+async def route_submit_jobs(
+    body: JobBatchBody,
+    x_api_key: Optional[str] = Header(default=None, convert_underscores=False),
+):
+    """
+    Antrekan pembelian untuk banyak (token, paket) sekaligus, langsung atau
+    pada run_at. Status lewat GET /jobs/{id}, progress lewat /jobs/{id}/events.
+    """
+    myxl_key = resolve_myxl_key(x_api_key)
+    items = [({"id_token": job.id_token, "access_token": job.access_token}, job.package_option_code) for job in body.jobs]
+    try:
+        batch = job_queue.submit(myxl_key, items, run_at=body.run_at, max_attempts=body.max_attempts)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {**batch.summary(), "jobs": [job.id for job in batch.jobs]}
+
+@app.get("/jobs/{job_id}")
+async def route_get_job(job_id: str):
+    """
+    id batch -> status batch beserta semua job-nya; id job -> status job itu.
+    """
+    batch = job_queue.get_batch(job_id)
+    if batch is not None:
+        return batch.snapshot()
+    job = job_queue.get_job(job_id)
+    if job is not None:
+        return job.snapshot()
+    raise HTTPException(404, "Job tidak ditemukan")
+
+@app.get("/jobs/{batch_id}/events")
+async def route_job_events(batch_id: str, stream: str = Query("ndjson", pattern="^(ndjson|sse)$")):
+    """
+    Feed progress batch: event tiap perubahan status job, ditutup ringkasan
+    batch setelah semua job selesai.
+    """
+    batch = job_queue.get_batch(batch_id)
+    if batch is None:
+        raise HTTPException(404, "Batch tidak ditemukan")
+    return stream_items(batch.follow(), stream)
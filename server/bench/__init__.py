@@ -0,0 +1 @@
+"""Benchmark bridge terhadap upstream tiruan; lihat bench.run."""
@@ -0,0 +1,172 @@
+"""
+Upstream tiruan untuk benchmark: satu server yang menjawab path CIAM, myXL dan
+xdata sekaligus, dengan latency dan error yang bisa diatur per upstream.
+
+  python -m bench.mock_upstream --port 9100 --latency ciam=30,myxl=80,xdata=15 --errors myxl=0.01
+
+Lalu arahkan bridge ke sini:
+
+  MYXL_BASE_URL=http://127.0.0.1:9100 MYXL_CIAM_BASE_URL=http://127.0.0.1:9100 \\
+  MYXL_XDATA_BASE_URL=http://127.0.0.1:9100 uvicorn app:app
+
+"Enkripsi" xdata di sini cuma base64 JSON, jadi body yang diterima myXL tiruan
+bisa dibaca balik dan respons yang didekripsi bridge berbentuk sama dengan
+respons asli (status/data).
+"""
+import argparse, asyncio, base64, json, random, time
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+UPSTREAMS = ("ciam", "myxl", "xdata")
+
+def parse_per_upstream(spec: Optional[str], cast=float) -> Dict[str, float]:
+    """
+    "ciam=30,myxl=80" -> {"ciam": 30.0, "myxl": 80.0}; angka tanpa nama
+    berlaku untuk semua upstream.
+    """
+    values: Dict[str, float] = {}
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        if "=" in item:
+            name, value = item.split("=", 1)
+            values[name.strip()] = cast(value)
+        else:
+            values.update({name: cast(item) for name in UPSTREAMS})
+    return values
+
+def _encode(data: dict) -> str:
+    return base64.b64encode(json.dumps(data).encode()).decode()
+
+def _decode(xdata: str) -> dict:
+    return json.loads(base64.b64decode(xdata))
+
+def fake_jwt(sub: str, ttl: int = 3600) -> str:
+    def part(obj):
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).decode().rstrip("=")
+    return f"{part({'alg': 'none'})}.{part({'sub': sub, 'exp': int(time.time()) + ttl})}.sig"
+
+def classify(path: str) -> str:
+    if path.startswith("/realms/"):
+        return "ciam"
+    if path in ("/api/encryptsign", "/api/decrypt"):
+        return "xdata"
+    return "myxl"
+
+# ---------- Respons myXL ----------
+def _family(family_code: str) -> dict:
+    names = ("Basic", "Vidio", "Iflix", "Premium")
+    return {
+        "package_family": {"package_family_code": family_code, "name": f"Family {family_code[:8]}"},
+        "package_variants": [{
+            "name": "Default",
+            "package_options": [
+                {"name": name, "price": 10000 * (i + 1), "package_option_code": f"{family_code[:8]}-OPT{i + 1}"}
+                for i, name in enumerate(names)
+            ],
+        }],
+    }
+
+def myxl_response(path: str, body: dict, quota_count: int) -> dict:
+    if path.endswith("/profile"):
+        data = {"profile": {"msisdn": "6281234567890", "subscriber_id": "S-bench"}}
+    elif path.endswith("/balance-and-credit"):
+        data = {"balance": {"remaining": 150000, "expired_at": int(time.time()) + 86400 * 30}}
+    elif path.endswith("/quota-details"):
+        data = {"quotas": [
+            {"quota_code": f"Q{i}", "group_code": f"G{i}", "name": f"Quota {i}"} for i in range(1, quota_count + 1)
+        ]}
+    elif path.endswith("/options/list"):
+        data = _family(body.get("package_family_code") or "FAMILY")
+    elif path.endswith("/options/detail"):
+        code = body.get("package_option_code") or "OPT"
+        data = {
+            "token_confirmation": "tc-bench",
+            "package_option": {"package_option_code": code, "name": code, "price": 10000},
+            "package_family": {"package_family_code": f"FAM-{code}", "name": "Bench family"},
+        }
+    elif path.endswith("/payment-methods-option"):
+        data = {"token_payment": "tp-bench", "timestamp": int(time.time())}
+    elif path.endswith("/settlement-balance"):
+        data = {"transaction_id": f"TRX-{random.randrange(10**9)}"}
+    else:
+        return {"status": "ERROR", "message": f"unknown path {path}"}
+    return {"status": "SUCCESS", "data": data}
+
+# ---------- App ----------
+def create_app(
+    latency_ms: Optional[Dict[str, float]] = None,
+    jitter: float = 0.2,
+    error_rate: Optional[Dict[str, float]] = None,
+    quota_count: int = 5,
+) -> FastAPI:
+    """
+    latency_ms: latency dasar per upstream; jitter: variasi relatif (+/-);
+    error_rate: peluang balas 503 per upstream.
+    """
+    latency_ms = latency_ms or {}
+    error_rate = error_rate or {}
+    app = FastAPI(title="myXL mock upstream")
+    counters = {name: 0 for name in UPSTREAMS}
+
+    async def delay(upstream: str) -> Optional[JSONResponse]:
+        counters[upstream] += 1
+        base = latency_ms.get(upstream, 0.0)
+        if base > 0:
+            await asyncio.sleep(base * random.uniform(1 - jitter, 1 + jitter) / 1000)
+        if random.random() < error_rate.get(upstream, 0.0):
+            return JSONResponse({"status": "ERROR", "message": "injected failure"}, status_code=503)
+        return None
+
+    @app.get("/_bench/stats")
+    async def stats():
+        return counters
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "HEAD"])
+    async def handle(path: str, request: Request):
+        path = "/" + path
+        upstream = classify(path)
+        if request.method == "HEAD":
+            return JSONResponse({})
+        failed = await delay(upstream)
+        if failed is not None:
+            return failed
+
+        if upstream == "ciam":
+            if path.endswith("/auth/otp"):
+                return {"subscriber_id": "S-bench"}
+            sub = f"bench-{random.randrange(10**6)}"
+            return {"id_token": fake_jwt(sub), "access_token": f"at-{sub}", "refresh_token": f"rt-{sub}"}
+
+        body = json.loads(await request.body() or b"{}")
+        if upstream == "xdata":
+            if path == "/api/encryptsign":
+                xtime = int(time.time() * 1000)
+                return {"encrypted_body": {"xdata": _encode(body.get("body") or {}), "xtime": xtime}, "x_signature": "sig-bench"}
+            return {"plaintext": _decode(body["xdata"])}
+
+        plain = _decode(body["xdata"]) if "xdata" in body else body
+        return {"xdata": _encode(myxl_response(path, plain, quota_count)), "xtime": int(time.time() * 1000)}
+
+    return app
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Upstream tiruan CIAM/myXL/xdata untuk benchmark")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", default="ciam=30,myxl=80,xdata=15", help="ms per upstream, mis. ciam=30,myxl=80")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--errors", default="", help="rasio error per upstream, mis. myxl=0.01")
+    parser.add_argument("--quotas", type=int, default=5, help="jumlah quota di quota-details")
+    args = parser.parse_args(argv)
+
+    app = create_app(parse_per_upstream(args.latency), args.jitter, parse_per_upstream(args.errors), args.quotas)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Load test bridge terhadap upstream tiruan (bench.mock_upstream).
+
+  cd server
+  python -m bench.run --concurrency 32 --duration 10 --out bench-results.json
+  python -m bench.run --routes profile,balance --latency myxl=120 --errors myxl=0.02
+  python -m bench.run --compare bench-before.json bench-results.json
+
+Script ini menjalankan upstream tiruan dan `uvicorn app:app` sebagai
+subprocess (ENV MYXL_*_BASE_URL diarahkan ke upstream tiruan, state di
+direktori sementara), lalu memukul tiap route bergantian dari N worker
+sampai durasi habis. Hasil per route: jumlah request, error, RPS dan
+p50/p95/p99 dalam milidetik, disimpan sebagai JSON supaya bisa dibandingkan
+antar run. ENV tambahan untuk bridge bisa diteruskan dengan --env KEY=VALUE.
+"""
+import argparse, asyncio, json, os, platform, random, socket, subprocess, sys, tempfile, time
+from typing import Dict, List, Optional
+
+import httpx
+
+from .mock_upstream import fake_jwt
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ---------- Route ----------
+def _tokens(user: int) -> dict:
+    id_token = fake_jwt(f"bench-user-{user}")
+    return {"id_token": id_token, "access_token": f"at-{user}"}
+
+def _auth(tokens: dict) -> dict:
+    return {"Authorization": f"Bearer {tokens['id_token']}"}
+
+# nama -> fungsi(tokens) -> (method, url, kwargs)
+ROUTES = {
+    "health": lambda t: ("GET", "/health", {}),
+    "otp": lambda t: ("POST", "/auth/otp", {"json": {"contact": "6281234567890"}}),
+    "token": lambda t: ("POST", "/auth/token", {"json": {"contact": "6281234567890", "code": "123456"}}),
+    "refresh": lambda t: ("POST", "/auth/token/refresh", {"json": {"refresh_token": "rt-bench"}}),
+    "profile": lambda t: ("GET", "/profile", {"params": {"access_token": t["access_token"]}, "headers": _auth(t)}),
+    "balance": lambda t: ("GET", "/balance", {"headers": _auth(t)}),
+    "dashboard": lambda t: ("GET", "/dashboard", {"params": {"access_token": t["access_token"]}, "headers": _auth(t)}),
+    "family": lambda t: (
+        "GET", f"/packages/family/FAM-{random.randrange(20)}", {"params": {"access_token": t["access_token"]}, "headers": _auth(t)}
+    ),
+    "package": lambda t: ("GET", f"/packages/OPT-{random.randrange(50)}", {"headers": _auth(t)}),
+    "batch": lambda t: (
+        "POST", "/packages/batch",
+        {"json": {"package_option_codes": [f"OPT-{random.randrange(50)}" for _ in range(5)]}, "headers": _auth(t)},
+    ),
+    "my_packages": lambda t: ("GET", "/my-packages", {"headers": _auth(t)}),
+    "xut_packages": lambda t: ("GET", "/xut-packages", {"headers": _auth(t)}),
+    "fleet": lambda t: (
+        "POST", "/fleet/poll",
+        {"params": {"summary": "true"}, "json": {"accounts": [_tokens(random.randrange(1000)) for _ in range(20)]}},
+    ),
+    "purchase": lambda t: ("POST", f"/purchase/OPT-{random.randrange(50)}", {"json": t}),
+    # job pembelian jalan di background bridge dan ikut membebani route lain,
+    # jadi hanya dijalankan kalau diminta lewat --routes
+    "jobs": lambda t: (
+        "POST", "/jobs", {"json": {"jobs": [{**t, "package_option_code": f"OPT-{random.randrange(50)}"} for _ in range(5)]}}
+    ),
+}
+
+OPT_IN_ROUTES = {"jobs"}
+
+# ---------- Statistik ----------
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+def summarize(latencies: List[float], errors: int, duration: float) -> dict:
+    values = sorted(latencies)
+    ms = lambda v: None if v is None else round(v * 1000, 2)
+    return {
+        "requests": len(values) + errors,
+        "errors": errors,
+        "rps": round((len(values) + errors) / duration, 2) if duration else 0.0,
+        "p50_ms": ms(percentile(values, 50)),
+        "p95_ms": ms(percentile(values, 95)),
+        "p99_ms": ms(percentile(values, 99)),
+        "max_ms": ms(values[-1] if values else None),
+    }
+
+# ---------- Proses ----------
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def wait_ready(url: str, timeout: float = 20.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} tidak siap dalam {timeout} detik")
+
+def start_processes(args, state_dir: str):
+    mock_port, app_port = free_port(), free_port()
+    mock_url = f"http://127.0.0.1:{mock_port}"
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "bench.mock_upstream", "--port", str(mock_port),
+         "--latency", args.latency, "--jitter", str(args.jitter), "--errors", args.errors, "--quotas", str(args.quotas)],
+        cwd=SERVER_DIR,
+    )
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": SERVER_DIR,
+        "MYXL_BASE_URL": mock_url,
+        "MYXL_CIAM_BASE_URL": mock_url,
+        "MYXL_XDATA_BASE_URL": mock_url,
+        "MYXL_XDATA_CODEC": "remote",
+        "MYXL_STATE_DIR": state_dir,
+        "MYXL_FAMILY_MEMO_PATH": os.path.join(state_dir, "family_memo.sqlite3"),
+    })
+    # rate limiter per subscriber/nomor dimatikan kecuali diminta lewat --env,
+    # supaya yang diukur jalur request, bukan respons 429
+    for key in ("MYXL_SUBSCRIBER_RATE", "MYXL_API_KEY_RATE", "MYXL_CONTACT_RATE"):
+        env.setdefault(key, "0")
+    env.setdefault("MYXL_OTP_COOLDOWN", "0")
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(app_port),
+         "--log-level", "warning", "--no-access-log"],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL if args.quiet else None,
+    )
+    return mock, app, mock_url, f"http://127.0.0.1:{app_port}"
+
+# ---------- Load ----------
+async def drive(base_url: str, routes: List[str], concurrency: int, duration: float, users: int, warmup: float):
+    latencies: Dict[str, List[float]] = {name: [] for name in routes}
+    errors: Dict[str, int] = {name: 0 for name in routes}
+    statuses: Dict[str, Dict[str, int]] = {name: {} for name in routes}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        async def worker(index: int, until: float, record: bool):
+            step = index
+            while time.monotonic() < until:
+                name = routes[step % len(routes)]
+                step += 1
+                method, url, kwargs = ROUTES[name](_tokens(random.randrange(users)))
+                start = time.perf_counter()
+                try:
+                    r = await client.request(method, url, **kwargs)
+                    await r.aread()
+                    ok, status = r.status_code < 400, str(r.status_code)
+                except httpx.HTTPError as e:
+                    ok, status = False, type(e).__name__
+                elapsed = time.perf_counter() - start
+                if not record:
+                    continue
+                statuses[name][status] = statuses[name].get(status, 0) + 1
+                if ok:
+                    latencies[name].append(elapsed)
+                else:
+                    errors[name] += 1
+
+        if warmup > 0:
+            until = time.monotonic() + warmup
+            await asyncio.gather(*(worker(i, until, False) for i in range(concurrency)))
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker(i, started + duration, True) for i in range(concurrency)))
+        elapsed = time.monotonic() - started
+
+    result = {name: {**summarize(latencies[name], errors[name], elapsed), "status": statuses[name]} for name in routes}
+    all_latencies = [v for values in latencies.values() for v in values]
+    result["_total"] = summarize(all_latencies, sum(errors.values()), elapsed)
+    return result
+
+# ---------- Output ----------
+def print_table(routes: Dict[str, dict]):
+    print(f"{'route':<14}{'req':>8}{'err':>6}{'rps':>10}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for name, r in routes.items():
+        fmt = lambda v: "-" if v is None else f"{v:.1f}"
+        print(f"{name:<14}{r['requests']:>8}{r['errors']:>6}{r['rps']:>10.1f}"
+              f"{fmt(r['p50_ms']):>9}{fmt(r['p95_ms']):>9}{fmt(r['p99_ms']):>9}")
+
+def compare(before_path: str, after_path: str):
+    with open(before_path, "r", encoding="utf8") as f:
+        before = json.load(f)["routes"]
+    with open(after_path, "r", encoding="utf8") as f:
+        after = json.load(f)["routes"]
+    print(f"{'route':<14}{'rps':>18}{'p50 ms':>20}{'p99 ms':>20}")
+    for name in after:
+        if name not in before:
+            continue
+        b, a = before[name], after[name]
+        cell = lambda key: f"{b[key] or 0:.1f}->{a[key] or 0:.1f}"
+        print(f"{name:<14}{cell('rps'):>18}{cell('p50_ms'):>20}{cell('p99_ms'):>20}")
+
+async def run(args) -> dict:
+    routes = [r for r in ROUTES if r not in OPT_IN_ROUTES] if args.routes == "all" else [r.strip() for r in args.routes.split(",") if r.strip()]
+    unknown = [r for r in routes if r not in ROUTES]
+    if unknown:
+        raise SystemExit(f"route tidak dikenal: {', '.join(unknown)} (pilihan: {', '.join(ROUTES)})")
+
+    with tempfile.TemporaryDirectory(prefix="myxl-bench-") as state_dir:
+        mock, app, mock_url, app_url = start_processes(args, state_dir)
+        try:
+            await wait_ready(f"{mock_url}/_bench/stats")
+            await wait_ready(f"{app_url}/health")
+            results = await drive(app_url, routes, args.concurrency, args.duration, args.users, args.warmup)
+            async with httpx.AsyncClient() as client:
+                upstream_calls = (await client.get(f"{mock_url}/_bench/stats")).json()
+        finally:
+            for proc in (app, mock):
+                proc.terminate()
+            for proc in (app, mock):
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+    return {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {
+            "concurrency": args.concurrency, "duration": args.duration, "warmup": args.warmup,
+            "users": args.users, "latency": args.latency, "jitter": args.jitter, "errors": args.errors,
+            "quotas": args.quotas, "env": args.env,
+        },
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "upstream_calls": upstream_calls,
+        "routes": results,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark bridge myXL terhadap upstream tiruan")
+    parser.add_argument("--routes", default="all", help=f"daftar route dipisah koma atau 'all' ({', '.join(ROUTES)})")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="detik pengukuran")
+    parser.add_argument("--warmup", type=float, default=2.0, help="detik pemanasan (tidak dihitung)")
+    parser.add_argument("--users", type=int, default=50, help="jumlah subscriber tiruan (id_token berbeda)")
+    parser.add_argument("--latency", default="ciam=30,myxl=80,xdata=15")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--errors", default="")
+    parser.add_argument("--quotas", type=int, default=5)
+    parser.add_argument("--env", action="append", default=[], help="ENV tambahan untuk bridge, KEY=VALUE")
+    parser.add_argument("--out", default="bench-results.json")
+    parser.add_argument("--quiet", action="store_true", help="sembunyikan stdout bridge")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="bandingkan dua file hasil")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = asyncio.run(run(args))
+    print_table(report["routes"])
+    with open(args.out, "w", encoding="utf8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nHasil disimpan di {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Admission control untuk bridge: batas request in-flight global, token bucket
+per subscriber / contact / API key, dan cooldown OTP per contact.
+
+Konfigurasi ENV (rate dalam request per detik; 0 mematikan limiter itu):
+  MYXL_MAX_INFLIGHT          request yang boleh diproses bersamaan (256)
+  MYXL_SUBSCRIBER_RATE       rate per subscriber (5); subject dari token manager,
+                             atau IP client untuk id_token yang tidak dikenal
+  MYXL_SUBSCRIBER_BURST      burst per subscriber (20)
+  MYXL_API_KEY_RATE          rate per X-API-Key (50)
+  MYXL_API_KEY_BURST         burst per X-API-Key (100)
+  MYXL_CONTACT_RATE          rate OTP/login per nomor (0.05, satu per 20 detik)
+  MYXL_CONTACT_BURST         burst OTP/login per nomor (3)
+  MYXL_OTP_COOLDOWN          OTP ulang untuk nomor yang sama dalam jendela
+                             ini dijawab dari cache, detik (60)
+  MYXL_RATE_LIMIT_KEYS       jumlah key yang diingat per limiter (100000)
+"""
+import os, time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from .cache import TTLCache
+from .metrics import Counter, REGISTRY
+
+SHED = Counter("myxl_admission_shed_total", "Request yang ditolak karena batas in-flight.")
+RATE_LIMITED = Counter("myxl_rate_limited_total", "Request yang ditolak rate limiter.", ("limiter",))
+OTP_COOLDOWN_HITS = Counter("myxl_otp_cooldown_hits_total", "Request OTP yang dijawab dari cooldown cache.")
+REGISTRY.extend([SHED, RATE_LIMITED, OTP_COOLDOWN_HITS])
+
+RATE_LIMIT_KEYS = int(os.getenv("MYXL_RATE_LIMIT_KEYS", "100000"))
+
+class InflightLimiter:
+    """
+    Penghitung request yang sedang diproses. Request di atas batas langsung
+    ditolak (load shedding), bukan diantrekan.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.inflight = 0
+
+    def try_acquire(self) -> bool:
+        if self.limit > 0 and self.inflight >= self.limit:
+            SHED.inc()
+            return False
+        self.inflight += 1
+        return True
+
+    def release(self):
+        self.inflight -= 1
+
+class RateLimiter:
+    """
+    Token bucket per key: `burst` token, terisi `rate` token per detik.
+    Bucket yang lama tidak dipakai dibuang (LRU) supaya memori terbatas.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, maxsize: int = RATE_LIMIT_KEYS):
+        self.name = name
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def acquire(self, key: str) -> Optional[float]:
+        """
+        Ambil satu token. Return None kalau boleh, atau detik sampai token
+        berikutnya tersedia kalau ditolak.
+        """
+        if not self.enabled or not key:
+            return None
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1.0:
+            self._buckets[key] = (tokens - 1.0, now)
+            wait = None
+        else:
+            self._buckets[key] = (tokens, now)
+            wait = (1.0 - tokens) / self.rate
+            RATE_LIMITED.inc(limiter=self.name)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+class OtpCooldown:
+    """
+    Ingat subscriber_id hasil request OTP per nomor; request ulang dalam
+    jendela cooldown dijawab dari sini tanpa memanggil CIAM (OTP yang sudah
+    terkirim masih berlaku).
+    """
+
+    def __init__(self, ttl: float, maxsize: int = RATE_LIMIT_KEYS):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, contact: str) -> Optional[Tuple[str, float]]:
+        """
+        (subscriber_id, sisa cooldown dalam detik) atau None.
+        """
+        entry = self._cache.get(contact)
+        if entry is None:
+            return None
+        left = self._cache.ttl - (time.time() - entry[0])
+        if left <= 0:
+            self._cache.delete(contact)
+            return None
+        OTP_COOLDOWN_HITS.inc()
+        return entry[1], left
+
+    def set(self, contact: str, subscriber_id: str):
+        self._cache.set(contact, subscriber_id)
+
+    def clear(self, contact: str):
+        self._cache.delete(contact)
+
+inflight = InflightLimiter(int(os.getenv("MYXL_MAX_INFLIGHT", "256")))
+subscriber_limiter = RateLimiter(
+    "subscriber", float(os.getenv("MYXL_SUBSCRIBER_RATE", "5")), float(os.getenv("MYXL_SUBSCRIBER_BURST", "20"))
+)
+api_key_limiter = RateLimiter(
+    "api_key", float(os.getenv("MYXL_API_KEY_RATE", "50")), float(os.getenv("MYXL_API_KEY_BURST", "100"))
+)
+contact_limiter = RateLimiter(
+    "contact", float(os.getenv("MYXL_CONTACT_RATE", "0.05")), float(os.getenv("MYXL_CONTACT_BURST", "3"))
+)
+otp_cooldown = OtpCooldown(float(os.getenv("MYXL_OTP_COOLDOWN", "60")))
+
+def retry_after(seconds: float) -> str:
+    # header Retry-After: delay-seconds bulat ke atas, minimal 1
+    return str(max(1, int(seconds + 0.999)))
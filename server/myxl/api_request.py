@@ -1,26 +1,52 @@
-import json, uuid, requests, time
+import asyncio, json, logging, os, uuid, requests, time
+import httpx
+from contextlib import contextmanager
 from datetime import datetime, timezone, timedelta
 from typing import Any, Dict, Optional, Union
 
 from .crypto_helper import (
-    encryptsign_xdata, java_like_timestamp, ts_gmt7_without_colon,
-    ax_api_signature, decrypt_xdata, API_KEY as DEFAULT_API_KEY,
-    make_x_signature_payment, build_encrypted_field
+    java_like_timestamp, ts_gmt7_without_colon, ax_api_signature,
+    API_KEY as DEFAULT_API_KEY, make_x_signature_payment, build_encrypted_field,
+    XDataAuthError
 )
-
-BASE_URL = "https://api.myxl.xlaxiata.co.id"
-
-def validate_contact(contact: str) -> bool:
+from .auth_guard import mark_api_key_rejected, mark_id_token_rejected
+from .codec import get_codec
+from .jsonfast import dumps, loads
+from .jwt_util import token_fingerprint
+from .cache import TTLCache
+from .metrics import hop, record_timing, DECRYPT_FAILURES, PURCHASE_STAGE_LATENCY
+from .resilience import CircuitOpenError, request_flags
+from .singleflight import SingleFlight
+from .deadline import DeadlineExceeded, remaining_timeout
+from .log import get_logger
+from .http_client import get_async_client, get_session, register_upstream, TIMEOUT
+
+# bisa diarahkan ke upstream tiruan (lihat server/bench) lewat ENV
+BASE_URL = os.getenv("MYXL_BASE_URL", "https://api.myxl.xlaxiata.co.id").rstrip("/")
+CIAM_BASE_URL = os.getenv("MYXL_CIAM_BASE_URL", "https://gede.ciam.xlaxiata.co.id").rstrip("/")
+
+register_upstream("myxl", BASE_URL)
+register_upstream("ciam", CIAM_BASE_URL)
+
+log = get_logger("api_request")
+
+# Helper di bawah dipakai fungsi sync (CLI) dan async (server). CLI tidak
+# memasang logging (myxl.log.setup_logging), jadi fungsi sync memanggilnya
+# dengan echo=True supaya pesannya tetap tampil lewat print seperti biasa.
+
+def validate_contact(contact: str, echo: bool = False) -> bool:
     if not contact.startswith("628") or len(contact) > 14:
-        print("Invalid number")
+        if echo:
+            print("Invalid number")
+        else:
+            log.warning("invalid contact number")
         return False
     return True
 
-def get_otp(contact: str) -> Optional[str]:
-    if not validate_contact(contact):
-        return None
+CIAM_OTP_URL = f"{CIAM_BASE_URL}/realms/xl-ciam/auth/otp"
+CIAM_TOKEN_URL = f"{CIAM_BASE_URL}/realms/xl-ciam/protocol/openid-connect/token"
 
-    url = "https://gede.ciam.xlaxiata.co.id/realms/xl-ciam/auth/otp"
+def _otp_request(contact: str):
     querystring = {"contact": contact, "contactType": "SMS", "alternateContact": "false"}
 
     now = datetime.now(timezone(timedelta(hours=7)))
@@ -41,27 +67,51 @@ def get_otp(contact: str) -> Optional[str]:
         "Host": "gede.ciam.xlaxiata.co.id",
         "User-Agent": "myXL / 8.6.0(1179); com.android.vending; (samsung; SM-N935F; SDK 33; Android 13)"
     }
+    return headers, querystring
+
+def _otp_result(body: dict, echo: bool = False) -> str:
+    if "subscriber_id" not in body:
+        error = body.get("error", "No error message in response")
+        if echo:
+            print(error)
+        else:
+            log.warning("otp request rejected: %s", error)
+        raise ValueError("Subscriber ID not found in response")
+    return body["subscriber_id"]
+
+def get_otp(contact: str) -> Optional[str]:
+    if not validate_contact(contact, echo=True):
+        return None
+
+    headers, querystring = _otp_request(contact)
 
     print("Requesting OTP...")
     try:
-        r = requests.get(url, headers=headers, params=querystring, timeout=30)
-        body = r.json()
-        if "subscriber_id" not in body:
-            print(body.get("error", "No error message in response"))
-            raise ValueError("Subscriber ID not found in response")
-        return body["subscriber_id"]
+        r = get_session("ciam").get(CIAM_OTP_URL, headers=headers, params=querystring, timeout=remaining_timeout(TIMEOUT, "ciam"))
+        return _otp_result(loads(r.content), echo=True)
     except Exception as e:
         print(f"Error requesting OTP: {e}")
         return None
 
-def submit_otp(contact: str, code: str) -> Optional[Dict[str, Any]]:
+async def get_otp_async(contact: str) -> Optional[str]:
     if not validate_contact(contact):
-        print("Invalid number"); return None
-    if not code or len(code) != 6:
-        print("Invalid OTP code format"); return None
+        return None
+
+    headers, querystring = _otp_request(contact)
 
-    url = "https://gede.ciam.xlaxiata.co.id/realms/xl-ciam/protocol/openid-connect/token"
+    log.debug("requesting otp")
+    try:
+        with hop("ciam") as h:
+            r = await get_async_client("ciam").get(CIAM_OTP_URL, headers=headers, params=querystring)
+            h["status"] = r.status_code
+        return _otp_result(loads(r.content))
+    except (CircuitOpenError, DeadlineExceeded):
+        raise
+    except Exception as e:
+        log.warning("otp request failed: %s", e)
+        return None
 
+def _submit_otp_request(contact: str, code: str):
     now_gmt7 = datetime.now(timezone(timedelta(hours=7)))
     ts_for_sign = ts_gmt7_without_colon(now_gmt7)
     ts_header = ts_gmt7_without_colon(now_gmt7 - timedelta(minutes=5))
@@ -82,18 +132,57 @@ def submit_otp(contact: str, code: str) -> Optional[Dict[str, Any]]:
         "Content-Type": "application/x-www-form-urlencoded",
         "User-Agent": "myXL / 8.6.0(1179); com.android.vending; (samsung; SM-N935F; SDK 33; Android 13)",
     }
+    return headers, payload
+
+def _submit_otp_valid(contact: str, code: str, echo: bool = False) -> bool:
+    if not validate_contact(contact, echo):
+        return False
+    if not code or len(code) != 6:
+        if echo:
+            print("Invalid OTP code format")
+        else:
+            log.warning("invalid otp code format")
+        return False
+    return True
+
+def _submit_otp_result(body: dict, echo: bool = False) -> Optional[Dict[str, Any]]:
+    if "error" in body:
+        error = body.get("error_description", body["error"])
+        if echo:
+            print(f"[Error submit_otp]: {error}")
+        else:
+            log.warning("submit otp rejected: %s", error)
+        return None
+    return body
+
+def submit_otp(contact: str, code: str) -> Optional[Dict[str, Any]]:
+    if not _submit_otp_valid(contact, code, echo=True):
+        return None
+
+    headers, payload = _submit_otp_request(contact, code)
 
     try:
-        r = requests.post(url, data=payload, headers=headers, timeout=30)
-        body = r.json()
-        if "error" in body:
-            print(f"[Error submit_otp]: {body.get('error_description', body['error'])}")
-            return None
-        return body
-    except requests.RequestException as e:
+        r = get_session("ciam").post(CIAM_TOKEN_URL, data=payload, headers=headers, timeout=remaining_timeout(TIMEOUT, "ciam"))
+        return _submit_otp_result(loads(r.content), echo=True)
+    except (requests.RequestException, ValueError) as e:
         print(f"[Error submit_otp]: {e}")
         return None
 
+async def submit_otp_async(contact: str, code: str) -> Optional[Dict[str, Any]]:
+    if not _submit_otp_valid(contact, code):
+        return None
+
+    headers, payload = _submit_otp_request(contact, code)
+
+    try:
+        with hop("ciam") as h:
+            r = await get_async_client("ciam").post(CIAM_TOKEN_URL, content=payload, headers=headers)
+            h["status"] = r.status_code
+        return _submit_otp_result(loads(r.content))
+    except (httpx.HTTPError, ValueError) as e:
+        log.warning("submit otp failed: %s", e)
+        return None
+
 def save_tokens(tokens: dict, filename: str = "tokens.json"):
     with open(filename, 'w') as f:
         json.dump(tokens, f, indent=2, ensure_ascii=False)
@@ -109,14 +198,12 @@ def load_tokens(filename: str = "tokens.json") -> dict:
         print(f"File {filename} not found. Returning empty tokens.")
         return {}
 
-def get_new_token(refresh_token: str) -> Dict[str, Any]:
-    url = "https://gede.ciam.xlaxiata.co.id/realms/xl-ciam/protocol/openid-connect/token"
-
+def _refresh_headers() -> Dict[str, str]:
     now = datetime.now(timezone(timedelta(hours=7)))
     ax_request_at = now.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "+0700"
     ax_request_id = str(uuid.uuid4())
 
-    headers = {
+    return {
         "Host": "gede.ciam.xlaxiata.co.id",
         "ax-request-at": ax_request_at,
         "ax-device-id": "92fb44c0804233eb4d9e29f838223a15",
@@ -130,20 +217,93 @@ def get_new_token(refresh_token: str) -> Dict[str, Any]:
         "content-type": "application/x-www-form-urlencoded"
     }
 
+def _refresh_result(body: dict, echo: bool = False) -> Dict[str, Any]:
+    if "error" in body or "id_token" not in body:
+        raise ValueError(f"Refresh failed: {body}")
+    if echo:
+        print("Token refreshed successfully.")
+    else:
+        log.debug("token refreshed")
+    return body
+
+def get_new_token(refresh_token: str) -> Dict[str, Any]:
     data = {"grant_type": "refresh_token", "refresh_token": refresh_token}
     print("Refreshing token...")
 
-    r = requests.post(url, headers=headers, data=data, timeout=30)
+    r = get_session("ciam").post(CIAM_TOKEN_URL, headers=_refresh_headers(), data=data, timeout=remaining_timeout(TIMEOUT, "ciam"))
     r.raise_for_status()
-    body = r.json()
-
-    if "error" in body or "id_token" not in body:
-        raise ValueError(f"Refresh failed: {body}")
-    print("Token refreshed successfully.")
+    body = _refresh_result(loads(r.content), echo=True)
     save_tokens(body)
     return body
 
+async def get_new_token_async(refresh_token: str) -> Dict[str, Any]:
+    """
+    Versi asyncio dari get_new_token. Tidak menulis tokens.json: di server
+    token milik banyak user, bukan satu file lokal.
+    """
+    data = {"grant_type": "refresh_token", "refresh_token": refresh_token}
+    log.debug("refreshing token")
+
+    with hop("ciam") as h:
+        r = await get_async_client("ciam").post(CIAM_TOKEN_URL, headers=_refresh_headers(), data=data)
+        h["status"] = r.status_code
+    r.raise_for_status()
+    return _refresh_result(loads(r.content))
+
 # ---------- Core HTTP helper ----------
+def _api_headers(api_key: str, id_token: str, sig_time_sec: int, x_signature: str, request_at: datetime) -> Dict[str, str]:
+    return {
+        "host": "api.myxl.xlaxiata.co.id",
+        "content-type": "application/json; charset=utf-8",
+        "user-agent": "myXL / 8.6.0(1179); com.android.vending; (samsung; SM-N935F; SDK 33; Android 13)",
+        "x-api-key": api_key,
+        "authorization": f"Bearer {id_token}",
+        "x-hv": "v3",
+        "x-signature-time": str(sig_time_sec),
+        "x-signature": x_signature,
+        "x-request-id": str(uuid.uuid4()),
+        "x-request-at": java_like_timestamp(request_at),
+        "x-version-app": "8.6.0",
+    }
+
+def _decrypt_error(r, e: Exception, raw_json: Any = None, echo: bool = False) -> Dict[str, Any]:
+    """
+    raw_json: body yang sudah di-parse (kalau parse-nya berhasil), supaya body
+    tidak di-parse dua kali.
+    """
+    if echo:
+        print("[decrypt err]", e)
+    else:
+        log.warning("decrypt failed", extra={"http_status": r.status_code, "error": str(e)})
+    if raw_json is None:
+        raw_json = {"text": r.text}
+    return {"status": "ERROR", "http_status": r.status_code, "raw": raw_json, "decrypt_error": str(e)}
+
+def _log_upstream(path: str, headers: Dict[str, str], info: dict):
+    # x-request-id hop ini dicatat bersama request_id bridge (myxl.log), jadi
+    # satu request bridge bisa dicocokkan ke semua panggilan myXL-nya
+    status = info["status"]
+    level = logging.WARNING if not isinstance(status, int) or status >= 500 else logging.DEBUG
+    log.log(level, "myxl call", extra={
+        "path": path, "status": status, "elapsed_ms": round(info["elapsed"] * 1000, 1),
+        "upstream_request_id": headers["x-request-id"],
+    })
+
+# myXL menolak kredensial: bukan gangguan sementara, jadi nilai cache lama
+# tidak boleh dipakai menggantikan respons ini (lihat myxl.catalog)
+AUTH_FAILURE_STATUSES = (401, 403)
+
+class UpstreamAuthError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def _note_auth_failure(r, id_token: str):
+    # myXL menolak id_token: ingat sebentar supaya retry tidak membayar tiga hop lagi
+    if r.status_code == 401:
+        mark_id_token_rejected(id_token)
+
 def send_api_request(
     api_key: Optional[str],
     path: str,
@@ -156,7 +316,7 @@ def send_api_request(
     """
     api_key = api_key or DEFAULT_API_KEY
 
-    encrypted_payload = encryptsign_xdata(
+    encrypted_payload = get_codec().encryptsign(
         api_key=api_key,
         method=method,
         path=path,
@@ -170,105 +330,275 @@ def send_api_request(
     body = encrypted_payload["encrypted_body"]
     x_sig = encrypted_payload["x_signature"]
 
-    headers = {
-        "host": "api.myxl.xlaxiata.co.id",
-        "content-type": "application/json; charset=utf-8",
-        "user-agent": "myXL / 8.6.0(1179); com.android.vending; (samsung; SM-N935F; SDK 33; Android 13)",
-        "x-api-key": api_key,
-        "authorization": f"Bearer {id_token}",
-        "x-hv": "v3",
-        "x-signature-time": str(sig_time_sec),
-        "x-signature": x_sig,
-        "x-request-id": str(uuid.uuid4()),
-        "x-request-at": java_like_timestamp(datetime.now(timezone.utc).astimezone()),
-        "x-version-app": "8.6.0",
-    }
+    headers = _api_headers(api_key, id_token, sig_time_sec, x_sig, datetime.now(timezone.utc).astimezone())
 
     url = f"{BASE_URL}/{path}"
     try:
-        r = requests.request(method.upper(), url, headers=headers, data=json.dumps(body), timeout=30)
+        r = get_session("myxl").request(method.upper(), url, headers=headers, data=dumps(body), timeout=remaining_timeout(TIMEOUT, "myxl"))
     except Exception as e:
         return {"status": "ERROR", "error": f"HTTP request failed: {e}"}
 
+    encrypted = None
     try:
-        decrypted = decrypt_xdata(api_key, json.loads(r.text))
+        encrypted = loads(r.content)
+        decrypted = get_codec().decrypt(api_key, encrypted)
         return decrypted if isinstance(decrypted, dict) else {"status": "ERROR", "raw": r.text}
     except Exception as e:
-        print("[decrypt err]", e)
-        try:
-            raw_json = r.json()
-        except Exception:
-            raw_json = {"text": r.text}
-        return {"status": "ERROR", "http_status": r.status_code, "raw": raw_json, "decrypt_error": str(e)}
+        return _decrypt_error(r, e, encrypted, echo=True)
+
+async def send_api_request_async(
+    api_key: Optional[str],
+    path: str,
+    payload_dict: dict,
+    id_token: str,
+    method: str = "POST",
+) -> Dict[str, Any]:
+    """
+    Versi asyncio dari send_api_request; selalu return dict agar caller aman.
+    """
+    api_key = api_key or DEFAULT_API_KEY
+
+    try:
+        with hop("xdata_encrypt"):
+            encrypted_payload = await get_codec().encryptsign_async(
+                api_key=api_key,
+                method=method,
+                path=path,
+                id_token=id_token,
+                payload=payload_dict
+            )
+    except XDataAuthError as e:
+        mark_api_key_rejected(api_key)
+        return {"status": "ERROR", "http_status": 401, "error": str(e)}
+
+    xtime = int(encrypted_payload["encrypted_body"]["xtime"])
+    sig_time_sec = (xtime // 1000)
+
+    body = encrypted_payload["encrypted_body"]
+    x_sig = encrypted_payload["x_signature"]
+
+    headers = _api_headers(api_key, id_token, sig_time_sec, x_sig, datetime.now(timezone.utc).astimezone())
+
+    url = f"{BASE_URL}/{path}"
+    flags = request_flags(idempotent=path in READ_PATHS, hedge=path in HEDGED_PATHS)
+    try:
+        with hop("myxl") as h:
+            r = await get_async_client("myxl").request(
+                method.upper(), url, headers=headers, content=dumps(body), extensions=flags
+            )
+            h["status"] = r.status_code
+    except (CircuitOpenError, DeadlineExceeded):
+        raise
+    except Exception as e:
+        return {"status": "ERROR", "error": f"HTTP request failed: {e}"}
+    finally:
+        _log_upstream(path, headers, h)
+    _note_auth_failure(r, id_token)
+
+    encrypted = None
+    try:
+        encrypted = loads(r.content)
+        with hop("xdata_decrypt"):
+            decrypted = await get_codec().decrypt_async(api_key, encrypted)
+        result = decrypted if isinstance(decrypted, dict) else {"status": "ERROR", "raw": r.text}
+        if r.status_code in AUTH_FAILURE_STATUSES:
+            result.setdefault("http_status", r.status_code)
+        return result
+    except (CircuitOpenError, DeadlineExceeded):
+        raise
+    except XDataAuthError as e:
+        mark_api_key_rejected(api_key)
+        DECRYPT_FAILURES.inc(path=path)
+        return _decrypt_error(r, e, encrypted)
+    except Exception as e:
+        DECRYPT_FAILURES.inc(path=path)
+        return _decrypt_error(r, e, encrypted)
 
 # ---------- High-level wrappers ----------
-def _ensure_dict(res: Union[Dict[str, Any], Any]) -> Optional[Dict[str, Any]]:
+def _ensure_dict(res: Union[Dict[str, Any], Any], echo: bool = False) -> Optional[Dict[str, Any]]:
     if isinstance(res, dict):
         return res
-    print("Unexpected upstream response type:", type(res), res)
+    if echo:
+        print("Unexpected upstream response type:", type(res), res)
+    else:
+        log.warning("unexpected upstream response type: %s", type(res).__name__)
     return None
 
-def get_profile(api_key: str, access_token: str, id_token: str) -> Optional[Dict[str, Any]]:
-    path = "api/v8/profile"
-    payload = {"access_token": access_token, "app_version": "8.6.0", "is_enterprise": False, "lang": "en"}
-    print("Fetching profile...")
-    res = _ensure_dict(send_api_request(api_key, path, payload, id_token, "POST"))
-    return res.get("data") if res else None
+PROFILE_PATH = "api/v8/profile"
+BALANCE_PATH = "api/v8/packages/balance-and-credit"
+FAMILY_PATH = "api/v8/xl-stores/options/list"
+PACKAGE_PATH = "api/v8/xl-stores/options/detail"
+QUOTA_DETAILS_PATH = "api/v8/packages/quota-details"
+PAYMENT_METHODS_PATH = "payments/api/v8/payment-methods-option"
+SETTLEMENT_PATH = "payments/api/v8/settlement-balance"
 
-def get_balance(api_key: str, id_token: str) -> Optional[Dict[str, Any]]:
-    path = "api/v8/packages/balance-and-credit"
-    payload = {"is_enterprise": False, "lang": "en"}
-    print("Fetching balance...")
-    res = _ensure_dict(send_api_request(api_key, path, payload, id_token, "POST"))
-    if not res: return None
-    if "data" in res and isinstance(res["data"], dict) and "balance" in res["data"]:
-        return res["data"]["balance"]
-    print("Error getting balance:", res.get("error") or res.get("raw"))
-    return None
+# read-only: boleh di-retry; sebagian juga boleh di-hedge (lihat myxl.resilience)
+READ_PATHS = {PROFILE_PATH, BALANCE_PATH, FAMILY_PATH, PACKAGE_PATH, QUOTA_DETAILS_PATH}
+HEDGED_PATHS = {BALANCE_PATH, FAMILY_PATH, PACKAGE_PATH}
 
-def get_family(api_key: str, tokens: dict, family_code: str) -> Optional[Dict[str, Any]]:
-    print("Fetching package family...")
-    path = "api/v8/xl-stores/options/list"
-    payload = {
+def _profile_payload(access_token: str) -> dict:
+    return {"access_token": access_token, "app_version": "8.6.0", "is_enterprise": False, "lang": "en"}
+
+def _balance_payload() -> dict:
+    return {"is_enterprise": False, "lang": "en"}
+
+def _family_payload(family_code: str) -> dict:
+    return {
         "is_show_tagging_tab": True, "is_dedicated_event": True, "is_transaction_routine": False,
         "migration_type": "", "package_family_code": family_code, "is_autobuy": False,
         "is_enterprise": False, "is_pdlp": True, "referral_code": "", "is_migration": False, "lang": "en"
     }
-    res = _ensure_dict(send_api_request(api_key, path, payload, tokens.get("id_token"), "POST"))
-    if not res or res.get("status") != "SUCCESS":
-        print(f"Failed to get family {family_code}: {res}")
-        return None
-    return res["data"]
 
-def get_package(api_key: str, tokens: dict, package_option_code: str) -> Optional[Dict[str, Any]]:
-    path = "api/v8/xl-stores/options/detail"
-    payload = {
+def _package_payload(package_option_code: str) -> dict:
+    return {
         "is_transaction_routine": False, "migration_type": "", "package_family_code": "",
         "family_role_hub": "", "is_autobuy": False, "is_enterprise": False, "is_shareable": False,
         "is_migration": False, "lang": "en", "package_option_code": package_option_code,
         "is_upsell_pdp": False, "package_variant_code": ""
     }
-    print("Fetching package...")
-    res = _ensure_dict(send_api_request(api_key, path, payload, tokens["id_token"], "POST"))
+
+def _quota_details_payload() -> dict:
+    return {"is_enterprise": False, "lang": "en", "family_member_id": ""}
+
+def _balance_from(res: Optional[Dict[str, Any]], echo: bool = False) -> Optional[Dict[str, Any]]:
+    if not res: return None
+    if "data" in res and isinstance(res["data"], dict) and "balance" in res["data"]:
+        return res["data"]["balance"]
+    if echo:
+        print("Error getting balance:", res.get("error") or res.get("raw"))
+    else:
+        log.warning("balance unavailable: %s", res.get("error") or res.get("status"))
+    return None
+
+def _family_from(res: Optional[Dict[str, Any]], family_code: str, echo: bool = False) -> Optional[Dict[str, Any]]:
+    if not res or res.get("status") != "SUCCESS":
+        if echo:
+            print(f"Failed to get family {family_code}: {res}")
+        else:
+            log.warning("family unavailable", extra={"family_code": family_code, "status": (res or {}).get("status")})
+        return None
+    return res["data"]
+
+def _package_from(res: Optional[Dict[str, Any]], echo: bool = False) -> Optional[Dict[str, Any]]:
     if not res or "data" not in res:
-        print("Error getting package:", res.get("error") if res else "no response")
+        if echo:
+            print("Error getting package:", res.get("error") if res else "no response")
+        else:
+            log.warning("package unavailable: %s", res.get("error") or res.get("status") if res else "no response")
         return None
     return res["data"]
 
-def send_payment_request(
+# Panggilan baca identik yang berjalan bersamaan berbagi satu request upstream.
+upstream_flight = SingleFlight()
+
+# Detail paket yang baru diambil (token_confirmation + harga) per subscriber,
+# dipakai ulang purchase supaya tidak perlu get_package lagi. Umurnya pendek:
+# token_confirmation dari myXL hanya berlaku sebentar.
+#   MYXL_PURCHASE_DETAIL_TTL    umur detail yang boleh dipakai ulang, detik (30; 0 = mati)
+#   MYXL_PURCHASE_DETAIL_SIZE   jumlah entry maksimum, LRU (4096)
+PURCHASE_DETAIL_TTL = float(os.getenv("MYXL_PURCHASE_DETAIL_TTL", "30"))
+recent_package_details = TTLCache(
+    maxsize=int(os.getenv("MYXL_PURCHASE_DETAIL_SIZE", "4096")), ttl=PURCHASE_DETAIL_TTL
+)
+
+def _detail_key(tokens: dict, package_option_code: str):
+    # per token, bukan per claim `sub`: claim tidak diverifikasi
+    return (token_fingerprint(tokens.get("id_token") or ""), package_option_code)
+
+def recent_package_detail(tokens: dict, package_option_code: str) -> Optional[Dict[str, Any]]:
+    if PURCHASE_DETAIL_TTL <= 0:
+        return None
+    key = _detail_key(tokens, package_option_code)
+    entry = recent_package_details.get(key)
+    if entry is None:
+        return None
+    if time.time() - entry[0] >= PURCHASE_DETAIL_TTL:
+        recent_package_details.delete(key)
+        return None
+    return entry[1]
+
+async def send_api_request_coalesced(
+    api_key: Optional[str],
+    path: str,
+    payload_dict: dict,
+    id_token: str,
+    scope: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    send_api_request_async (POST) yang di-coalesce per (path, payload, api key,
+    scope). Scope default-nya id_token itu sendiri (fingerprint): token lain
+    dengan claim `sub` sama tidak boleh ikut menerima respons ini.
+    """
+    scope = scope or f"tok:{token_fingerprint(id_token or '')}"
+    key = (path, dumps(payload_dict, sort_keys=True), token_fingerprint(api_key or DEFAULT_API_KEY), scope)
+    return await upstream_flight.do(
+        key, lambda: send_api_request_async(api_key, path, payload_dict, id_token, "POST"), label=path
+    )
+
+def get_profile(api_key: str, access_token: str, id_token: str) -> Optional[Dict[str, Any]]:
+    print("Fetching profile...")
+    res = _ensure_dict(send_api_request(api_key, PROFILE_PATH, _profile_payload(access_token), id_token, "POST"), echo=True)
+    return res.get("data") if res else None
+
+def get_balance(api_key: str, id_token: str) -> Optional[Dict[str, Any]]:
+    print("Fetching balance...")
+    res = _ensure_dict(send_api_request(api_key, BALANCE_PATH, _balance_payload(), id_token, "POST"), echo=True)
+    return _balance_from(res, echo=True)
+
+def get_family(api_key: str, tokens: dict, family_code: str) -> Optional[Dict[str, Any]]:
+    print("Fetching package family...")
+    res = _ensure_dict(send_api_request(api_key, FAMILY_PATH, _family_payload(family_code), tokens.get("id_token"), "POST"), echo=True)
+    return _family_from(res, family_code, echo=True)
+
+def get_package(api_key: str, tokens: dict, package_option_code: str) -> Optional[Dict[str, Any]]:
+    print("Fetching package...")
+    res = _ensure_dict(send_api_request(api_key, PACKAGE_PATH, _package_payload(package_option_code), tokens["id_token"], "POST"), echo=True)
+    return _package_from(res, echo=True)
+
+async def get_profile_async(api_key: str, access_token: str, id_token: str) -> Optional[Dict[str, Any]]:
+    log.debug("fetching profile")
+    res = _ensure_dict(await send_api_request_coalesced(api_key, PROFILE_PATH, _profile_payload(access_token), id_token))
+    return res.get("data") if res else None
+
+async def get_balance_async(api_key: str, id_token: str) -> Optional[Dict[str, Any]]:
+    log.debug("fetching balance")
+    res = _ensure_dict(await send_api_request_coalesced(api_key, BALANCE_PATH, _balance_payload(), id_token))
+    return _balance_from(res)
+
+async def get_family_async(api_key: str, tokens: dict, family_code: str, scope: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    log.debug("fetching package family")
+    res = _ensure_dict(await send_api_request_coalesced(api_key, FAMILY_PATH, _family_payload(family_code), tokens.get("id_token"), scope))
+    if res and res.get("http_status") in AUTH_FAILURE_STATUSES:
+        raise UpstreamAuthError(res["http_status"], f"myXL menolak kredensial (HTTP {res['http_status']})")
+    return _family_from(res, family_code)
+
+async def get_package_async(api_key: str, tokens: dict, package_option_code: str) -> Optional[Dict[str, Any]]:
+    log.debug("fetching package")
+    res = _ensure_dict(await send_api_request_coalesced(api_key, PACKAGE_PATH, _package_payload(package_option_code), tokens["id_token"]))
+    data = _package_from(res)
+    if data and PURCHASE_DETAIL_TTL > 0 and data.get("token_confirmation"):
+        recent_package_details.set(_detail_key(tokens, package_option_code), data)
+    return data
+
+async def get_quota_details_async(api_key: str, id_token: str) -> Optional[list]:
+    log.debug("fetching quota details")
+    res = _ensure_dict(await send_api_request_coalesced(api_key, QUOTA_DETAILS_PATH, _quota_details_payload(), id_token))
+    if not res or res.get("status") != "SUCCESS":
+        log.warning("quota details unavailable: %s", (res or {}).get("status"))
+        return None
+    return res["data"]["quotas"]
+
+# ---------- Payment ----------
+def _prepare_payment_request(
     api_key: str,
+    encrypted_payload: dict,
     payload_dict: dict,
     access_token: str,
     id_token: str,
     token_payment: str,
     ts_to_sign: int,
-) -> Dict[str, Any]:
-    path = "payments/api/v8/settlement-balance"
+):
     package_code = payload_dict["items"][0]["item_code"]
-
-    encrypted_payload = encryptsign_xdata(
-        api_key=api_key, method="POST", path=path, id_token=id_token, payload=payload_dict
-    )
     xtime = int(encrypted_payload["encrypted_body"]["xtime"])
     sig_time_sec = (xtime // 1000)
     x_requested_at = datetime.fromtimestamp(sig_time_sec, tz=timezone.utc).astimezone()
@@ -277,44 +607,95 @@ def send_payment_request(
     body = encrypted_payload["encrypted_body"]
     x_sig2 = make_x_signature_payment(access_token, ts_to_sign, package_code, token_payment)
 
-    headers = {
-        "host": "api.myxl.xlaxiata.co.id",
-        "content-type": "application/json; charset=utf-8",
-        "user-agent": "myXL / 8.6.0(1179); com.android.vending; (samsung; SM-N935F; SDK 33; Android 13)",
-        "x-api-key": api_key,
-        "authorization": f"Bearer {id_token}",
-        "x-hv": "v3",
-        "x-signature-time": str(sig_time_sec),
-        "x-signature": x_sig2,
-        "x-request-id": str(uuid.uuid4()),
-        "x-request-at": java_like_timestamp(x_requested_at),
-        "x-version-app": "8.6.0",
-    }
+    headers = _api_headers(api_key, id_token, sig_time_sec, x_sig2, x_requested_at)
+    return f"{BASE_URL}/{SETTLEMENT_PATH}", headers, dumps(body)
 
-    url = f"{BASE_URL}/{path}"
-    r = requests.post(url, headers=headers, data=json.dumps(body), timeout=30)
+def send_payment_request(
+    api_key: str,
+    payload_dict: dict,
+    access_token: str,
+    id_token: str,
+    token_payment: str,
+    ts_to_sign: int,
+) -> Dict[str, Any]:
+    encrypted_payload = get_codec().encryptsign(
+        api_key=api_key, method="POST", path=SETTLEMENT_PATH, id_token=id_token, payload=payload_dict
+    )
+    url, headers, data = _prepare_payment_request(
+        api_key, encrypted_payload, payload_dict, access_token, id_token, token_payment, ts_to_sign
+    )
+    r = get_session("myxl").post(url, headers=headers, data=data, timeout=remaining_timeout(TIMEOUT, "myxl"))
+    encrypted = None
     try:
-        return decrypt_xdata(api_key, json.loads(r.text))
+        encrypted = loads(r.content)
+        return get_codec().decrypt(api_key, encrypted)
     except Exception as e:
-        print("[decrypt err]", e)
-        try:
-            raw_json = r.json()
-        except Exception:
-            raw_json = {"text": r.text}
-        return {"status": "ERROR", "http_status": r.status_code, "raw": raw_json, "decrypt_error": str(e)}
+        return _decrypt_error(r, e, encrypted, echo=True)
+
+# Status hasil settlement yang sudah terkirim ke myXL tapi hasilnya tidak
+# diketahui (response hilang, atau gagal didekripsi karena xdata mati/deadline).
+# Pemanggil tidak boleh mengulang settlement seperti ini.
+SETTLEMENT_UNKNOWN = "UNKNOWN"
+
+# kegagalan transport yang pasti terjadi sebelum body request terkirim
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+def _settlement_unknown(e: Exception, http_status: Optional[int] = None) -> Dict[str, Any]:
+    log.error("settlement outcome unknown", extra={"http_status": http_status, "error": str(e) or type(e).__name__})
+    return {
+        "status": SETTLEMENT_UNKNOWN, "http_status": http_status,
+        "deadline": isinstance(e, (DeadlineExceeded, httpx.TimeoutException)),
+        "message": f"Settlement sudah terkirim tapi hasilnya tidak diketahui: {str(e) or type(e).__name__}",
+    }
 
-def purchase_package(api_key: str, tokens: dict, package_option_code: str) -> Optional[Dict[str, Any]]:
-    package_details_data = get_package(api_key, tokens, package_option_code)
-    if not package_details_data:
-        print("Failed to get package details for purchase.")
-        return None
+def settlement_unknown(result: Any) -> bool:
+    return isinstance(result, dict) and result.get("status") == SETTLEMENT_UNKNOWN
 
-    token_confirmation = package_details_data["token_confirmation"]
-    payment_target = package_details_data["package_option"]["package_option_code"]
-    price = package_details_data["package_option"]["price"]
+async def send_payment_request_async(
+    api_key: str,
+    payload_dict: dict,
+    access_token: str,
+    id_token: str,
+    token_payment: str,
+    ts_to_sign: int,
+) -> Dict[str, Any]:
+    """
+    Raise hanya untuk kegagalan sebelum settlement terkirim (encrypt, breaker
+    terbuka, deadline habis, koneksi gagal dibuka). Setelah request terkirim
+    selalu return: hasil myXL, _decrypt_error, atau status SETTLEMENT_UNKNOWN.
+    """
+    with hop("xdata_encrypt"):
+        encrypted_payload = await get_codec().encryptsign_async(
+            api_key=api_key, method="POST", path=SETTLEMENT_PATH, id_token=id_token, payload=payload_dict
+        )
+    url, headers, data = _prepare_payment_request(
+        api_key, encrypted_payload, payload_dict, access_token, id_token, token_payment, ts_to_sign
+    )
+    try:
+        with hop("myxl") as h:
+            r = await get_async_client("myxl").post(url, headers=headers, content=data)
+            h["status"] = r.status_code
+    except (CircuitOpenError, DeadlineExceeded, *_NOT_SENT_ERRORS):
+        raise
+    except Exception as e:
+        return _settlement_unknown(e)
+    finally:
+        _log_upstream(SETTLEMENT_PATH, headers, h)
+    _note_auth_failure(r, id_token)
+    encrypted = None
+    try:
+        encrypted = loads(r.content)
+        with hop("xdata_decrypt"):
+            return await get_codec().decrypt_async(api_key, encrypted)
+    except (CircuitOpenError, DeadlineExceeded) as e:
+        # settlement sudah diterima myXL; hanya hasilnya yang tidak terbaca
+        return _settlement_unknown(e, r.status_code)
+    except Exception as e:
+        DECRYPT_FAILURES.inc(path=SETTLEMENT_PATH)
+        return _decrypt_error(r, e, encrypted)
 
-    payment_path = "payments/api/v8/payment-methods-option"
-    payment_payload = {
+def _payment_option_payload(payment_target: str, token_confirmation: str) -> dict:
+    return {
         "payment_type": "PURCHASE",
         "is_enterprise": False,
         "payment_target": payment_target,
@@ -323,16 +704,8 @@ def purchase_package(api_key: str, tokens: dict, package_option_code: str) -> Op
         "token_confirmation": token_confirmation
     }
 
-    print("Initiating payment...")
-    payment_res = _ensure_dict(send_api_request(api_key, payment_path, payment_payload, tokens["id_token"], "POST"))
-    if not payment_res or payment_res.get("status") != "SUCCESS":
-        print("Failed to initiate payment:", payment_res)
-        return None
-
-    token_payment = payment_res["data"]["token_payment"]
-    ts_to_sign = payment_res["data"]["timestamp"]
-
-    settlement_payload = {
+def _settlement_payload(tokens: dict, payment_target: str, price: int, token_payment: str) -> dict:
+    return {
         "total_discount": 0, "is_enterprise": False, "payment_token": "", "token_payment": token_payment,
         "activated_autobuy_code": "", "cc_payment_type": "", "is_myxl_wallet": False, "pin": "",
         "ewallet_promo_id": "", "members": [], "total_fee": 0, "fingerprint": "",
@@ -348,7 +721,130 @@ def purchase_package(api_key: str, tokens: dict, package_option_code: str) -> Op
         "items": [{"item_code": payment_target, "product_type": "", "item_price": price, "item_name": "", "tax": 0}]
     }
 
+def purchase_package(api_key: str, tokens: dict, package_option_code: str) -> Optional[Dict[str, Any]]:
+    package_details_data = get_package(api_key, tokens, package_option_code)
+    if not package_details_data:
+        print("Failed to get package details for purchase.")
+        return None
+
+    token_confirmation = package_details_data["token_confirmation"]
+    payment_target = package_details_data["package_option"]["package_option_code"]
+    price = package_details_data["package_option"]["price"]
+
+    print("Initiating payment...")
+    payment_payload = _payment_option_payload(payment_target, token_confirmation)
+    payment_res = _ensure_dict(send_api_request(api_key, PAYMENT_METHODS_PATH, payment_payload, tokens["id_token"], "POST"), echo=True)
+    if not payment_res or payment_res.get("status") != "SUCCESS":
+        print("Failed to initiate payment:", payment_res)
+        return None
+
+    token_payment = payment_res["data"]["token_payment"]
+    ts_to_sign = payment_res["data"]["timestamp"]
+
+    settlement_payload = _settlement_payload(tokens, payment_target, price, token_payment)
+
     print("Processing purchase...")
     result = send_payment_request(api_key, settlement_payload, tokens["access_token"], tokens["id_token"], token_payment, ts_to_sign)
     print(f"Purchase result:\n{json.dumps(result, indent=2)}")
     return result
+
+@contextmanager
+def _purchase_stage(stages: dict, name: str, detail: str):
+    # satu tahap pembelian (bisa beberapa hop): histogram + entry Server-Timing
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = stages[name] = time.perf_counter() - start
+        PURCHASE_STAGE_LATENCY.observe(elapsed, stage=name, detail=detail)
+        record_timing(f"purchase_{name}", elapsed)
+
+async def _payment_option_async(api_key: str, tokens: dict, detail: dict):
+    """
+    Kirim payment-methods-option; selagi request itu menunggu I/O (encrypt
+    xdata, hop myXL), bagian payload settlement yang tidak bergantung pada
+    token_payment (termasuk field build_encrypted_field) disiapkan.
+    Return (payment_res, settlement_payload).
+    """
+    payment_target = detail["package_option"]["package_option_code"]
+    price = detail["package_option"]["price"]
+    payment_payload = _payment_option_payload(payment_target, detail["token_confirmation"])
+    task = asyncio.create_task(
+        send_api_request_async(api_key, PAYMENT_METHODS_PATH, payment_payload, tokens["id_token"], "POST")
+    )
+    try:
+        # beri task kesempatan jalan sampai await I/O pertamanya; tanpa ini
+        # payload di bawah selesai dibangun sebelum request dimulai
+        await asyncio.sleep(0)
+        settlement_payload = _settlement_payload(tokens, payment_target, price, "")
+        payment_res = _ensure_dict(await task)
+    finally:
+        if not task.done():
+            task.cancel()
+    return payment_res, settlement_payload
+
+def _payment_ok(payment_res: Optional[Dict[str, Any]]) -> bool:
+    return bool(payment_res) and payment_res.get("status") == "SUCCESS"
+
+async def purchase_package_async(
+    api_key: str, tokens: dict, package_option_code: str, reuse_detail: bool = True
+) -> Optional[Dict[str, Any]]:
+    """
+    Pembelian: detail paket -> payment-methods-option -> settlement-balance.
+
+    reuse_detail: pakai detail yang baru saja diambil subscriber ini (lihat
+    recent_package_detail) sehingga tahap detail tidak memanggil upstream.
+    Kalau myXL menolak token_confirmation dari cache, detail diambil ulang
+    sekali lalu payment-option diulang.
+
+    Return None kalau gagal sebelum settlement. Exception juga hanya keluar
+    untuk kegagalan sebelum settlement terkirim, jadi aman diulang; setelah
+    terkirim hasilnya selalu dikembalikan (lihat settlement_unknown).
+    """
+    stages: Dict[str, float] = {}
+    package_details_data = recent_package_detail(tokens, package_option_code) if reuse_detail else None
+    source = "cached" if package_details_data else "fetched"
+
+    with _purchase_stage(stages, "detail", source):
+        if package_details_data is None:
+            package_details_data = await get_package_async(api_key, tokens, package_option_code)
+    if not package_details_data:
+        log.warning("purchase aborted: package detail unavailable", extra={"package": package_option_code})
+        return None
+
+    log.info("initiating payment", extra={"package": package_option_code, "detail": source})
+    with _purchase_stage(stages, "payment_option", source):
+        payment_res, settlement_payload = await _payment_option_async(api_key, tokens, package_details_data)
+    if not _payment_ok(payment_res) and source == "cached":
+        recent_package_details.delete(_detail_key(tokens, package_option_code))
+        source = "refetched"
+        with _purchase_stage(stages, "detail_retry", source):
+            package_details_data = await get_package_async(api_key, tokens, package_option_code)
+        if not package_details_data:
+            log.warning("purchase aborted: package detail unavailable", extra={"package": package_option_code})
+            return None
+        with _purchase_stage(stages, "payment_option_retry", source):
+            payment_res, settlement_payload = await _payment_option_async(api_key, tokens, package_details_data)
+    if not _payment_ok(payment_res):
+        log.warning("payment initiation failed: %s", (payment_res or {}).get("status"))
+        return None
+
+    # token_confirmation sudah dipakai; detail yang sama tidak boleh dipakai ulang
+    recent_package_details.delete(_detail_key(tokens, package_option_code))
+
+    token_payment = payment_res["data"]["token_payment"]
+    ts_to_sign = payment_res["data"]["timestamp"]
+    settlement_payload["token_payment"] = token_payment
+
+    log.info("processing settlement", extra={"package": package_option_code})
+    with _purchase_stage(stages, "settlement", source):
+        result = await send_payment_request_async(
+            api_key, settlement_payload, tokens["access_token"], tokens["id_token"], token_payment, ts_to_sign
+        )
+    log.info("purchase result", extra={
+        "package": package_option_code,
+        "status": result.get("status") if isinstance(result, dict) else type(result).__name__,
+        "detail": source,
+        "stages_ms": {name: round(elapsed * 1000, 1) for name, elapsed in stages.items()},
+    })
+    return result
@@ -0,0 +1,53 @@
+"""
+Penolakan lokal untuk kredensial yang pasti gagal, sebelum menghabiskan
+tiga hop upstream (encrypt -> myXL -> decrypt).
+
+API key default server (MYXL_API_KEY atau bawaan crypto_helper) tidak pernah
+diingat sebagai ditolak: satu 401/403 sesaat dari service xdata tidak boleh
+membuat semua request tanpa X-API-Key gagal lokal selama TTL.
+
+Konfigurasi ENV:
+  MYXL_JWT_LEEWAY           toleransi jam untuk claim exp, detik (30)
+  MYXL_NEGATIVE_CACHE_TTL   berapa lama token/API key yang ditolak upstream diingat, detik (60)
+  MYXL_NEGATIVE_CACHE_SIZE  jumlah entry maksimum per cache (10000)
+"""
+import os, time
+from typing import Optional
+
+from .cache import NegativeCache
+from .crypto_helper import API_KEY as DEFAULT_API_KEY
+from .jwt_util import token_expiry, token_fingerprint
+
+JWT_LEEWAY = float(os.getenv("MYXL_JWT_LEEWAY", "30"))
+
+_ttl = float(os.getenv("MYXL_NEGATIVE_CACHE_TTL", "60"))
+_size = int(os.getenv("MYXL_NEGATIVE_CACHE_SIZE", "10000"))
+rejected_id_tokens = NegativeCache(maxsize=_size, ttl=_ttl)
+rejected_api_keys = NegativeCache(maxsize=_size, ttl=_ttl)
+
+def id_token_rejection(id_token: str) -> Optional[str]:
+    """
+    Alasan id_token pasti ditolak, atau None kalau perlu dicek upstream.
+    """
+    exp = token_expiry(id_token)
+    if exp is not None and exp + JWT_LEEWAY < time.time():
+        return "id_token expired"
+    if token_fingerprint(id_token) in rejected_id_tokens:
+        return "id_token recently rejected upstream"
+    return None
+
+def api_key_rejection(api_key: str) -> Optional[str]:
+    if token_fingerprint(api_key) in rejected_api_keys:
+        return "API key recently rejected upstream"
+    return None
+
+def mark_id_token_rejected(id_token: str):
+    rejected_id_tokens.add(token_fingerprint(id_token))
+
+def is_server_api_key(api_key: str) -> bool:
+    return api_key in (os.getenv("MYXL_API_KEY"), DEFAULT_API_KEY)
+
+def mark_api_key_rejected(api_key: str):
+    if is_server_api_key(api_key):
+        return
+    rejected_api_keys.add(token_fingerprint(api_key))
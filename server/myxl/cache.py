@@ -0,0 +1,142 @@
+import asyncio, time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+
+from .deadline import clear_deadline
+from .log import get_logger
+
+log = get_logger("cache")
+
+HIT = "HIT"
+MISS = "MISS"
+STALE = "STALE"
+
+class TTLCache:
+    """
+    Cache LRU berukuran tetap dengan TTL.
+
+    - umur < ttl                        -> HIT
+    - umur < ttl + stale_while_revalidate -> STALE, refresh jalan di background
+    - loader gagal dan umur < ttl + stale_if_error -> STALE (nilai lama)
+    - selain itu                        -> MISS, loader dipanggil
+
+    Loader yang mengembalikan None dianggap gagal dan tidak disimpan.
+    Exception di fatal_errors (mis. kredensial ditolak upstream) tidak
+    pernah diganti nilai lama: entry-nya dihapus dan exception diteruskan.
+
+    on_change (opsional) dipanggil dengan (key, stored_at, value) setiap ada
+    nilai baru disimpan, atau (key, waktu hapus, None) kalau entry dihapus;
+    dipakai snapshot ke disk (myxl.snapshot).
+    """
+
+    def __init__(self, maxsize: int, ttl: float, stale_while_revalidate: float = 0.0, stale_if_error: float = 0.0,
+                 fatal_errors: Tuple[type, ...] = ()):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_while_revalidate = stale_while_revalidate
+        self.stale_if_error = stale_if_error
+        self.fatal_errors = fatal_errors
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._refreshing: dict = {}
+        self.on_change: Optional[Callable[[Hashable, float, Any], None]] = None
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Tuple[float, Any]]:
+        entry = self._data.get(key)
+        if entry is not None:
+            self._data.move_to_end(key)
+        return entry
+
+    def set(self, key: Hashable, value: Any, stored_at: Optional[float] = None, notify: bool = True):
+        stored_at = stored_at if stored_at is not None else time.time()
+        self._data[key] = (stored_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        if notify and self.on_change is not None:
+            self.on_change(key, stored_at, value)
+
+    def delete(self, key: Hashable):
+        if self._data.pop(key, None) is not None and self.on_change is not None:
+            self.on_change(key, time.time(), None)
+
+    def clear(self):
+        self._data.clear()
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = await loader()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def _revalidate(self, key: Hashable, loader: Callable[[], Awaitable[Any]]):
+        if key in self._refreshing:
+            return
+
+        async def run():
+            # refresh background tidak terikat deadline request yang memicunya
+            clear_deadline()
+            try:
+                await self._load(key, loader)
+            except self.fatal_errors as e:
+                log.warning("background refresh %r ditolak: %s", key, e)
+                self.delete(key)
+            except Exception as e:
+                log.warning("background refresh %r gagal: %s", key, e)
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(run())
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Tuple[Any, str]:
+        """
+        Return (value, status) dengan status HIT/MISS/STALE. Value None berarti
+        loader gagal dan tidak ada nilai lama yang boleh dipakai.
+        """
+        entry = self.get(key)
+        age = time.time() - entry[0] if entry else None
+
+        if entry and age < self.ttl:
+            return entry[1], HIT
+        if entry and age < self.ttl + self.stale_while_revalidate:
+            self._revalidate(key, loader)
+            return entry[1], STALE
+
+        try:
+            value = await self._load(key, loader)
+        except self.fatal_errors:
+            self.delete(key)
+            raise
+        except Exception:
+            if entry and age < self.ttl + self.stale_if_error:
+                return entry[1], STALE
+            raise
+        if value is None and entry and age < self.ttl + self.stale_if_error:
+            return entry[1], STALE
+        return value, MISS
+
+class NegativeCache:
+    """
+    Himpunan key dengan TTL pendek, untuk mengingat hal yang baru saja ditolak
+    (token/API key) tanpa menyimpan nilainya; simpan fingerprint, bukan rahasia.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def add(self, key: Hashable):
+        self._cache.set(key, True)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._cache.get(key)
+        if entry is None:
+            return False
+        if time.time() - entry[0] >= self._cache.ttl:
+            self._cache.delete(key)
+            return False
+        return True
+
+    def __len__(self) -> int:
+        return len(self._cache)
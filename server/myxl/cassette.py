@@ -0,0 +1,248 @@
+"""
+Transport record/replay untuk semua upstream (CIAM, myXL, xdata), jalur
+async (httpx) maupun sync (requests).
+
+Konfigurasi ENV:
+  MYXL_TRANSPORT_MODE   live (default) | record | replay
+  MYXL_CASSETTE         file cassette JSON (default cassette.json di MYXL_STATE_DIR)
+  MYXL_CASSETTE_TIMING  original (default) | none | faktor pengali, mis. 0.5
+
+record: request tetap dikirim ke upstream asli; tiap pertukaran (status,
+header, body respons dan lama respons) ditambahkan ke cassette.
+replay: tidak ada koneksi keluar; respons diambil dari cassette dan ditahan
+selama durasi aslinya (atau tanpa jeda dengan timing=none).
+
+Pencocokan replay: pertama berdasarkan upstream + method + path + hash body
+request. Di replay, body request ke myXL dan ke xdata/decrypt berasal dari
+respons yang juga direplay, jadi cocok persis. Kalau tidak ada yang cocok
+persis (body mengandung timestamp/signature baru), dipakai rekaman berikutnya
+untuk upstream + method + path yang sama secara berurutan, berputar ke awal
+kalau sudah habis. Untuk xdata/encryptsign path myXL di dalam body ikut jadi
+bagian kunci, supaya enkripsi payload balance tidak dijawab rekaman profile.
+
+Header request tidak disimpan, tapi body respons disimpan apa adanya
+(termasuk token hasil login), jadi perlakukan cassette sebagai rahasia.
+"""
+import asyncio, base64, hashlib, json, os, threading, time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from .state import state_path
+
+# header yang tidak relevan lagi setelah body disimpan dalam bentuk ter-decode
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+
+def transport_mode() -> str:
+    mode = os.getenv("MYXL_TRANSPORT_MODE", "live").strip().lower()
+    if mode not in ("live", "record", "replay"):
+        raise RuntimeError(f"MYXL_TRANSPORT_MODE tidak dikenal: {mode} (pilihan: live, record, replay)")
+    return mode
+
+def _timing_factor() -> float:
+    value = os.getenv("MYXL_CASSETTE_TIMING", "original").strip().lower()
+    if value == "original":
+        return 1.0
+    if value == "none":
+        return 0.0
+    return float(value)
+
+def _body_hash(content: Optional[bytes]) -> str:
+    # body JSON dinormalisasi dulu: requests dan httpx memakai separator berbeda
+    content = content or b""
+    if content.startswith((b"{", b"[")):
+        try:
+            content = json.dumps(json.loads(content), sort_keys=True, separators=(",", ":")).encode()
+        except ValueError:
+            pass
+    return hashlib.sha256(content).hexdigest()[:32]
+
+def _body_hint(content: Optional[bytes]) -> str:
+    """
+    Field "path" dari body JSON (request encryptsign ke xdata), atau "".
+    """
+    if not content or not content.startswith(b"{"):
+        return ""
+    try:
+        path = json.loads(content).get("path")
+    except ValueError:
+        return ""
+    return path if isinstance(path, str) else ""
+
+def _route(upstream: str, method: str, url: str, body: Optional[bytes]) -> Tuple[str, str, str, str]:
+    return (upstream, method.upper(), urlsplit(url).path, _body_hint(body))
+
+class CassetteMiss(Exception):
+    pass
+
+class Cassette:
+    """
+    Daftar interaksi yang direkam, dibagi semua upstream. Ditulis ulang utuh
+    (tmp + rename) tiap ada interaksi baru, supaya proses yang mati di tengah
+    jalan tetap meninggalkan cassette yang valid.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.interactions: List[dict] = []
+        self._exact: Dict[Tuple[str, ...], dict] = {}
+        self._by_route: Dict[Tuple[str, ...], List[dict]] = {}
+        self._cursor: Dict[Tuple[str, ...], int] = {}
+
+    def load(self) -> "Cassette":
+        with open(self.path, "r", encoding="utf8") as f:
+            data = json.load(f)
+        for interaction in data.get("interactions", []):
+            self._index(interaction)
+        return self
+
+    def _index(self, interaction: dict):
+        req = interaction["request"]
+        route = (interaction["upstream"], req["method"], req["path"], req.get("hint", ""))
+        self.interactions.append(interaction)
+        self._exact.setdefault(route + (req["body_sha"],), interaction)
+        self._by_route.setdefault(route, []).append(interaction)
+
+    def append(self, upstream: str, method: str, url: str, body: Optional[bytes],
+               status: int, headers: Dict[str, str], content: bytes, elapsed: float):
+        interaction = {
+            "upstream": upstream,
+            "request": {
+                "method": method.upper(), "url": url, "path": urlsplit(url).path,
+                "hint": _body_hint(body), "body_sha": _body_hash(body),
+            },
+            "response": {
+                "status": status,
+                "headers": {k: v for k, v in headers.items() if k.lower() not in _DROP_HEADERS},
+                "body": base64.b64encode(content).decode(),
+            },
+            "elapsed": round(elapsed, 6),
+            "recorded_at": time.time(),
+        }
+        with self._lock:
+            self._index(interaction)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf8") as f:
+                json.dump({"version": 1, "interactions": self.interactions}, f, indent=1)
+            os.replace(tmp, self.path)
+
+    def match(self, upstream: str, method: str, url: str, body: Optional[bytes]) -> dict:
+        route = _route(upstream, method, url, body)
+        with self._lock:
+            interaction = self._exact.get(route + (_body_hash(body),))
+            if interaction is not None:
+                return interaction
+            candidates = self._by_route.get(route)
+            if not candidates:
+                raise CassetteMiss(f"tidak ada rekaman untuk {upstream} {route[1]} {route[2]}")
+            index = self._cursor.get(route, 0)
+            self._cursor[route] = (index + 1) % len(candidates)
+            return candidates[index]
+
+_cassette: Optional[Cassette] = None
+
+def get_cassette() -> Cassette:
+    global _cassette
+    if _cassette is None:
+        path = os.getenv("MYXL_CASSETTE") or state_path("cassette.json")
+        cassette = Cassette(path)
+        if transport_mode() == "replay" or os.path.exists(path):
+            cassette.load()
+        _cassette = cassette
+    return _cassette
+
+# ---------- httpx ----------
+class RecordingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport, upstream: str, cassette: Cassette):
+        self._inner, self._upstream, self._cassette = inner, upstream, cassette
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        start = time.perf_counter()
+        response = await self._inner.handle_async_request(request)
+        # body dibaca lewat Response sementara supaya content-encoding ikut di-decode
+        wrapped = httpx.Response(response.status_code, headers=response.headers, stream=response.stream, request=request)
+        content = await wrapped.aread()
+        elapsed = time.perf_counter() - start
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in _DROP_HEADERS}
+        await asyncio.to_thread(
+            self._cassette.append, self._upstream, request.method, str(request.url), body,
+            response.status_code, headers, content, elapsed,
+        )
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    def __init__(self, upstream: str, cassette: Cassette):
+        self._upstream, self._cassette = upstream, cassette
+        self._factor = _timing_factor()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        try:
+            interaction = self._cassette.match(self._upstream, request.method, str(request.url), body)
+        except CassetteMiss as e:
+            raise httpx.ConnectError(str(e), request=request)
+        if self._factor > 0:
+            await asyncio.sleep(interaction["elapsed"] * self._factor)
+        res = interaction["response"]
+        return httpx.Response(res["status"], headers=res["headers"], content=base64.b64decode(res["body"]), request=request)
+
+# ---------- requests (CLI) ----------
+def _requests_response(request: requests.PreparedRequest, status: int, headers: Dict[str, str], content: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = content
+    response.encoding = get_encoding_from_headers(response.headers)
+    response.url = request.url
+    response.request = request
+    return response
+
+def _request_body(request: requests.PreparedRequest) -> bytes:
+    body = request.body or b""
+    return body.encode("utf-8") if isinstance(body, str) else body
+
+class RecordingAdapter(HTTPAdapter):
+    def __init__(self, upstream: str, cassette: Cassette, **kwargs):
+        super().__init__(**kwargs)
+        self._upstream, self._cassette = upstream, cassette
+
+    def send(self, request, **kwargs):
+        start = time.perf_counter()
+        response = super().send(request, **kwargs)
+        content = response.content
+        elapsed = time.perf_counter() - start
+        headers = {k: v for k, v in response.headers.items() if k.lower() not in _DROP_HEADERS}
+        self._cassette.append(
+            self._upstream, request.method, request.url, _request_body(request),
+            response.status_code, headers, content, elapsed,
+        )
+        return response
+
+class ReplayAdapter(BaseAdapter):
+    def __init__(self, upstream: str, cassette: Cassette):
+        super().__init__()
+        self._upstream, self._cassette = upstream, cassette
+        self._factor = _timing_factor()
+
+    def send(self, request, **kwargs):
+        try:
+            interaction = self._cassette.match(self._upstream, request.method, request.url, _request_body(request))
+        except CassetteMiss as e:
+            raise requests.ConnectionError(str(e), request=request)
+        if self._factor > 0:
+            time.sleep(interaction["elapsed"] * self._factor)
+        res = interaction["response"]
+        return _requests_response(request, res["status"], res["headers"], base64.b64decode(res["body"]))
+
+    def close(self):
+        pass
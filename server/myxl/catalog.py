@@ -0,0 +1,52 @@
+"""
+Cache katalog family paket (xl-stores/options/list).
+
+Konfigurasi ENV:
+  MYXL_CATALOG_CACHE_SIZE   jumlah entry maksimum, LRU (512)
+  MYXL_CATALOG_CACHE_TTL    umur segar, detik (300)
+  MYXL_CATALOG_CACHE_SWR    jendela stale-while-revalidate, detik (600)
+  MYXL_CATALOG_CACHE_SIE    jendela stale-if-error, detik (3600)
+  MYXL_CATALOG_CACHE_SCOPE  "subscriber" (default) atau "global"; katalog
+                            bisa berbeda per subscriber, jadi default-nya
+                            dipisah per pemanggil (token_manager.scope)
+
+Claim `sub` di id_token tidak diverifikasi, jadi tidak dipakai langsung
+sebagai key: token palsu dengan `sub` orang lain tidak boleh mendapat HIT
+dari katalog miliknya. Upstream yang menolak kredensial (401/403) tidak
+diganti nilai lama lewat stale-if-error.
+"""
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from .api_request import UpstreamAuthError, get_family_async
+from .cache import TTLCache
+from .catalog_index import catalog_index
+from .token_manager import token_manager
+
+family_cache = TTLCache(
+    maxsize=int(os.getenv("MYXL_CATALOG_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("MYXL_CATALOG_CACHE_TTL", "300")),
+    stale_while_revalidate=float(os.getenv("MYXL_CATALOG_CACHE_SWR", "600")),
+    stale_if_error=float(os.getenv("MYXL_CATALOG_CACHE_SIE", "3600")),
+    fatal_errors=(UpstreamAuthError,),
+)
+
+def catalog_scope(id_token: str) -> str:
+    if os.getenv("MYXL_CATALOG_CACHE_SCOPE", "subscriber").strip().lower() == "global":
+        return "global"
+    return token_manager.scope(id_token or "")
+
+async def get_family_cached(api_key: str, tokens: dict, family_code: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """
+    get_family lewat cache. Return (data, status cache HIT/MISS/STALE).
+    """
+    scope = catalog_scope(tokens.get("id_token"))
+
+    async def load():
+        data = await get_family_async(api_key, tokens, family_code, scope=scope)
+        if data is not None:
+            # family yang baru diambil user ikut memperbarui index pencarian
+            catalog_index.update_family(family_code, data)
+        return data
+
+    return await family_cache.get_or_load((scope, family_code), load)
@@ -0,0 +1,231 @@
+"""
+Index pencarian paket di memori: family -> package_variants ->
+package_options diratakan menjadi satu daftar opsi, bisa dicari berdasarkan
+nama, harga dan kode opsi tanpa menyentuh upstream.
+
+Index diisi crawler katalog (myxl.crawler) dan setiap kali family diambil
+ulang dari upstream lewat cache katalog. Katalog bisa sedikit berbeda per
+subscriber; index ini berisi versi terakhir yang terlihat bridge.
+"""
+import re, time
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+_WORD_RE = re.compile(r"[0-9a-z]+")
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+def _order_key(option: Dict[str, Any]) -> Tuple[float, str]:
+    price = option["price"]
+    return (float(price) if isinstance(price, (int, float)) else float("inf"), option["name"])
+
+def options_from_family(family_code: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Ratakan satu family menjadi daftar opsi paket.
+    """
+    family = data.get("package_family") or {}
+    family_name = family.get("name") if isinstance(family, dict) else None
+    options = []
+    for variant in data.get("package_variants") or []:
+        for option in variant.get("package_options") or []:
+            code = option.get("package_option_code")
+            if not code:
+                continue
+            options.append({
+                "code": code,
+                "name": option.get("name") or "",
+                "price": option.get("price"),
+                "family_code": family_code,
+                "family_name": family_name,
+                "variant_name": variant.get("name"),
+            })
+    return options
+
+class CatalogIndex:
+    """
+    Opsi per family disimpan apa adanya; struktur pencarian (kode -> opsi,
+    kata -> kode, daftar terurut harga/nama) diperbarui per family: kode
+    family lama dikeluarkan lalu kode barunya dimasukkan. Semua perubahan
+    sinkron di event loop, jadi pembaca tidak pernah melihat index setengah
+    jadi.
+
+    Kode opsi yang muncul di beberapa family diambil dari family yang paling
+    akhir diperbarui; kalau family itu hilang, family lain yang masih memuat
+    kode tersebut dipakai lagi.
+    """
+
+    def __init__(self):
+        # family_code -> (fetched_at, kode -> opsi), urut dari yang paling lama diperbarui
+        self._families: Dict[str, Tuple[float, Dict[str, Dict[str, Any]]]] = {}
+        self._holders: Dict[str, List[str]] = {}
+        self._by_code: Dict[str, Dict[str, Any]] = {}
+        self._by_word: Dict[str, Set[str]] = {}
+        self._by_price: List[Tuple[float, str]] = []
+        self._prices: List[float] = []
+        self._ordered: List[Tuple[float, str, str]] = []
+        self._vocab: List[str] = []
+        self.updated_at: Optional[float] = None
+
+    @staticmethod
+    def _parse(family_code: str, data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        return {option["code"]: option for option in options_from_family(family_code, data)}
+
+    def update_family(self, family_code: str, data: Dict[str, Any], fetched_at: Optional[float] = None):
+        self._unindex_family(family_code)
+        self._families[family_code] = (fetched_at or time.time(), self._parse(family_code, data))
+        self._index_family(family_code)
+        self.updated_at = time.time()
+
+    def load_families(self, entries: Iterable[Tuple[str, Dict[str, Any], float]]):
+        """
+        Isi banyak family sekaligus (family_code, data, fetched_at) dengan satu
+        kali rebuild. Family yang di index sudah lebih baru tidak ditimpa.
+        """
+        changed = False
+        for family_code, data, fetched_at in entries:
+            current = self._families.get(family_code)
+            if current is None or current[0] < fetched_at:
+                self._families.pop(family_code, None)
+                self._families[family_code] = (fetched_at, self._parse(family_code, data))
+                changed = True
+        if changed:
+            self._rebuild()
+
+    def remove_family(self, family_code: str):
+        if family_code in self._families:
+            self._unindex_family(family_code)
+            self.updated_at = time.time()
+
+    # ----- per family -----
+    def _index_family(self, family_code: str):
+        fetched_at, options = self._families[family_code]
+        for code, option in options.items():
+            self._holders.setdefault(code, []).append(family_code)
+            if code in self._by_code:
+                self._drop_option(code)
+            self._add_option({**option, "fetched_at": fetched_at})
+
+    def _unindex_family(self, family_code: str):
+        entry = self._families.pop(family_code, None)
+        if entry is None:
+            return
+        for code in entry[1]:
+            holders = self._holders[code]
+            holders.remove(family_code)
+            if self._by_code[code]["family_code"] == family_code:
+                self._drop_option(code)
+                if holders:
+                    fetched_at, options = self._families[holders[-1]]
+                    self._add_option({**options[code], "fetched_at": fetched_at})
+            if not holders:
+                del self._holders[code]
+
+    # ----- per opsi -----
+    @staticmethod
+    def _option_words(option: Dict[str, Any]) -> Set[str]:
+        return set(_words(option["name"]) + _words(option["variant_name"] or "") + _words(option["family_name"] or ""))
+
+    def _add_option(self, option: Dict[str, Any]):
+        code = option["code"]
+        self._by_code[code] = option
+        for word in self._option_words(option):
+            codes = self._by_word.get(word)
+            if codes is None:
+                codes = self._by_word[word] = set()
+                insort(self._vocab, word)
+            codes.add(code)
+        if isinstance(option["price"], (int, float)):
+            key = (float(option["price"]), code)
+            i = bisect_left(self._by_price, key)
+            self._by_price.insert(i, key)
+            self._prices.insert(i, key[0])
+        insort(self._ordered, (*_order_key(option), code))
+
+    def _drop_option(self, code: str):
+        option = self._by_code.pop(code)
+        for word in self._option_words(option):
+            codes = self._by_word[word]
+            codes.discard(code)
+            if not codes:
+                del self._by_word[word]
+                del self._vocab[bisect_left(self._vocab, word)]
+        if isinstance(option["price"], (int, float)):
+            i = bisect_left(self._by_price, (float(option["price"]), code))
+            del self._by_price[i]
+            del self._prices[i]
+        del self._ordered[bisect_left(self._ordered, (*_order_key(option), code))]
+
+    def _rebuild(self):
+        holders: Dict[str, List[str]] = {}
+        by_code: Dict[str, Dict[str, Any]] = {}
+        for family_code, (fetched_at, options) in self._families.items():
+            for code, option in options.items():
+                holders.setdefault(code, []).append(family_code)
+                by_code[code] = {**option, "fetched_at": fetched_at}
+        by_word: Dict[str, Set[str]] = {}
+        for code, option in by_code.items():
+            for word in self._option_words(option):
+                by_word.setdefault(word, set()).add(code)
+        by_price = sorted(
+            (float(option["price"]), code) for code, option in by_code.items()
+            if isinstance(option["price"], (int, float))
+        )
+        self._holders, self._by_code, self._by_word, self._by_price = holders, by_code, by_word, by_price
+        self._prices = [price for price, _ in by_price]
+        self._ordered = sorted((*_order_key(option), code) for code, option in by_code.items())
+        self._vocab = sorted(by_word)
+        self.updated_at = time.time()
+
+    def _match_words(self, q: str) -> Optional[Set[str]]:
+        # setiap kata query harus cocok (awalan) dengan salah satu kata opsi;
+        # kata yang berawalan sama berurutan di vocab, jadi cukup bisect
+        vocab, by_word = self._vocab, self._by_word
+        matched: Optional[Set[str]] = None
+        for word in _words(q):
+            codes: Set[str] = set()
+            i = bisect_left(vocab, word)
+            while i < len(vocab) and vocab[i].startswith(word):
+                codes |= by_word[vocab[i]]
+                i += 1
+            matched = codes if matched is None else matched & codes
+            if not matched:
+                return set()
+        return matched
+
+    def search(self, q: Optional[str] = None, max_price: Optional[float] = None,
+               min_price: Optional[float] = None, limit: int = 50) -> Dict[str, Any]:
+        by_code = self._by_code
+        if q and q in by_code:
+            candidates: Optional[Set[str]] = {q}
+        else:
+            candidates = self._match_words(q) if q else None
+
+        if max_price is not None or min_price is not None:
+            lo = 0 if min_price is None else bisect_left(self._prices, min_price)
+            hi = len(self._prices) if max_price is None else bisect_right(self._prices, max_price)
+            in_range = [code for _, code in self._by_price[lo:hi]]
+            codes = in_range if candidates is None else [code for code in in_range if code in candidates]
+        elif candidates is None:
+            return {
+                "total": len(self._ordered),
+                "items": [by_code[code] for *_, code in self._ordered[:max(0, limit)]],
+                "updated_at": self.updated_at,
+            }
+        else:
+            codes = sorted(candidates, key=lambda code: _order_key(by_code[code]))
+
+        return {
+            "total": len(codes),
+            "items": [by_code[code] for code in codes[:max(0, limit)]],
+            "updated_at": self.updated_at,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "families": len(self._families),
+            "options": len(self._by_code),
+            "updated_at": self.updated_at,
+        }
+
+catalog_index = CatalogIndex()
@@ -0,0 +1,168 @@
+"""
+Codec xdata: enkripsi + tanda tangan body request myXL dan dekripsi response.
+
+Backend dipilih per deployment lewat ENV MYXL_XDATA_CODEC:
+  remote  (default) panggil service xdata via HTTP (dua hop tambahan per call)
+  local   hitung AES/HMAC di proses ini; butuh XDATA_KEY dan X_API_BASE_SECRET
+
+Kedua backend harus menghasilkan output yang bisa dipertukarkan. Cek dengan
+korpus vektor:
+
+  python -m myxl.codec record vectors.json corpus.json   # rekam output remote
+  python -m myxl.codec verify corpus.json                # cocokkan backend lokal
+
+tests/test_codec.py menjalankan LocalCodec terhadap korpus referensi di
+tests/data, dan terhadap rekaman remote kalau MYXL_XDATA_CORPUS diisi.
+"""
+import json, os, sys, time
+from typing import Any, Dict, Optional
+
+from .crypto_helper import (
+    encryptsign_xdata, decrypt_xdata, encryptsign_xdata_async, decrypt_xdata_async,
+    encrypt_xdata_local, decrypt_xdata_local, make_x_signature,
+    XDATA_KEY, X_API_BASE_SECRET, API_KEY as DEFAULT_API_KEY,
+)
+
+def _check_encrypted(encrypted_payload: dict):
+    if not isinstance(encrypted_payload, dict) or "xdata" not in encrypted_payload or "xtime" not in encrypted_payload:
+        raise ValueError("Invalid encrypted data format. Expected a dictionary with 'xdata' and 'xtime' keys.")
+
+class XDataCodec:
+    """
+    Interface codec. encryptsign mengembalikan
+    {"encrypted_body": {"xdata", "xtime"}, "x_signature"}; decrypt mengembalikan
+    dict plaintext.
+    """
+    name = "base"
+
+    def encryptsign(self, api_key: str, method: str, path: str, id_token: str, payload: dict) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def decrypt(self, api_key: str, encrypted_payload: dict) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def encryptsign_async(self, api_key: str, method: str, path: str, id_token: str, payload: dict) -> Dict[str, Any]:
+        return self.encryptsign(api_key, method, path, id_token, payload)
+
+    async def decrypt_async(self, api_key: str, encrypted_payload: dict) -> Dict[str, Any]:
+        return self.decrypt(api_key, encrypted_payload)
+
+class RemoteCodec(XDataCodec):
+    name = "remote"
+
+    def encryptsign(self, api_key, method, path, id_token, payload):
+        return encryptsign_xdata(api_key=api_key, method=method, path=path, id_token=id_token, payload=payload)
+
+    def decrypt(self, api_key, encrypted_payload):
+        return decrypt_xdata(api_key, encrypted_payload)
+
+    async def encryptsign_async(self, api_key, method, path, id_token, payload):
+        return await encryptsign_xdata_async(api_key=api_key, method=method, path=path, id_token=id_token, payload=payload)
+
+    async def decrypt_async(self, api_key, encrypted_payload):
+        return await decrypt_xdata_async(api_key, encrypted_payload)
+
+class LocalCodec(XDataCodec):
+    """
+    Codec in-process. Operasinya cuma AES-CBC + HMAC-SHA512 di atas body kecil,
+    jadi versi async langsung memanggil versi sync tanpa thread.
+    """
+    name = "local"
+
+    def __init__(self, key: Optional[str] = None, secret: Optional[str] = None):
+        self.key = key or XDATA_KEY
+        self.secret = secret or X_API_BASE_SECRET
+        if not self.key or not self.secret:
+            raise RuntimeError("Codec xdata lokal butuh ENV XDATA_KEY dan X_API_BASE_SECRET")
+
+    def encryptsign(self, api_key, method, path, id_token, payload, xtime: Optional[int] = None):
+        xtime = xtime or int(time.time() * 1000)
+        plaintext = json.dumps(payload, separators=(",", ":"))
+        return {
+            "encrypted_body": {"xdata": encrypt_xdata_local(plaintext, xtime, self.key), "xtime": xtime},
+            "x_signature": make_x_signature(id_token, method, path, xtime // 1000, self.secret),
+        }
+
+    def decrypt(self, api_key, encrypted_payload):
+        _check_encrypted(encrypted_payload)
+        xtime = int(encrypted_payload["xtime"])
+        return json.loads(decrypt_xdata_local(encrypted_payload["xdata"], xtime, self.key))
+
+CODECS = {"remote": RemoteCodec, "local": LocalCodec}
+
+_codec: Optional[XDataCodec] = None
+
+def get_codec() -> XDataCodec:
+    global _codec
+    if _codec is None:
+        name = os.getenv("MYXL_XDATA_CODEC", "remote").strip().lower()
+        if name not in CODECS:
+            raise RuntimeError(f"MYXL_XDATA_CODEC tidak dikenal: {name} (pilihan: {', '.join(CODECS)})")
+        _codec = CODECS[name]()
+    return _codec
+
+# ---------- Korpus vektor ----------
+def record_corpus(vectors: list, api_key: str) -> list:
+    """
+    Jalankan tiap vektor {method, path, id_token, payload, response?} lewat
+    backend remote dan simpan outputnya sebagai referensi.
+    """
+    remote = RemoteCodec()
+    local = LocalCodec()
+    corpus = []
+    for v in vectors:
+        entry = dict(v)
+        entry["encrypted"] = remote.encryptsign(api_key, v["method"], v["path"], v["id_token"], v["payload"])
+        if "response" in v:
+            # body response dienkripsi lokal lalu didekripsi remote: arah sebaliknya
+            entry["response_encrypted"] = local.encryptsign(api_key, "POST", v["path"], v["id_token"], v["response"])["encrypted_body"]
+            entry["response_remote_plaintext"] = remote.decrypt(api_key, entry["response_encrypted"])
+        corpus.append(entry)
+    return corpus
+
+def verify_corpus(corpus: list, local: Optional[LocalCodec] = None) -> list:
+    """
+    Cocokkan backend lokal dengan output remote yang terekam. Return daftar
+    mismatch (kosong berarti kedua backend bisa dipertukarkan).
+    """
+    local = local or LocalCodec()
+    failures = []
+    for i, entry in enumerate(corpus):
+        expected = entry["encrypted"]
+        xtime = int(expected["encrypted_body"]["xtime"])
+        got = local.encryptsign("", entry["method"], entry["path"], entry["id_token"], entry["payload"], xtime=xtime)
+        if got["encrypted_body"]["xdata"] != expected["encrypted_body"]["xdata"]:
+            failures.append(f"#{i} {entry['path']}: xdata berbeda")
+        if got["x_signature"] != expected["x_signature"]:
+            failures.append(f"#{i} {entry['path']}: x_signature berbeda")
+        try:
+            decrypted = local.decrypt("", expected["encrypted_body"])
+        except ValueError as e:
+            failures.append(f"#{i} {entry['path']}: dekripsi lokal gagal: {e}")
+        else:
+            if decrypted != entry["payload"]:
+                failures.append(f"#{i} {entry['path']}: dekripsi lokal tidak sama dengan payload")
+        if "response_encrypted" in entry and entry["response_remote_plaintext"] != entry["response"]:
+            failures.append(f"#{i} {entry['path']}: remote gagal mendekripsi output lokal")
+    return failures
+
+def _main(argv: list) -> int:
+    if len(argv) == 3 and argv[0] == "record":
+        with open(argv[1]) as f:
+            vectors = json.load(f)
+        api_key = os.getenv("MYXL_API_KEY") or DEFAULT_API_KEY
+        with open(argv[2], "w") as f:
+            json.dump(record_corpus(vectors, api_key), f, indent=2)
+        return 0
+    if len(argv) == 2 and argv[0] == "verify":
+        with open(argv[1]) as f:
+            failures = verify_corpus(json.load(f))
+        for line in failures:
+            print(line)
+        print("OK" if not failures else f"{len(failures)} mismatch")
+        return 1 if failures else 0
+    print(__doc__)
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(_main(sys.argv[1:]))
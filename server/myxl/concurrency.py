@@ -0,0 +1,47 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, List, Tuple
+
+async def gather_bounded(
+    items: Iterable[Any],
+    fn: Callable[[Any], Awaitable[Any]],
+    limit: int,
+) -> List[Any]:
+    """
+    Jalankan fn(item) untuk semua item, paling banyak `limit` sekaligus.
+    Urutan hasil mengikuti urutan input; exception dikembalikan sebagai nilai
+    supaya satu item gagal tidak menggagalkan yang lain.
+    """
+    sem = asyncio.Semaphore(max(1, limit))
+
+    async def run(item):
+        async with sem:
+            return await fn(item)
+
+    return await asyncio.gather(*(run(item) for item in items), return_exceptions=True)
+
+async def iter_bounded(
+    items: Iterable[Any],
+    fn: Callable[[Any], Awaitable[Any]],
+    limit: int,
+) -> AsyncIterator[Tuple[Any, Any]]:
+    """
+    Seperti gather_bounded, tapi yield (item, hasil-atau-exception) begitu
+    masing-masing selesai. Task yang belum selesai dibatalkan kalau iterasi
+    dihentikan di tengah jalan.
+    """
+    sem = asyncio.Semaphore(max(1, limit))
+
+    async def run(item):
+        async with sem:
+            try:
+                return item, await fn(item)
+            except Exception as e:
+                return item, e
+
+    tasks = [asyncio.ensure_future(run(item)) for item in items]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
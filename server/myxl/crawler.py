@@ -0,0 +1,128 @@
+"""
+Crawler katalog di background: family yang dikonfigurasi diambil ulang
+secara berkala lalu dimasukkan ke index pencarian (myxl.catalog_index).
+
+Konfigurasi ENV:
+  MYXL_CRAWLER_FAMILIES       family code dipisah koma (default family XUT)
+  MYXL_CRAWLER_REFRESH_TOKEN  refresh_token akun yang dipakai crawler; tanpa
+                              ini crawler tidak jalan dan index hanya terisi
+                              dari family yang diambil user
+  MYXL_CRAWLER_INTERVAL       jeda antar putaran, detik (600)
+  MYXL_CRAWLER_CONCURRENCY    family yang diambil bersamaan (4)
+  MYXL_CRAWLER_DEADLINE       deadline satu family, detik (30)
+
+Token akun crawler dikelola token manager (refresh otomatis), API key sama
+dengan default bridge (MYXL_API_KEY atau bawaan crypto_helper).
+"""
+import asyncio, os, random, time
+from typing import Dict, List, Optional
+
+from .api_request import get_family_async
+from .catalog_index import catalog_index
+from .concurrency import gather_bounded
+from .crypto_helper import API_KEY as DEFAULT_API_KEY
+from .deadline import clear_deadline, reset_deadline, set_deadline
+from .log import get_logger, set_request_id
+from .metrics import Counter, REGISTRY
+from .paket_xut import PACKAGE_FAMILY_CODE
+from .token_manager import token_manager
+
+CRAWLS = Counter("myxl_crawler_fetches_total", "Family yang diambil crawler katalog.", ("status",))
+REGISTRY.append(CRAWLS)
+
+log = get_logger("crawler")
+
+CRAWLER_INTERVAL = float(os.getenv("MYXL_CRAWLER_INTERVAL", "600"))
+CRAWLER_CONCURRENCY = int(os.getenv("MYXL_CRAWLER_CONCURRENCY", "4"))
+CRAWLER_DEADLINE = float(os.getenv("MYXL_CRAWLER_DEADLINE", "30"))
+
+def crawler_families() -> List[str]:
+    value = os.getenv("MYXL_CRAWLER_FAMILIES", PACKAGE_FAMILY_CODE)
+    return [code.strip() for code in value.split(",") if code.strip()]
+
+def _api_key() -> str:
+    return os.getenv("MYXL_API_KEY") or DEFAULT_API_KEY
+
+class CatalogCrawler:
+    def __init__(self, families: List[str], refresh_token: Optional[str], interval: float = CRAWLER_INTERVAL):
+        self.families = families
+        self.refresh_token = refresh_token
+        self.interval = interval
+        self._tokens: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: Optional[float] = None
+        self.last_errors: Dict[str, str] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.families and self.refresh_token and self.interval > 0)
+
+    async def start(self):
+        if not self.enabled:
+            log.info("crawler katalog tidak aktif (MYXL_CRAWLER_REFRESH_TOKEN/FAMILIES kosong)")
+            return
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _session(self) -> dict:
+        if self._tokens is not None:
+            current = await token_manager.current_tokens(self._tokens["id_token"])
+            if current:
+                self._tokens = current
+                return current
+        # belum punya sesi, atau token manager sudah melupakannya: login ulang lewat refresh_token
+        self._tokens = await token_manager.refresh(self._tokens["refresh_token"] if self._tokens else self.refresh_token)
+        return self._tokens
+
+    async def _fetch(self, tokens: dict, family_code: str):
+        token = set_deadline(CRAWLER_DEADLINE)
+        try:
+            data = await get_family_async(_api_key(), tokens, family_code, scope="crawler")
+        finally:
+            reset_deadline(token)
+        if data is None:
+            raise RuntimeError("family tidak tersedia")
+        catalog_index.update_family(family_code, data)
+
+    async def run_once(self):
+        tokens = await self._session()
+        results = await gather_bounded(self.families, lambda code: self._fetch(tokens, code), CRAWLER_CONCURRENCY)
+        errors = {}
+        for code, result in zip(self.families, results):
+            if isinstance(result, Exception):
+                errors[code] = str(result) or type(result).__name__
+                CRAWLS.inc(status="error")
+            else:
+                CRAWLS.inc(status="ok")
+        self.last_run, self.last_errors = time.time(), errors
+        if errors:
+            # entry lama tetap di index: katalog basi lebih berguna daripada kosong
+            log.warning("crawl selesai dengan error", extra={"errors": errors})
+        else:
+            log.info("crawl selesai", extra={"families": len(self.families), **catalog_index.stats()})
+
+    async def _loop(self):
+        # task background: tidak terikat deadline request mana pun
+        clear_deadline()
+        set_request_id("crawler")
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                log.exception("crawl gagal")
+            # jitter supaya beberapa worker uvicorn tidak crawl bersamaan
+            await asyncio.sleep(self.interval * random.uniform(0.9, 1.1))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled, "families": len(self.families),
+            "last_run": self.last_run, "last_errors": self.last_errors,
+        }
+
+catalog_crawler = CatalogCrawler(crawler_families(), os.getenv("MYXL_CRAWLER_REFRESH_TOKEN"))
@@ -1,17 +1,38 @@
-import os, hmac, hashlib, requests, brotli, zlib, base64
+import os, hmac, hashlib, brotli, zlib, base64
 from datetime import datetime, timezone, timedelta
 from Crypto.Cipher import AES
-from Crypto.Util.Padding import pad
+from Crypto.Util.Padding import pad, unpad
+
+from .deadline import remaining_timeout
+from .jsonfast import dumps, loads
+from .http_client import get_async_client, get_session, register_upstream, TIMEOUT
+from .resilience import request_flags
 
 API_KEY = "vT8tINqHaOxXbGE7eOWAhA=="
 AX_API_SIG_KEY_ASCII = b"18b4d589826af50241177961590e6693"
 
-XDATA_DECRYPT_URL = "https://xdata.fuyuki.pw/api/decrypt"
-XDATA_ENCRYPT_SIGN_URL = "https://xdata.fuyuki.pw/api/encryptsign"
+XDATA_BASE_URL = os.getenv("MYXL_XDATA_BASE_URL", "https://xdata.fuyuki.pw").rstrip("/")
+XDATA_DECRYPT_URL = f"{XDATA_BASE_URL}/api/decrypt"
+XDATA_ENCRYPT_SIGN_URL = f"{XDATA_BASE_URL}/api/encryptsign"
+
+register_upstream("xdata", XDATA_BASE_URL)
 
 AES_KEY_ASCII = "5dccbf08920a5527"
 BLOCK = AES.block_size
 
+# Kunci untuk codec xdata in-process (lihat codec.LocalCodec); harus sama
+# dengan yang dipakai service xdata agar hasilnya bisa saling dipertukarkan.
+XDATA_KEY = os.getenv("XDATA_KEY", "")
+X_API_BASE_SECRET = os.getenv("X_API_BASE_SECRET", "")
+
+class XDataAuthError(Exception):
+    """Service xdata menolak API key (HTTP 401/403)."""
+
+def _raise_for_xdata(response, action: str):
+    if response.status_code in (401, 403):
+        raise XDataAuthError(f"{action} failed: API key rejected ({response.status_code})")
+    raise Exception(f"{action} failed: {response.text}")
+
 def random_iv_hex16() -> str:
     return os.urandom(8).hex()
 
@@ -83,12 +104,40 @@ def encryptsign_xdata(
         "body": payload
     }
 
-    response = requests.request("POST", XDATA_ENCRYPT_SIGN_URL, json=request_body, headers=headers, timeout=30)
+    response = get_session("xdata").post(XDATA_ENCRYPT_SIGN_URL, json=request_body, headers=headers, timeout=remaining_timeout(TIMEOUT, "xdata"))
     
     if response.status_code == 200:
-        return response.json()
+        return loads(response.content)
+    else:
+        _raise_for_xdata(response, "Encryption")
+
+async def encryptsign_xdata_async(
+        api_key: str,
+        method: str,
+        path: str,
+        id_token: str,
+        payload: dict
+    ) -> dict:
+    headers = {
+        "Content-Type": "application/json",
+        "x-api-key": api_key,
+    }
+
+    request_body = {
+        "id_token": id_token,
+        "method": method,
+        "path": path,
+        "body": payload
+    }
+
+    response = await get_async_client("xdata").post(
+        XDATA_ENCRYPT_SIGN_URL, content=dumps(request_body), headers=headers, extensions=request_flags(idempotent=True)
+    )
+
+    if response.status_code == 200:
+        return loads(response.content)
     else:
-        raise Exception(f"Encryption failed: {response.text}")
+        _raise_for_xdata(response, "Encryption")
     
 def decrypt_xdata(
     api_key: str,
@@ -102,12 +151,33 @@ def decrypt_xdata(
         "x-api-key": api_key,
     }
     
-    response = requests.request("POST", XDATA_DECRYPT_URL, json=encrypted_payload, headers=headers, timeout=30)
+    response = get_session("xdata").post(XDATA_DECRYPT_URL, json=encrypted_payload, headers=headers, timeout=remaining_timeout(TIMEOUT, "xdata"))
     
     if response.status_code == 200:
-        return response.json().get("plaintext")
+        return loads(response.content).get("plaintext")
     else:
-        raise Exception(f"Decryption failed: {response.text}")
+        _raise_for_xdata(response, "Decryption")
+
+async def decrypt_xdata_async(
+    api_key: str,
+    encrypted_payload: dict
+    ) -> dict:
+    if not isinstance(encrypted_payload, dict) or "xdata" not in encrypted_payload or "xtime" not in encrypted_payload:
+        raise ValueError("Invalid encrypted data format. Expected a dictionary with 'xdata' and 'xtime' keys.")
+
+    headers = {
+        "Content-Type": "application/json",
+        "x-api-key": api_key,
+    }
+
+    response = await get_async_client("xdata").post(
+        XDATA_DECRYPT_URL, content=dumps(encrypted_payload), headers=headers, extensions=request_flags(idempotent=True)
+    )
+
+    if response.status_code == 200:
+        return loads(response.content).get("plaintext")
+    else:
+        _raise_for_xdata(response, "Decryption")
 
 def make_x_signature_payment(access_token: str, sig_time_sec: int, package_code: str, token_payment:str) -> str:
     k = b"KRw1fXkLSwZLCU52GiEaNRsXFnURAhUUAH9MFmZZK2gPRDAIBjkMEBYdQkoWYmh2YhQCBEIKLDRbGR0zAk1OV2dXCEUzAz9THSsGGDwgbzVvYR9fQERbcgIxcB1aEh4rEB85dXRjdVsJQgM5DxAUOh4mdS9helFqd1VDRmA2AyMYKBoTE24YPWFLXUdpF2RGJGYhRnggDF0KGDE/FgUVZmFjd3ogKFo+DAkaPlY5PEoXWA4BQ0Y1JCVGPgwJGmAbOSBCVk1TFUtQNS0="
@@ -122,4 +192,23 @@ def make_x_signature_payment(access_token: str, sig_time_sec: int, package_code:
 
     msg = f"{access_token};{token_payment};{sig_time_sec};BUY_PACKAGE;BALANCE;{package_code};".encode("utf-8")
 
-    return hmac.new(key_bytes, msg, hashlib.sha512).hexdigest()
\ No newline at end of file
+    return hmac.new(key_bytes, msg, hashlib.sha512).hexdigest()
+
+# ---------- xdata in-process ----------
+def derive_xdata_iv(xtime_ms: int) -> bytes:
+    return hashlib.sha256(str(xtime_ms).encode("ascii")).hexdigest()[:16].encode("ascii")
+
+def encrypt_xdata_local(plaintext: str, xtime_ms: int, key: str | None = None) -> str:
+    cipher = AES.new((key or XDATA_KEY).encode("ascii"), AES.MODE_CBC, iv=derive_xdata_iv(xtime_ms))
+    ct = cipher.encrypt(pad(plaintext.encode("utf-8"), BLOCK))
+    return base64.urlsafe_b64encode(ct).decode("ascii")
+
+def decrypt_xdata_local(xdata: str, xtime_ms: int, key: str | None = None) -> str:
+    cipher = AES.new((key or XDATA_KEY).encode("ascii"), AES.MODE_CBC, iv=derive_xdata_iv(xtime_ms))
+    ct = base64.urlsafe_b64decode(xdata + "=" * (-len(xdata) % 4))
+    return unpad(cipher.decrypt(ct), BLOCK).decode("utf-8")
+
+def make_x_signature(id_token: str, method: str, path: str, sig_time_sec: int, secret: str | None = None) -> str:
+    key_str = f"{secret or X_API_BASE_SECRET};{id_token};{method};{path};{sig_time_sec}"
+    msg = f"{id_token};{sig_time_sec};"
+    return hmac.new(key_str.encode("utf-8"), msg.encode("utf-8"), hashlib.sha512).hexdigest()
@@ -0,0 +1,57 @@
+"""
+Deadline per request yang dibawa lewat contextvar ke semua hop upstream.
+
+Bridge memasang deadline di awal request (header X-Request-Deadline atau
+default per route). Setiap hop lalu hanya mendapat sisa waktu: transport
+async memotong timeout httpx ke sisa budget dan membatalkan hop yang lewat
+deadline, jalur sync memakai remaining_timeout() untuk timeout requests.
+Kalau tidak ada deadline (CLI, task background), semuanya berjalan seperti
+biasa dengan timeout bawaan.
+"""
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+_deadline: ContextVar[Optional[float]] = ContextVar("myxl_deadline", default=None)
+
+class DeadlineExceeded(Exception):
+    def __init__(self, what: str = "request"):
+        super().__init__(f"deadline terlewati sebelum {what} selesai")
+
+def set_deadline(seconds: Optional[float]):
+    """
+    Pasang deadline `seconds` dari sekarang (None menghapus). Return token
+    contextvar untuk reset_deadline.
+    """
+    return _deadline.set(None if seconds is None else time.monotonic() + seconds)
+
+def reset_deadline(token):
+    _deadline.reset(token)
+
+def clear_deadline():
+    """
+    Lepas deadline di context sekarang; untuk task background yang dibuat dari
+    dalam request tapi tidak boleh ikut mati bersama request itu.
+    """
+    _deadline.set(None)
+
+def remaining() -> Optional[float]:
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def check(what: str = "request"):
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(what)
+
+def remaining_timeout(default: float, what: str = "request") -> float:
+    """
+    Timeout untuk satu hop: default, dipotong ke sisa deadline kalau ada.
+    Raise DeadlineExceeded kalau budget sudah habis.
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded(what)
+    return min(default, left)
@@ -0,0 +1,133 @@
+"""
+Polling balance + quota-details untuk banyak akun sekaligus (fleet).
+
+Setiap akun mengambil balance dan quota-details paralel; antar akun dibatasi
+concurrency. Hasil dikirim per akun begitu selesai, atau diringkas.
+
+Konfigurasi ENV:
+  MYXL_FLEET_CONCURRENCY   akun yang dipoll bersamaan (16)
+  MYXL_FLEET_MAX_ACCOUNTS  akun maksimum per request (1000)
+"""
+import asyncio, os, time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+from .api_request import get_balance_async, get_quota_details_async
+from .auth_guard import id_token_rejection
+from .concurrency import iter_bounded
+from .deadline import DeadlineExceeded
+from .log import get_logger
+from .resilience import CircuitOpenError
+from .token_manager import token_manager
+
+log = get_logger("fleet")
+
+FLEET_CONCURRENCY = int(os.getenv("MYXL_FLEET_CONCURRENCY", "16"))
+FLEET_MAX_ACCOUNTS = int(os.getenv("MYXL_FLEET_MAX_ACCOUNTS", "1000"))
+
+SECTIONS = ("balance", "quotas")
+
+def _error(e: BaseException) -> str:
+    if isinstance(e, (CircuitOpenError, DeadlineExceeded)):
+        return str(e)
+    log.error("fleet section error", exc_info=e)
+    return "Downstream error"
+
+async def _tokens(account: dict) -> dict:
+    current = await token_manager.current_tokens(account["id_token"])
+    if current:
+        return {"id_token": current["id_token"], "access_token": current.get("access_token")}
+    return {"id_token": account["id_token"], "access_token": account.get("access_token")}
+
+async def poll_account(api_key: str, index: int, account: dict, include: Iterable[str]) -> Dict[str, Any]:
+    """
+    Balance dan/atau quota satu akun. Tidak pernah raise: kegagalan dicatat
+    per bagian di "errors".
+    """
+    start = time.perf_counter()
+    result: Dict[str, Any] = {"index": index, "label": account.get("label"), "ok": False, "errors": {}}
+    tokens = await _tokens(account)
+    reason = id_token_rejection(tokens["id_token"])
+    if reason:
+        result["errors"]["auth"] = reason
+    else:
+        calls = {}
+        if "balance" in include:
+            calls["balance"] = get_balance_async(api_key, tokens["id_token"])
+        if "quotas" in include:
+            calls["quotas"] = get_quota_details_async(api_key, tokens["id_token"])
+        values = await asyncio.gather(*calls.values(), return_exceptions=True)
+        for name, value in zip(calls, values):
+            if isinstance(value, BaseException):
+                result["errors"][name] = _error(value)
+            elif value is None:
+                result["errors"][name] = "Unauthorized / token expired / API key invalid"
+            else:
+                result[name] = value
+        result["ok"] = not result["errors"]
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+async def iter_fleet(api_key: str, accounts: List[dict], include: Iterable[str],
+                     concurrency: int = FLEET_CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield hasil tiap akun begitu selesai (urutan selesai; field index
+    menunjuk posisi akun di request).
+    """
+    include = set(include)
+    async for (index, account), result in iter_bounded(
+        list(enumerate(accounts)), lambda item: poll_account(api_key, item[0], item[1], include), concurrency
+    ):
+        if isinstance(result, Exception):
+            result = {"index": index, "label": account.get("label"), "ok": False, "errors": {"account": _error(result)}}
+        yield result
+
+class FleetSummary:
+    """
+    Agregat hasil poll: jumlah akun sukses/gagal, statistik balance, jumlah
+    quota per nama dan jenis error.
+    """
+
+    def __init__(self):
+        self.accounts = 0
+        self.ok = 0
+        self.balances: List[float] = []
+        self.quotas = 0
+        self.quotas_by_name: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.failed: List[dict] = []
+
+    def add(self, result: Dict[str, Any]):
+        self.accounts += 1
+        self.ok += result["ok"]
+        balance = result.get("balance")
+        if isinstance(balance, dict) and isinstance(balance.get("remaining"), (int, float)):
+            self.balances.append(balance["remaining"])
+        for quota in result.get("quotas") or []:
+            self.quotas += 1
+            name = quota.get("name") or quota.get("quota_code") or "?"
+            self.quotas_by_name[name] = self.quotas_by_name.get(name, 0) + 1
+        for section, error in result["errors"].items():
+            key = f"{section}: {error}"
+            self.errors[key] = self.errors.get(key, 0) + 1
+        if result["errors"]:
+            self.failed.append({"index": result["index"], "label": result.get("label"), "errors": result["errors"]})
+
+    def as_dict(self, elapsed: Optional[float] = None) -> Dict[str, Any]:
+        balances = self.balances
+        summary = {
+            "accounts": self.accounts,
+            "ok": self.ok,
+            "failed": self.accounts - self.ok,
+            "balance": {
+                "accounts": len(balances),
+                "total": sum(balances),
+                "min": min(balances) if balances else None,
+                "max": max(balances) if balances else None,
+            },
+            "quotas": {"total": self.quotas, "by_name": dict(sorted(self.quotas_by_name.items()))},
+            "errors": self.errors,
+            "failed_accounts": self.failed,
+        }
+        if elapsed is not None:
+            summary["elapsed_ms"] = round(elapsed * 1000, 1)
+        return summary
@@ -0,0 +1,228 @@
+"""
+Lapisan HTTP bersama untuk semua upstream (CIAM, myXL, xdata).
+
+Setiap upstream punya pool koneksi sendiri (keep-alive, opsional HTTP/2)
+dan cache DNS, sehingga satu request ke bridge tidak lagi membayar
+TCP+TLS handshake baru untuk tiap hop.
+
+Konfigurasi lewat ENV (default di kurung):
+  MYXL_HTTP_TIMEOUT          timeout total per request, detik (30)
+  MYXL_CONNECT_TIMEOUT       timeout connect, detik (10)
+  MYXL_POOL_MAX_CONNECTIONS  maksimum koneksi per upstream (100)
+  MYXL_POOL_MAX_KEEPALIVE    koneksi idle yang disimpan per upstream (20)
+  MYXL_KEEPALIVE_EXPIRY      umur koneksi idle, detik (60)
+  MYXL_HTTP2                 1 untuk HTTP/2 multiplexing, butuh paket h2 (0)
+  MYXL_DNS_TTL               TTL cache DNS, detik; 0 mematikan cache (300)
+  MYXL_WARMUP_CONNECTIONS    koneksi yang dibuka saat startup per upstream (2)
+
+Setiap nilai pool bisa dioverride per upstream dengan sisipan nama
+upstream, misal MYXL_XDATA_POOL_MAX_CONNECTIONS atau MYXL_CIAM_HTTP2.
+
+Mode record/replay (MYXL_TRANSPORT_MODE) dijelaskan di myxl.cassette;
+circuit breaker, retry dan hedging di myxl.resilience. MYXL_HTTP_TIMEOUT dan
+MYXL_CONNECT_TIMEOUT juga bisa diatur per upstream (MYXL_XDATA_HTTP_TIMEOUT).
+"""
+import asyncio, ipaddress, os, socket, time
+import importlib.util
+from typing import Dict, List, Optional, Tuple
+
+import httpcore
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from .cassette import RecordingAdapter, RecordingTransport, ReplayAdapter, ReplayTransport, get_cassette, transport_mode
+from .log import get_logger
+from .resilience import CircuitBreaker, ResilientTransport
+
+log = get_logger("http_client")
+
+def _env(name: str, upstream: Optional[str], default: str) -> str:
+    if upstream:
+        scoped = os.getenv(name.replace("MYXL_", f"MYXL_{upstream.upper()}_", 1))
+        if scoped is not None:
+            return scoped
+    return os.getenv(name, default)
+
+def _env_float(name: str, default: float, upstream: Optional[str] = None) -> float:
+    return float(_env(name, upstream, str(default)))
+
+def _env_int(name: str, default: int, upstream: Optional[str] = None) -> int:
+    return int(_env(name, upstream, str(default)))
+
+def _env_bool(name: str, default: bool, upstream: Optional[str] = None) -> bool:
+    return _env(name, upstream, "1" if default else "0").strip().lower() in ("1", "true", "yes", "on")
+
+TIMEOUT = _env_float("MYXL_HTTP_TIMEOUT", 30.0)
+CONNECT_TIMEOUT = _env_float("MYXL_CONNECT_TIMEOUT", 10.0)
+
+# nama upstream -> origin, dipakai untuk warm-up
+UPSTREAMS: Dict[str, str] = {}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_breakers: Dict[str, CircuitBreaker] = {}
+_sessions: Dict[str, requests.Session] = {}
+
+def register_upstream(name: str, origin: str):
+    UPSTREAMS[name] = origin.rstrip("/")
+
+# ---------- DNS cache ----------
+class CachingDNSBackend(httpcore.AsyncNetworkBackend):
+    """
+    Network backend yang menyimpan hasil getaddrinfo selama `ttl` detik.
+    SNI/Host tetap memakai hostname asli, hanya resolusinya yang di-cache.
+    """
+
+    def __init__(self, ttl: float):
+        self._ttl = ttl
+        self._backend = httpcore.AnyIOBackend()
+        self._cache: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+
+    async def _resolve(self, host: str, port: int) -> List[str]:
+        now = time.monotonic()
+        hit = self._cache.get((host, port))
+        if hit and hit[0] > now:
+            return hit[1]
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addrs = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[(host, port)] = (now + self._ttl, addrs)
+        return addrs
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        try:
+            ipaddress.ip_address(host)
+            addrs = [host]
+        except ValueError:
+            addrs = await self._resolve(host, port)
+
+        last_exc: Optional[Exception] = None
+        for addr in addrs:
+            try:
+                return await self._backend.connect_tcp(
+                    addr, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+                )
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                last_exc = e
+        # semua alamat gagal: buang cache supaya percobaan berikutnya resolve ulang
+        self._cache.pop((host, port), None)
+        raise last_exc
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+# ---------- Async clients ----------
+def _http2_enabled(upstream: str) -> bool:
+    if not _env_bool("MYXL_HTTP2", False, upstream):
+        return False
+    if importlib.util.find_spec("h2") is None:
+        log.warning("MYXL_HTTP2 aktif tapi paket h2 tidak terpasang; %s pakai HTTP/1.1", upstream)
+        return False
+    return True
+
+def _limits(upstream: str) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=_env_int("MYXL_POOL_MAX_CONNECTIONS", 100, upstream),
+        max_keepalive_connections=_env_int("MYXL_POOL_MAX_KEEPALIVE", 20, upstream),
+        keepalive_expiry=_env_float("MYXL_KEEPALIVE_EXPIRY", 60.0, upstream),
+    )
+
+def build_transport(upstream: str) -> httpx.AsyncBaseTransport:
+    mode = transport_mode()
+    if mode == "replay":
+        transport = ReplayTransport(upstream, get_cassette())
+    else:
+        transport = _live_transport(upstream)
+        if mode == "record":
+            transport = RecordingTransport(transport, upstream, get_cassette())
+    resilient = ResilientTransport(transport, upstream)
+    _breakers[upstream] = resilient.breaker
+    return resilient
+
+def _live_transport(upstream: str) -> httpx.AsyncHTTPTransport:
+    limits = _limits(upstream)
+    http2 = _http2_enabled(upstream)
+    transport = httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+
+    dns_ttl = _env_float("MYXL_DNS_TTL", 300.0, upstream)
+    if dns_ttl > 0:
+        # httpx belum mengekspos network_backend, jadi pool-nya diganti langsung
+        transport._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            network_backend=CachingDNSBackend(dns_ttl),
+        )
+    return transport
+
+def get_async_client(upstream: str) -> httpx.AsyncClient:
+    """
+    AsyncClient bersama untuk satu upstream ("ciam", "myxl", "xdata").
+    Dibuat lazy supaya terikat ke event loop yang sedang jalan.
+    """
+    client = _clients.get(upstream)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            transport=build_transport(upstream),
+            timeout=httpx.Timeout(
+                _env_float("MYXL_HTTP_TIMEOUT", TIMEOUT, upstream),
+                connect=_env_float("MYXL_CONNECT_TIMEOUT", CONNECT_TIMEOUT, upstream),
+            ),
+        )
+        _clients[upstream] = client
+    return client
+
+def breaker_states() -> Dict[str, dict]:
+    return {upstream: breaker.snapshot() for upstream, breaker in _breakers.items()}
+
+async def _open_connection(upstream: str, origin: str):
+    try:
+        await get_async_client(upstream).head(origin + "/")
+    except Exception as e:
+        log.info("warm-up %s gagal: %s", upstream, e)
+
+async def warmup():
+    """
+    Buka beberapa koneksi keep-alive ke tiap upstream supaya request pertama
+    tidak membayar DNS + TCP + TLS handshake.
+    """
+    if transport_mode() != "live":
+        return
+    tasks = []
+    for upstream, origin in UPSTREAMS.items():
+        n = _env_int("MYXL_WARMUP_CONNECTIONS", 2, upstream)
+        tasks.extend(_open_connection(upstream, origin) for _ in range(n))
+    if tasks:
+        await asyncio.gather(*tasks)
+
+async def aclose():
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
+
+# ---------- Sync sessions (CLI) ----------
+def get_session(upstream: str) -> requests.Session:
+    """
+    requests.Session keep-alive per upstream untuk jalur sync (CLI).
+    """
+    session = _sessions.get(upstream)
+    if session is None:
+        session = requests.Session()
+        mode = transport_mode()
+        pool_maxsize = _env_int("MYXL_POOL_MAX_KEEPALIVE", 20, upstream)
+        if mode == "replay":
+            adapter = ReplayAdapter(upstream, get_cassette())
+        elif mode == "record":
+            adapter = RecordingAdapter(upstream, get_cassette(), pool_connections=1, pool_maxsize=pool_maxsize)
+        else:
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _sessions[upstream] = session
+    return session
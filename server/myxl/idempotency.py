@@ -0,0 +1,191 @@
+"""
+Idempotency-Key untuk operasi yang tidak boleh terjadi dua kali (purchase).
+
+Satu key (per pemanggil) = satu operasi. Scope-nya dari
+token_manager.scope: subject hanya untuk id_token yang pernah berhasil
+login/refresh lewat bridge, selain itu fingerprint token; claim `sub` yang
+tidak diverifikasi tidak cukup untuk melihat hasil milik orang lain.
+
+- key yang operasinya masih berjalan di proses ini: pemanggil ikut menunggu
+  operasi yang sama, tidak memulai rantai baru
+- key yang operasinya sudah selesai: hasil tersimpan langsung dikembalikan
+- key yang sedang berjalan di worker lain, atau yang statusnya tidak
+  diketahui karena proses mati di tengah jalan: ditolak 409
+- key yang sama untuk request berbeda (mis. paket lain): ditolak 422
+
+Hasil disimpan di SQLite (WAL) supaya tetap berlaku setelah restart dan
+terlihat oleh semua worker uvicorn. Hasil berisi respons upstream apa adanya,
+jadi perlakukan file ini seperti token store.
+
+Konfigurasi ENV:
+  MYXL_IDEMPOTENCY_PATH   file SQLite (default idempotency.sqlite3 di MYXL_STATE_DIR)
+  MYXL_IDEMPOTENCY_TTL    berapa lama key yang sudah selesai diingat, detik (86400)
+"""
+import asyncio, os, sqlite3, threading, time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from .jsonfast import dumps, loads
+from .log import get_logger
+from .metrics import Counter, REGISTRY
+from .state import connect_sqlite, state_path
+
+IDEMPOTENCY_REPLAYS = Counter(
+    "myxl_idempotency_replays_total", "Request dengan Idempotency-Key yang tidak memulai operasi baru.", ("kind",)
+)
+REGISTRY.append(IDEMPOTENCY_REPLAYS)
+
+log = get_logger("idempotency")
+
+MAX_KEY_LENGTH = 255
+PURGE_INTERVAL = 60.0
+
+# (status HTTP, body JSON)
+Outcome = Tuple[int, Any]
+
+class IdempotencyError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+class IdempotencyStore:
+    """
+    Tabel key -> status (pending/done) + hasil. Semua method dipanggil dari
+    thread, bukan dari event loop.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttl: Optional[float] = None):
+        self.path = path or os.getenv("MYXL_IDEMPOTENCY_PATH") or state_path("idempotency.sqlite3")
+        self.ttl = ttl if ttl is not None else float(os.getenv("MYXL_IDEMPOTENCY_TTL", "86400"))
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._purged_at = 0.0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = connect_sqlite(self.path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS idempotency ("
+                "scope TEXT NOT NULL, key TEXT NOT NULL, fingerprint TEXT NOT NULL, state TEXT NOT NULL, "
+                "status INTEGER, body TEXT, created_at REAL NOT NULL, PRIMARY KEY (scope, key))"
+            )
+        return self._conn
+
+    def _purge(self, now: float):
+        if now - self._purged_at < PURGE_INTERVAL:
+            return
+        self._purged_at = now
+        self._db().execute("DELETE FROM idempotency WHERE created_at < ?", (now - self.ttl,))
+
+    def begin(self, scope: str, key: str, fingerprint: str) -> Optional[tuple]:
+        """
+        Klaim key. Return None kalau klaim berhasil (operasi boleh dimulai),
+        atau baris yang sudah ada: (fingerprint, state, status, body).
+        """
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            self._purge(now)
+            inserted = db.execute(
+                "INSERT OR IGNORE INTO idempotency (scope, key, fingerprint, state, created_at) "
+                "VALUES (?, ?, ?, 'pending', ?)",
+                (scope, key, fingerprint, now),
+            ).rowcount
+            if inserted:
+                return None
+            return db.execute(
+                "SELECT fingerprint, state, status, body FROM idempotency WHERE scope = ? AND key = ?",
+                (scope, key),
+            ).fetchone()
+
+    def complete(self, scope: str, key: str, status: int, body: Any):
+        with self._lock:
+            self._db().execute(
+                "UPDATE idempotency SET state = 'done', status = ?, body = ? WHERE scope = ? AND key = ?",
+                (status, dumps(body).decode(), scope, key),
+            )
+
+    def abandon(self, scope: str, key: str):
+        """
+        Lepas klaim operasi yang gagal sebelum mengubah apa pun di upstream,
+        supaya key yang sama boleh dicoba lagi.
+        """
+        with self._lock:
+            self._db().execute(
+                "DELETE FROM idempotency WHERE scope = ? AND key = ? AND state = 'pending'", (scope, key)
+            )
+
+class Idempotency:
+    """
+    Lapisan async di atas store: operasi dengan key yang sama di proses ini
+    berbagi satu task (seperti SingleFlight), hasilnya dicatat ke store.
+    """
+
+    def __init__(self, store: IdempotencyStore):
+        self.store = store
+        self._inflight: Dict[Hashable, Tuple[str, asyncio.Future]] = {}
+
+    def _done(self, k: Hashable, task: asyncio.Future):
+        entry = self._inflight.get(k)
+        if entry is not None and entry[1] is task:
+            del self._inflight[k]
+        if not task.cancelled():
+            task.exception()
+
+    async def _execute(self, scope: str, key: str, fingerprint: str,
+                       fn: Callable[[], Awaitable[Outcome]]) -> Tuple[Outcome, bool]:
+        row = await asyncio.to_thread(self.store.begin, scope, key, fingerprint)
+        if row is not None:
+            stored_fingerprint, state, status, body = row
+            if stored_fingerprint != fingerprint:
+                raise IdempotencyError(422, "Idempotency-Key sudah dipakai untuk request lain.")
+            if state != "done":
+                IDEMPOTENCY_REPLAYS.inc(kind="conflict")
+                raise IdempotencyError(409, "Request dengan Idempotency-Key ini masih diproses atau statusnya tidak diketahui.")
+            IDEMPOTENCY_REPLAYS.inc(kind="stored")
+            return (status, loads(body)), True
+
+        try:
+            outcome = await fn()
+        except BaseException:
+            # fn hanya raise kalau belum ada yang berubah di upstream (lihat caller)
+            await asyncio.to_thread(self.store.abandon, scope, key)
+            raise
+        try:
+            await asyncio.to_thread(self.store.complete, scope, key, *outcome)
+        except Exception:
+            log.exception("gagal menyimpan hasil idempotency key")
+        return outcome, False
+
+    async def run(self, scope: str, key: str, fingerprint: str,
+                  fn: Callable[[], Awaitable[Outcome]]) -> Tuple[Outcome, bool]:
+        """
+        Jalankan fn sekali per (scope, key). Return (outcome, replayed);
+        replayed True kalau hasilnya bukan dari eksekusi milik pemanggil ini.
+        fn mengembalikan (status, body) yang disimpan, atau raise kalau
+        operasi boleh diulang dengan key yang sama. Raise IdempotencyError
+        untuk key yang bentrok.
+        """
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise IdempotencyError(400, f"Idempotency-Key harus 1-{MAX_KEY_LENGTH} karakter.")
+
+        k = (scope, key)
+        entry = self._inflight.get(k)
+        if entry is not None:
+            if entry[0] != fingerprint:
+                raise IdempotencyError(422, "Idempotency-Key sudah dipakai untuk request lain.")
+            IDEMPOTENCY_REPLAYS.inc(kind="attached")
+            outcome, _ = await asyncio.shield(entry[1])
+            return outcome, True
+
+        # task terpisah: client yang disconnect tidak membatalkan pembelian
+        # yang sudah berjalan, dan pemanggil berikutnya bisa ikut menunggu
+        task = asyncio.ensure_future(self._execute(scope, key, fingerprint, fn))
+        self._inflight[k] = (fingerprint, task)
+        task.add_done_callback(lambda t: self._done(k, t))
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {"inflight": len(self._inflight)}
+
+purchase_idempotency = Idempotency(IdempotencyStore())
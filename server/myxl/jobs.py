@@ -0,0 +1,290 @@
+"""
+Antrean job pembelian di background: banyak (token, package_option_code)
+sekaligus, langsung atau terjadwal, dijalankan worker pool lewat
+purchase_package_async tanpa menahan koneksi HTTP client.
+
+Konfigurasi ENV:
+  MYXL_JOB_WORKERS            worker yang mengambil job dari antrean (8)
+  MYXL_JOB_HOST_CONCURRENCY   pembelian bersamaan maksimum per host myXL (4)
+  MYXL_JOB_MAX_ATTEMPTS       percobaan maksimum per job (3)
+  MYXL_JOB_RETRY_BACKOFF      backoff dasar antar percobaan, detik; eksponensial (2)
+  MYXL_JOB_DEADLINE           deadline satu percobaan, detik (45)
+  MYXL_JOB_MAX_BATCH          job maksimum per batch (500)
+  MYXL_JOB_RETENTION          batch yang sudah selesai diingat selama ini, detik (3600)
+
+Job hanya diulang kalau pembelian gagal sebelum settlement terkirim (detail/
+payment option gagal, breaker terbuka, deadline habis sebelum kirim);
+settlement yang sudah terkirim tidak pernah diulang, termasuk yang hasilnya
+tidak diketahui, supaya tidak ada pembelian ganda. Job disimpan di memori proses: job yang
+belum selesai hilang kalau proses restart.
+"""
+import asyncio, heapq, itertools, os, time, uuid
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from .api_request import BASE_URL, purchase_package_async, settlement_unknown
+from .auth_guard import id_token_rejection
+from .deadline import DeadlineExceeded, clear_deadline, reset_deadline, set_deadline
+from .log import get_logger, reset_request_id, set_request_id
+from .metrics import Counter, REGISTRY
+from .resilience import CircuitOpenError
+from .token_manager import token_manager
+
+JOBS_FINISHED = Counter("myxl_jobs_finished_total", "Job pembelian yang selesai.", ("status",))
+JOB_RETRIES = Counter("myxl_job_retries_total", "Percobaan ulang job pembelian.")
+REGISTRY.extend([JOBS_FINISHED, JOB_RETRIES])
+
+log = get_logger("jobs")
+
+JOB_WORKERS = int(os.getenv("MYXL_JOB_WORKERS", "8"))
+JOB_HOST_CONCURRENCY = int(os.getenv("MYXL_JOB_HOST_CONCURRENCY", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("MYXL_JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = float(os.getenv("MYXL_JOB_RETRY_BACKOFF", "2"))
+JOB_DEADLINE = float(os.getenv("MYXL_JOB_DEADLINE", "45"))
+JOB_MAX_BATCH = int(os.getenv("MYXL_JOB_MAX_BATCH", "500"))
+JOB_RETENTION = float(os.getenv("MYXL_JOB_RETENTION", "3600"))
+
+# scheduled -> running -> (retrying -> running)* -> succeeded | failed
+TERMINAL = {"succeeded", "failed"}
+
+class Job:
+    def __init__(self, batch: "Batch", api_key: str, tokens: dict, package_option_code: str,
+                 run_at: float, max_attempts: int):
+        self.id = uuid.uuid4().hex
+        self.batch = batch
+        self.api_key = api_key
+        self.tokens = tokens
+        self.package_option_code = package_option_code
+        self.run_at = run_at
+        self.max_attempts = max_attempts
+        self.status = "scheduled"
+        self.attempts = 0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.finished_at: Optional[float] = None
+
+    def snapshot(self) -> dict:
+        # token tidak pernah ikut keluar
+        return {
+            "id": self.id, "batch_id": self.batch.id, "package_option_code": self.package_option_code,
+            "status": self.status, "attempts": self.attempts, "run_at": self.run_at,
+            "finished_at": self.finished_at, "error": self.error, "result": self.result,
+        }
+
+class Batch:
+    """
+    Sekumpulan job dari satu request, plus log event perubahan status untuk
+    feed progress.
+    """
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.created_at = time.time()
+        self.jobs: List[Job] = []
+        self.events: List[dict] = []
+        self._changed = asyncio.Event()
+
+    @property
+    def done(self) -> bool:
+        return all(job.status in TERMINAL for job in self.jobs)
+
+    @property
+    def finished_at(self) -> Optional[float]:
+        if not self.done:
+            return None
+        return max((job.finished_at or self.created_at for job in self.jobs), default=self.created_at)
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for job in self.jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def summary(self) -> dict:
+        return {"id": self.id, "created_at": self.created_at, "done": self.done,
+                "total": len(self.jobs), "counts": self.counts()}
+
+    def snapshot(self) -> dict:
+        return {**self.summary(), "jobs": [job.snapshot() for job in self.jobs]}
+
+    def emit(self, job: Job):
+        self.events.append({"type": "job", **job.snapshot()})
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def follow(self) -> AsyncIterator[dict]:
+        """
+        Semua event sejak batch dibuat, lalu event baru sampai semua job
+        selesai; ditutup ringkasan batch.
+        """
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.done:
+                break
+            await self._changed.wait()
+        yield {"type": "batch", **self.summary()}
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS, host_concurrency: int = JOB_HOST_CONCURRENCY):
+        self.workers = workers
+        self.host_concurrency = host_concurrency
+        self._heap: List[Tuple[float, int, Job]] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self.batches: Dict[str, Batch] = {}
+        self.jobs: Dict[str, Job] = {}
+
+    # ----- API -----
+    def submit(self, api_key: str, items: List[Tuple[dict, str]], run_at: Optional[float] = None,
+               max_attempts: Optional[int] = None) -> Batch:
+        """
+        items: (tokens, package_option_code). run_at epoch detik; None = sekarang.
+        """
+        if not items or len(items) > JOB_MAX_BATCH:
+            raise ValueError(f"batch harus berisi 1-{JOB_MAX_BATCH} job")
+        self._purge()
+        now = time.time()
+        run_at = max(run_at or now, now)
+        attempts = max(1, max_attempts or JOB_MAX_ATTEMPTS)
+        batch = Batch()
+        for tokens, package_option_code in items:
+            job = Job(batch, api_key, tokens, package_option_code, run_at, attempts)
+            batch.jobs.append(job)
+            self.jobs[job.id] = job
+            batch.emit(job)
+            self._push(job)
+        self.batches[batch.id] = batch
+        log.info("batch submitted", extra={"batch_id": batch.id, "jobs": len(batch.jobs), "run_at": run_at})
+        return batch
+
+    def get_batch(self, batch_id: str) -> Optional[Batch]:
+        return self.batches.get(batch_id)
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {"queued": len(self._heap), "batches": len(self.batches), "jobs": len(self.jobs)}
+
+    # ----- lifecycle -----
+    async def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ----- internal -----
+    def _push(self, job: Job):
+        heapq.heappush(self._heap, (job.run_at, next(self._seq), job))
+        self._wakeup.set()
+
+    def _purge(self):
+        cutoff = time.time() - JOB_RETENTION
+        for batch_id, batch in list(self.batches.items()):
+            finished_at = batch.finished_at
+            if finished_at is not None and finished_at < cutoff:
+                del self.batches[batch_id]
+                for job in batch.jobs:
+                    self.jobs.pop(job.id, None)
+
+    async def _next(self) -> Job:
+        while True:
+            now = time.time()
+            if self._heap and self._heap[0][0] <= now:
+                return heapq.heappop(self._heap)[2]
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        # job tidak terikat deadline/request id request yang men-submit-nya
+        clear_deadline()
+        while True:
+            job = await self._next()
+            try:
+                await self._run(job)
+            except Exception as e:
+                log.exception("job worker error")
+                self._finish(job, "failed", error=str(e))
+
+    def _host_limit(self) -> asyncio.Semaphore:
+        host = urlsplit(BASE_URL).netloc
+        sem = self._hosts.get(host)
+        if sem is None:
+            sem = self._hosts[host] = asyncio.Semaphore(self.host_concurrency)
+        return sem
+
+    def _finish(self, job: Job, status: str, result: Any = None, error: Optional[str] = None):
+        job.status, job.result, job.error = status, result, error
+        job.finished_at = time.time()
+        job.tokens = {}
+        JOBS_FINISHED.inc(status=status)
+        job.batch.emit(job)
+
+    def _retry(self, job: Job, error: str, delay: float = 0.0):
+        if job.attempts >= job.max_attempts:
+            self._finish(job, "failed", error=error)
+            return
+        job.status, job.error = "retrying", error
+        job.run_at = time.time() + max(delay, JOB_RETRY_BACKOFF * (2 ** (job.attempts - 1)))
+        JOB_RETRIES.inc()
+        job.batch.emit(job)
+        self._push(job)
+
+    async def _tokens(self, job: Job) -> dict:
+        # token yang dikenal token manager dipakai versi terbarunya (job terjadwal
+        # bisa jalan setelah id_token asli kedaluwarsa)
+        current = await token_manager.current_tokens(job.tokens["id_token"])
+        if current:
+            return {"id_token": current["id_token"],
+                    "access_token": current.get("access_token") or job.tokens.get("access_token")}
+        return job.tokens
+
+    async def _run(self, job: Job):
+        async with self._host_limit():
+            job.status = "running"
+            job.attempts += 1
+            job.batch.emit(job)
+            rid, rid_token = set_request_id(f"job-{job.id}")
+            deadline_token = set_deadline(JOB_DEADLINE)
+            try:
+                tokens = await self._tokens(job)
+                reason = id_token_rejection(tokens["id_token"])
+                if reason:
+                    self._finish(job, "failed", error=reason)
+                    return
+                result = await purchase_package_async(job.api_key, tokens, job.package_option_code)
+            # purchase_package_async hanya raise sebelum settlement terkirim
+            except CircuitOpenError as e:
+                self._retry(job, str(e), e.retry_after)
+                return
+            except DeadlineExceeded as e:
+                self._retry(job, str(e))
+                return
+            finally:
+                reset_deadline(deadline_token)
+                reset_request_id(rid_token)
+
+        if result is None:
+            self._retry(job, "pembelian gagal sebelum settlement")
+        elif settlement_unknown(result):
+            # settlement sudah terkirim: jangan diulang
+            self._finish(job, "failed", result=result, error="status tidak diketahui")
+        elif isinstance(result, dict) and result.get("status") == "SUCCESS":
+            self._finish(job, "succeeded", result=result)
+        else:
+            self._finish(job, "failed", result=result, error="settlement ditolak upstream")
+
+job_queue = JobQueue()
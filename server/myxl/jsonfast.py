@@ -0,0 +1,29 @@
+"""
+Encode/decode JSON di jalur panas: orjson kalau terpasang, json stdlib kalau
+tidak. dumps selalu menghasilkan bytes UTF-8 ringkas (tanpa spasi), loads
+menerima bytes atau str. Error parse selalu subclass ValueError.
+"""
+import json
+from typing import Any, Callable, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson ada di requirements.txt
+    orjson = None
+
+if orjson is not None:
+    _OPTS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any, sort_keys: bool = False, default: Optional[Callable] = None) -> bytes:
+        return orjson.dumps(obj, default=default, option=_OPTS | orjson.OPT_SORT_KEYS if sort_keys else _OPTS)
+
+    def loads(data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+else:
+    def dumps(obj: Any, sort_keys: bool = False, default: Optional[Callable] = None) -> bytes:
+        return json.dumps(
+            obj, ensure_ascii=False, separators=(",", ":"), sort_keys=sort_keys, default=default
+        ).encode("utf-8")
+
+    def loads(data: Union[bytes, str]) -> Any:
+        return json.loads(data)
@@ -0,0 +1,35 @@
+import base64, hashlib, json
+from typing import Any, Dict, Optional
+
+def decode_claims(token: str) -> Dict[str, Any]:
+    """
+    Decode payload JWT tanpa verifikasi tanda tangan. Hanya untuk keputusan
+    lokal (scope cache, cek exp); otorisasi tetap dilakukan upstream.
+    Return {} kalau token bukan JWT yang valid.
+    """
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return claims if isinstance(claims, dict) else {}
+    except Exception:
+        return {}
+
+def token_fingerprint(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:32]
+
+def subject_key(token: str) -> str:
+    """
+    Identitas subscriber: claim `sub`, atau hash token kalau token tidak bisa
+    di-decode. Claim tidak diverifikasi, jadi hanya untuk token yang sudah
+    diterima upstream (token manager); key yang memisahkan data antar
+    pemanggil pakai token_manager.scope atau token_fingerprint.
+    """
+    sub = decode_claims(token).get("sub")
+    return f"sub:{sub}" if sub else f"tok:{token_fingerprint(token)}"
+
+def token_expiry(token: str) -> Optional[float]:
+    """
+    Claim `exp` (epoch detik) atau None kalau tidak ada.
+    """
+    exp = decode_claims(token).get("exp")
+    return float(exp) if isinstance(exp, (int, float)) else None
@@ -0,0 +1,183 @@
+"""
+Logging terstruktur untuk jalur request bridge, pengganti print().
+
+Record dimasukkan ke antrean (QueueHandler) dan ditulis thread terpisah
+(QueueListener), jadi event loop tidak pernah menunggu I/O stdout. Setiap
+record membawa request_id dari contextvar: id korelasi yang dipasang
+middleware (X-Request-Id dari client atau dibuat baru) dan dicatat bersama
+x-request-id yang dikirim ke myXL per hop.
+
+Konfigurasi ENV:
+  MYXL_LOG_LEVEL          level minimum (INFO)
+  MYXL_LOG_FORMAT         json (default) | text
+  MYXL_LOG_SAMPLE_DEBUG   fraksi record DEBUG yang ditulis (0.01)
+  MYXL_LOG_SAMPLE_INFO    fraksi record INFO yang ditulis (1)
+  MYXL_LOG_QUEUE          kapasitas antrean; record yang tidak muat dibuang (10000)
+
+WARNING ke atas selalu ditulis. Token (JWT, Bearer, field *_token) disamarkan
+sebelum keluar dari proses.
+"""
+import copy, logging, os, queue, random, re, sys, time, traceback, uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from .jsonfast import dumps
+from .metrics import Counter, REGISTRY
+
+LOG_DROPPED = Counter("myxl_log_dropped_total", "Record log yang dibuang karena antrean penuh.")
+REGISTRY.append(LOG_DROPPED)
+
+ROOT = "myxl"
+
+_request_id: ContextVar[Optional[str]] = ContextVar("myxl_request_id", default=None)
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(f"{ROOT}.{name}")
+
+# ---------- Correlation id ----------
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+def set_request_id(value: Optional[str] = None):
+    """
+    Pasang id korelasi request ini; nilai dari client dipakai kalau formatnya
+    wajar, selain itu dibuat baru. Return (request_id, token contextvar).
+    """
+    if not value or not _REQUEST_ID_RE.match(value):
+        value = uuid.uuid4().hex
+    return value, _request_id.set(value)
+
+def reset_request_id(token):
+    _request_id.reset(token)
+
+def request_id() -> Optional[str]:
+    return _request_id.get()
+
+# ---------- Redaksi ----------
+_REDACTIONS = (
+    # JWT (id_token, access_token)
+    (re.compile(r"eyJ[A-Za-z0-9_-]{5,}\.[A-Za-z0-9_-]{5,}\.[A-Za-z0-9_-]*"), "<jwt>"),
+    (re.compile(r"(?i)(bearer|basic)\s+[A-Za-z0-9._~+/=-]+"), r"\1 <redacted>"),
+    # "refresh_token": "...", refresh_token=..., 'token_payment': '...'
+    (re.compile(r"""(?i)(["']?\w*(?:token|api_key|x-api-key|signature)\w*["']?\s*[:=]\s*["']?)[^"'&,\s}]+"""),
+     r"\1<redacted>"),
+)
+
+def redact(text: str) -> str:
+    for pattern, replacement in _REDACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+# ---------- Filter & formatter ----------
+class _ContextFilter(logging.Filter):
+    """
+    Dipasang di QueueHandler: berjalan di thread pemanggil, jadi request_id
+    dari contextvar masih bisa dibaca sebelum record masuk antrean.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "request_id", None):
+            record.request_id = _request_id.get()
+        return True
+
+class _SamplingFilter(logging.Filter):
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.levelno, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+# atribut bawaan LogRecord; sisanya dianggap field dari extra={...}
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RESERVED and not k.startswith("_")}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.request_id:
+            entry["request_id"] = record.request_id
+        entry.update(_fields(record))
+        return redact(dumps(entry, default=str).decode())
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        ts = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+        line = f"{ts} {record.levelname:<7} [{record.request_id or '-'}] {record.name}: {record.getMessage()}"
+        fields = _fields(record)
+        exc = fields.pop("exc", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if exc:
+            line += "\n" + exc.rstrip()
+        return redact(line)
+
+class _DroppingQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # pesan dan traceback diformat di thread pemanggil; exc_info dibuang
+        # supaya record di antrean tidak ikut menahan frame request
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc = "".join(traceback.format_exception(*record.exc_info))
+        record.exc_info = record.exc_text = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+# ---------- Setup ----------
+_listener: Optional[QueueListener] = None
+
+def setup_logging():
+    """
+    Pasang handler antrean di logger "myxl" dan jalankan listener-nya.
+    Dipanggil sekali saat startup server; CLI tidak memanggilnya.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    level = logging.getLevelName(os.getenv("MYXL_LOG_LEVEL", "INFO").upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+    formatter = TextFormatter() if os.getenv("MYXL_LOG_FORMAT", "json").lower() == "text" else JsonFormatter()
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(formatter)
+
+    handler = _DroppingQueueHandler(queue.Queue(int(os.getenv("MYXL_LOG_QUEUE", "10000"))))
+    handler.addFilter(_ContextFilter())
+    handler.addFilter(_SamplingFilter({
+        logging.DEBUG: float(os.getenv("MYXL_LOG_SAMPLE_DEBUG", "0.01")),
+        logging.INFO: float(os.getenv("MYXL_LOG_SAMPLE_INFO", "1")),
+    }))
+
+    root = logging.getLogger(ROOT)
+    root.setLevel(level)
+    root.handlers[:] = [handler]
+    root.propagate = False
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=False)
+    _listener.start()
+
+def shutdown_logging():
+    """
+    Hentikan listener; record yang masih di antrean ditulis dulu.
+    """
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    _listener = None
@@ -0,0 +1,55 @@
+import asyncio, os, sqlite3, threading, time
+from typing import Dict, Optional
+
+from .state import connect_sqlite, state_path
+
+class FamilyCodeMemo:
+    """
+    Memo persisten quota_code -> package_family_code. Mapping ini hampir tidak
+    pernah berubah, jadi cukup dicari sekali lewat get_package lalu diingat.
+
+    Pembacaan dari dict di memori; penulisan ke SQLite dilakukan di thread
+    supaya tidak memblokir event loop.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("MYXL_FAMILY_MEMO_PATH") or state_path("family_memo.sqlite3")
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._data: Optional[Dict[str, str]] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = connect_sqlite(self.path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS family_memo ("
+                "quota_code TEXT PRIMARY KEY, family_code TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+        return self._conn
+
+    def load(self) -> Dict[str, str]:
+        if self._data is None:
+            with self._lock:
+                if self._data is None:
+                    rows = self._db().execute("SELECT quota_code, family_code FROM family_memo").fetchall()
+                    self._data = dict(rows)
+        return self._data
+
+    def get(self, quota_code: str) -> Optional[str]:
+        return self.load().get(quota_code)
+
+    def _write(self, quota_code: str, family_code: str):
+        with self._lock:
+            self._db().execute(
+                "INSERT OR REPLACE INTO family_memo (quota_code, family_code, updated_at) VALUES (?, ?, ?)",
+                (quota_code, family_code, time.time()),
+            )
+
+    async def set(self, quota_code: str, family_code: str):
+        data = self.load()
+        if data.get(quota_code) == family_code:
+            return
+        data[quota_code] = family_code
+        await asyncio.to_thread(self._write, quota_code, family_code)
+
+family_memo = FamilyCodeMemo()
@@ -0,0 +1,158 @@
+"""
+Metrik Prometheus sederhana (tanpa dependency) + timing per hop untuk header
+Server-Timing.
+
+Hop yang diukur: ciam, xdata_encrypt, myxl, xdata_decrypt. Setiap hop dicatat
+ke histogram global dan ke daftar timing milik request yang sedang berjalan
+(contextvar), yang kemudian diringkas middleware menjadi Server-Timing.
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from .deadline import DeadlineExceeded
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _labels_str(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if value != int(value) else f"{int(value)}"
+
+class Counter:
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = ()):
+        self.name, self.doc, self.labels = name, doc, labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels_str(self.labels, key)} {_fmt(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, doc: str, labels: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.name, self.doc, self.labels, self.buckets = name, doc, labels, tuple(buckets)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[n]) for n in self.labels)
+        state = self._values.get(key)
+        if state is None:
+            # [count per bucket..., +Inf count, sum]
+            state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} histogram"]
+        for key, state in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_labels_str(self.labels, key, le)} {cumulative}")
+            cumulative += state[len(self.buckets)]
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels_str(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels_str(self.labels, key)} {_fmt(state[-1])}")
+            lines.append(f"{self.name}_count{_labels_str(self.labels, key)} {cumulative}")
+        return lines
+
+ROUTE_LATENCY = Histogram(
+    "myxl_route_duration_seconds", "Latency route HTTP bridge.", ("route", "method", "status")
+)
+HOP_LATENCY = Histogram(
+    "myxl_upstream_hop_duration_seconds", "Latency per hop upstream.", ("hop", "status")
+)
+HOP_TIMEOUTS = Counter("myxl_upstream_timeouts_total", "Hop upstream yang timeout.", ("hop",))
+DECRYPT_FAILURES = Counter("myxl_decrypt_failures_total", "Response myXL yang gagal didekripsi.", ("path",))
+PURCHASE_STAGE_LATENCY = Histogram(
+    "myxl_purchase_stage_duration_seconds", "Latency per tahap pembelian.", ("stage", "detail")
+)
+
+REGISTRY = [ROUTE_LATENCY, HOP_LATENCY, HOP_TIMEOUTS, DECRYPT_FAILURES, PURCHASE_STAGE_LATENCY]
+
+def render_metrics(extra: Optional[List[str]] = None) -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra or [])
+    return "\n".join(lines) + "\n"
+
+# ---------- Timing per request ----------
+_request_timings: ContextVar[Optional[list]] = ContextVar("myxl_request_timings", default=None)
+
+def start_request_timings() -> list:
+    timings: list = []
+    _request_timings.set(timings)
+    return timings
+
+def record_timing(name: str, elapsed: float):
+    """
+    Tambahkan entry Server-Timing untuk request yang sedang berjalan, mis.
+    tahap pembelian yang mencakup beberapa hop.
+    """
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((name, elapsed))
+
+@contextmanager
+def hop(name: str):
+    """
+    Ukur satu hop upstream. Pemanggil boleh mengisi info["status"] (mis. HTTP
+    status code); default "ok", atau "timeout"/"deadline"/"error" kalau ada
+    exception. Setelah blok selesai info["elapsed"] berisi durasi hop (detik).
+    """
+    info = {"status": "ok"}
+    start = time.perf_counter()
+    try:
+        yield info
+    except httpx.TimeoutException:
+        info["status"] = "timeout"
+        HOP_TIMEOUTS.inc(hop=name)
+        raise
+    except DeadlineExceeded:
+        info["status"] = "deadline"
+        raise
+    except Exception:
+        info["status"] = "error"
+        raise
+    finally:
+        elapsed = info["elapsed"] = time.perf_counter() - start
+        HOP_LATENCY.observe(elapsed, hop=name, status=info["status"])
+        record_timing(name, elapsed)
+
+def server_timing(timings: list, total: float) -> str:
+    """
+    Ringkas timing hop menjadi nilai header Server-Timing; hop yang sama
+    dijumlahkan (desc berisi jumlah panggilan kalau lebih dari satu).
+    """
+    summary: Dict[str, list] = {}
+    for name, elapsed in timings:
+        entry = summary.setdefault(name, [0.0, 0])
+        entry[0] += elapsed
+        entry[1] += 1
+    parts = []
+    for name, (elapsed, count) in summary.items():
+        part = f"{name};dur={elapsed * 1000:.1f}"
+        if count > 1:
+            part += f';desc="x{count}"'
+        parts.append(part)
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
@@ -1,8 +1,14 @@
-from api_request import get_package, send_api_request
-from ui import clear_screen, pause
+from .api_request import get_package, get_package_async, get_quota_details_async, send_api_request
+from .concurrency import gather_bounded, iter_bounded
+from .log import get_logger
+from .memo import family_memo
+
+log = get_logger("my_package")
 
 # Fetch my packages
 def fetch_my_packages(api_key: str, tokens: dict):
+    from ui import clear_screen, pause
+
     id_token = tokens.get("id_token")
     
     path = "api/v8/packages/quota-details"
@@ -48,4 +54,58 @@ def fetch_my_packages(api_key: str, tokens: dict):
         num += 1
         
     pause()
-        
\ No newline at end of file
+        
+
+# ---------- Server (async) ----------
+async def resolve_family_code(api_key: str, tokens: dict, quota_code: str) -> str:
+    """
+    quota_code -> package_family_code, lewat memo dulu; get_package hanya
+    dipanggil untuk quota yang belum pernah dilihat.
+    """
+    family_code = family_memo.get(quota_code)
+    if family_code:
+        return family_code
+
+    package_details = await get_package_async(api_key, tokens, quota_code)
+    if not package_details:
+        return "N/A"
+    family_code = package_details["package_family"]["package_family_code"]
+    await family_memo.set(quota_code, family_code)
+    return family_code
+
+def _package_entry(num: int, quota: dict, family_code) -> dict:
+    if isinstance(family_code, Exception):
+        log.warning("family lookup %s gagal: %s", quota["quota_code"], family_code)
+        family_code = "N/A"
+    return {
+        "number": num,
+        "name": quota["name"],
+        "quota_code": quota["quota_code"],
+        "family_code": family_code,
+        "group_code": quota["group_code"],
+    }
+
+async def fetch_my_packages_async(api_key: str, tokens: dict, concurrency: int = 8):
+    """
+    Versi server fetch_my_packages: family code tiap quota dicari paralel.
+    Return None kalau quota-details gagal.
+    """
+    quotas = await get_quota_details_async(api_key, tokens["id_token"])
+    if quotas is None:
+        return None
+
+    family_codes = await gather_bounded(
+        quotas, lambda quota: resolve_family_code(api_key, tokens, quota["quota_code"]), concurrency
+    )
+    return [_package_entry(num, quota, fc) for num, (quota, fc) in enumerate(zip(quotas, family_codes), start=1)]
+
+async def iter_my_packages(api_key: str, tokens: dict, quotas: list, concurrency: int = 8):
+    """
+    Yield tiap paket begitu family code-nya selesai dicari (urutan selesai,
+    bukan urutan quota; field `number` tetap mengikuti urutan quota).
+    """
+    numbered = list(enumerate(quotas, start=1))
+    async for (num, quota), fc in iter_bounded(
+        numbered, lambda item: resolve_family_code(api_key, tokens, item[1]["quota_code"]), concurrency
+    ):
+        yield _package_entry(num, quota, fc)
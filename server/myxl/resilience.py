@@ -0,0 +1,310 @@
+"""
+Circuit breaker, retry budget dan hedged request per upstream, dipasang
+sebagai transport httpx di atas pool koneksi (lihat http_client.build_transport).
+
+Konfigurasi ENV (default di kurung; semua bisa dioverride per upstream,
+mis. MYXL_XDATA_BREAKER_OPEN_SECONDS):
+  MYXL_BREAKER_WINDOW          jendela statistik breaker, detik (30)
+  MYXL_BREAKER_MIN_CALLS       minimal panggilan di jendela sebelum breaker menilai (20)
+  MYXL_BREAKER_FAILURE_RATIO   rasio gagal/lambat yang membuka breaker (0.5)
+  MYXL_BREAKER_SLOW_CALL       panggilan lebih lama dari ini dihitung gagal, detik (5)
+  MYXL_BREAKER_OPEN_SECONDS    lama breaker terbuka sebelum dicoba lagi (15)
+  MYXL_RETRY_MAX               retry maksimum untuk request idempotent (2)
+  MYXL_RETRY_BACKOFF           backoff dasar, detik; full jitter, eksponensial (0.05)
+  MYXL_RETRY_BUDGET_RATIO      retry + hedge maksimum relatif terhadap request (0.2)
+  MYXL_RETRY_BUDGET_MIN        retry yang selalu boleh per jendela (10)
+  MYXL_HEDGE_DELAY             kirim request kedua kalau yang pertama belum
+                               selesai setelah ini, detik; 0 = hedging mati (0)
+  MYXL_SEND_MIN_BUDGET         request non-idempotent hanya dikirim kalau sisa
+                               deadline minimal ini, detik (2)
+
+Caller menandai request lewat httpx extensions:
+  {"myxl_idempotent": True}  boleh di-retry (kegagalan transport / 502-504)
+  {"myxl_hedge": True}       boleh di-hedge (hanya untuk read)
+
+Gagal = exception transport, status 5xx, atau lebih lambat dari SLOW_CALL.
+Saat breaker terbuka request langsung gagal dengan CircuitOpenError tanpa
+menyentuh upstream; bridge menerjemahkannya jadi 503 + Retry-After.
+
+Transport ini juga menegakkan deadline request (myxl.deadline): timeout httpx
+dipotong ke sisa budget, attempt yang melewati deadline dibatalkan dengan
+DeadlineExceeded, dan retry tidak dilakukan kalau backoff-nya melewati deadline.
+Request non-idempotent (settlement) tidak pernah dipotong di tengah jalan:
+sisa budget dicek sekali sebelum dikirim (DeadlineExceeded kalau kurang dari
+SEND_MIN_BUDGET), setelah itu request dibiarkan selesai dalam timeout client.
+"""
+import asyncio, os, random, time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+import httpx
+
+from .deadline import DeadlineExceeded, remaining
+from .metrics import Counter, REGISTRY
+
+BREAKER_REJECTIONS = Counter("myxl_breaker_rejections_total", "Request yang ditolak breaker terbuka.", ("upstream",))
+BREAKER_OPENED = Counter("myxl_breaker_opened_total", "Berapa kali breaker terbuka.", ("upstream",))
+RETRIES = Counter("myxl_upstream_retries_total", "Retry ke upstream.", ("upstream",))
+HEDGES = Counter("myxl_upstream_hedges_total", "Hedged request ke upstream.", ("upstream", "winner"))
+REGISTRY.extend([BREAKER_REJECTIONS, BREAKER_OPENED, RETRIES, HEDGES])
+
+RETRYABLE_STATUS = {502, 503, 504}
+
+def _env(name: str, upstream: str, default: float) -> float:
+    scoped = os.getenv(name.replace("MYXL_", f"MYXL_{upstream.upper()}_", 1))
+    return float(scoped if scoped is not None else os.getenv(name, str(default)))
+
+class CircuitOpenError(Exception):
+    def __init__(self, upstream: str, retry_after: float):
+        super().__init__(f"upstream {upstream} sedang tidak tersedia (circuit open)")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+# ---------- Breaker ----------
+class CircuitBreaker:
+    """
+    Breaker berbasis rasio kegagalan di jendela waktu bergulir.
+
+    closed    -> semua request lewat; buka kalau rasio gagal >= failure_ratio
+    open      -> request langsung ditolak sampai open_seconds lewat
+    half_open -> satu request percobaan; sukses menutup, gagal membuka lagi
+    """
+
+    def __init__(self, name: str, window: float, min_calls: int, failure_ratio: float,
+                 slow_call: float, open_seconds: float):
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call = slow_call
+        self.open_seconds = open_seconds
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._probing = False
+        self._calls: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+
+    def _trim(self, now: float):
+        while self._calls and self._calls[0][0] < now - self.window:
+            _, failed = self._calls.popleft()
+            self._failures -= failed
+
+    def _open(self, now: float):
+        self.state = "open"
+        self._opened_at = now
+        self._probing = False
+        BREAKER_OPENED.inc(upstream=self.name)
+
+    def before_call(self):
+        """
+        Raise CircuitOpenError kalau request tidak boleh lewat.
+        """
+        now = time.monotonic()
+        if self.state == "open":
+            remaining = self._opened_at + self.open_seconds - now
+            if remaining > 0:
+                BREAKER_REJECTIONS.inc(upstream=self.name)
+                raise CircuitOpenError(self.name, remaining)
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probing:
+                BREAKER_REJECTIONS.inc(upstream=self.name)
+                raise CircuitOpenError(self.name, 1.0)
+            self._probing = True
+
+    def record(self, failed: bool, elapsed: float):
+        now = time.monotonic()
+        failed = failed or elapsed > self.slow_call
+        if self.state == "half_open":
+            if failed:
+                self._open(now)
+            else:
+                self.state = "closed"
+                self._probing = False
+                self._calls.clear()
+                self._failures = 0
+            return
+        if self.state == "open":
+            return
+        self._calls.append((now, failed))
+        self._failures += failed
+        self._trim(now)
+        if len(self._calls) >= self.min_calls and self._failures / len(self._calls) >= self.failure_ratio:
+            self._open(now)
+
+    def cancel_probe(self):
+        self._probing = False
+
+    def snapshot(self) -> dict:
+        self._trim(time.monotonic())
+        return {"state": self.state, "calls": len(self._calls), "failures": self._failures}
+
+# ---------- Retry budget ----------
+class RetryBudget:
+    """
+    Retry (dan hedge) hanya boleh selama jumlahnya di jendela waktu tidak
+    melebihi min_retries + ratio * request, supaya retry tidak melipatgandakan
+    beban saat upstream memang sedang bermasalah.
+    """
+
+    def __init__(self, ratio: float, min_retries: int, window: float):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window = window
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+
+    def _trim(self, now: float):
+        for q in (self._requests, self._retries):
+            while q and q[0] < now - self.window:
+                q.popleft()
+
+    def on_request(self):
+        self._requests.append(time.monotonic())
+
+    def try_spend(self) -> bool:
+        now = time.monotonic()
+        self._trim(now)
+        if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+            return False
+        self._retries.append(now)
+        return True
+
+# ---------- Transport ----------
+class ResilientTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncBaseTransport, upstream: str):
+        self._inner = inner
+        self.upstream = upstream
+        window = _env("MYXL_BREAKER_WINDOW", upstream, 30.0)
+        self.breaker = CircuitBreaker(
+            upstream,
+            window=window,
+            min_calls=int(_env("MYXL_BREAKER_MIN_CALLS", upstream, 20)),
+            failure_ratio=_env("MYXL_BREAKER_FAILURE_RATIO", upstream, 0.5),
+            slow_call=_env("MYXL_BREAKER_SLOW_CALL", upstream, 5.0),
+            open_seconds=_env("MYXL_BREAKER_OPEN_SECONDS", upstream, 15.0),
+        )
+        self.budget = RetryBudget(
+            ratio=_env("MYXL_RETRY_BUDGET_RATIO", upstream, 0.2),
+            min_retries=int(_env("MYXL_RETRY_BUDGET_MIN", upstream, 10)),
+            window=window,
+        )
+        self.retry_max = int(_env("MYXL_RETRY_MAX", upstream, 2))
+        self.backoff = _env("MYXL_RETRY_BACKOFF", upstream, 0.05)
+        self.hedge_delay = _env("MYXL_HEDGE_DELAY", upstream, 0.0)
+        self.send_min_budget = _env("MYXL_SEND_MIN_BUDGET", upstream, 2.0)
+
+    def _clamp_timeout(self, request: httpx.Request, left: float):
+        timeout = dict(request.extensions.get("timeout") or {})
+        for key in ("connect", "read", "write", "pool"):
+            value = timeout.get(key)
+            timeout[key] = left if value is None else min(value, left)
+        request.extensions["timeout"] = timeout
+
+    async def _attempt(self, request: httpx.Request) -> httpx.Response:
+        left = remaining()
+        if left is not None and not request.extensions.get("myxl_idempotent"):
+            # status request yang terpotong setelah terkirim tidak bisa diketahui
+            if left < self.send_min_budget:
+                raise DeadlineExceeded(self.upstream)
+            left = None
+        if left is not None:
+            if left <= 0:
+                raise DeadlineExceeded(self.upstream)
+            self._clamp_timeout(request, left)
+        self.breaker.before_call()
+        start = time.monotonic()
+        try:
+            if left is None:
+                response = await self._inner.handle_async_request(request)
+            else:
+                response = await asyncio.wait_for(self._inner.handle_async_request(request), left)
+        except asyncio.TimeoutError:
+            # budget habis di tengah hop: bukan kegagalan upstream kecuali memang lambat
+            self.breaker.record(False, time.monotonic() - start)
+            raise DeadlineExceeded(self.upstream)
+        except asyncio.CancelledError:
+            # hedge yang kalah dibatalkan; bukan sinyal kesehatan upstream
+            self.breaker.cancel_probe()
+            raise
+        except Exception:
+            self.breaker.record(True, time.monotonic() - start)
+            raise
+        self.breaker.record(response.status_code >= 500, time.monotonic() - start)
+        return response
+
+    async def _hedged(self, request: httpx.Request) -> httpx.Response:
+        primary = asyncio.create_task(self._attempt(request))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay)
+        if done or not self.budget.try_spend():
+            return await primary
+
+        secondary = asyncio.create_task(self._attempt(request))
+        pending = {primary, secondary}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if task.exception() is None]
+                if not winners:
+                    error = next(iter(done)).exception()
+                    continue
+                for task in winners[1:]:
+                    _close_orphan(task)
+                HEDGES.inc(upstream=self.upstream, winner="primary" if winners[0] is primary else "hedge")
+                return winners[0].result()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+                task.add_done_callback(_close_orphan)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.budget.on_request()
+        idempotent = bool(request.extensions.get("myxl_idempotent"))
+        hedge = self.hedge_delay > 0 and bool(request.extensions.get("myxl_hedge"))
+        if hedge:
+            # body dibaca dulu supaya bisa dikirim dua kali
+            await request.aread()
+
+        attempt = 0
+        while True:
+            try:
+                response = await (self._hedged(request) if hedge else self._attempt(request))
+                if not (idempotent and response.status_code in RETRYABLE_STATUS):
+                    return response
+                retry_error: Optional[Exception] = None
+            except httpx.TransportError as e:
+                if not idempotent:
+                    raise
+                response, retry_error = None, e
+
+            delay = random.uniform(0, self.backoff * (2 ** (attempt + 1)))
+            left = remaining()
+            if attempt >= self.retry_max or (left is not None and left <= delay) or not self.budget.try_spend():
+                if retry_error is not None:
+                    raise retry_error
+                return response
+            if response is not None:
+                await response.aclose()
+            attempt += 1
+            RETRIES.inc(upstream=self.upstream)
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+def _close_orphan(task: asyncio.Task):
+    # response dari hedge yang selesai setelah pemenang ditentukan harus ditutup
+    if task.cancelled() or task.exception() is not None:
+        return
+    asyncio.ensure_future(task.result().aclose())
+
+def retry_after_seconds(error: CircuitOpenError) -> int:
+    return max(1, int(error.retry_after + 0.999))
+
+def request_flags(idempotent: bool = False, hedge: bool = False) -> Dict[str, bool]:
+    """
+    extensions httpx untuk menandai request; hedge mengimplikasikan idempotent.
+    """
+    return {"myxl_idempotent": idempotent or hedge, "myxl_hedge": hedge}
@@ -0,0 +1,42 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class SingleFlight:
+    """
+    Gabungkan panggilan async identik yang berjalan bersamaan: pemanggil
+    pertama menjalankan fungsi, pemanggil berikutnya dengan key yang sama
+    menunggu hasil yang sama. Hasil dibagi antar pemanggil, jadi perlakukan
+    sebagai read-only.
+
+    Panggilan upstream dibungkus task terpisah, sehingga pemanggil yang
+    dibatalkan (client disconnect) tidak ikut membatalkan pemanggil lain.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "coalesced": 0})
+
+    def _done(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # tandai exception sudah diambil walau semua pemanggil sudah pergi
+            task.exception()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]], label: str = "default") -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self._stats[label]["calls"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self._stats[label]["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inflight": len(self._inflight),
+            "by_label": {label: dict(counts) for label, counts in self._stats.items()},
+        }
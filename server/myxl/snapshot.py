@@ -0,0 +1,234 @@
+"""
+Snapshot katalog ke disk supaya proses yang baru start (deploy/restart)
+langsung punya family dan detail paket terakhir, tanpa menunggu upstream.
+
+- family_cache (myxl.catalog) dan recent_package_details (myxl.api_request)
+  dicatat setiap ada nilai baru atau entry dihapus (mis. detail yang sudah
+  dipakai purchase), lalu ditulis ke SQLite berkala di thread (write-behind,
+  tidak ada I/O disk di jalur request)
+- saat startup snapshot dibaca di background: entry yang belum kedaluwarsa
+  dimasukkan lagi ke cache dengan stored_at aslinya, jadi aturan segar /
+  stale-while-revalidate / stale-if-error tetap berlaku; family juga mengisi
+  index pencarian (myxl.catalog_index)
+- file dipakai bersama semua worker uvicorn (WAL); baris hanya ditimpa oleh
+  data yang lebih baru, dari worker mana pun
+
+Setiap baris menyimpan stored_at dan expires_at (batas terakhir nilai itu
+boleh dipakai cache). Format snapshot diberi versi (PRAGMA user_version);
+snapshot dengan versi lain dibuang utuh, bukan dibaca.
+
+Detail paket berisi token_confirmation, jadi perlakukan file ini seperti
+token store.
+
+Konfigurasi ENV:
+  MYXL_SNAPSHOT_PATH            file SQLite (default catalog_snapshot.sqlite3 di MYXL_STATE_DIR)
+  MYXL_SNAPSHOT_FLUSH_INTERVAL  jeda penulisan ke disk, detik (5; 0 = snapshot mati)
+  MYXL_SNAPSHOT_DETAILS         ikut simpan detail paket untuk purchase (1; 0 = hanya family)
+"""
+import asyncio, os, sqlite3, threading, time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from .api_request import PURCHASE_DETAIL_TTL, recent_package_details
+from .cache import TTLCache
+from .catalog import family_cache
+from .catalog_index import catalog_index
+from .deadline import clear_deadline
+from .jsonfast import dumps, loads
+from .log import get_logger
+from .metrics import Counter, REGISTRY
+from .state import connect_sqlite, state_path
+
+SNAPSHOT_ENTRIES = Counter(
+    "myxl_snapshot_entries_total", "Entry snapshot katalog yang ditulis/dipulihkan.", ("kind", "op")
+)
+REGISTRY.append(SNAPSHOT_ENTRIES)
+
+log = get_logger("snapshot")
+
+# naikkan kalau bentuk tabel atau isi value berubah
+SNAPSHOT_VERSION = 1
+PURGE_INTERVAL = 300.0
+
+FAMILY = "family"
+DETAIL = "detail"
+
+# (kind, key JSON) -> (stored_at, expires_at, value); value None = hapus
+Pending = Dict[Tuple[str, str], Tuple[float, float, Any]]
+
+def _cache_window(cache: TTLCache) -> float:
+    # selama ini setelah disimpan, nilai masih bisa dilayani cache (HIT atau STALE)
+    return cache.ttl + max(cache.stale_while_revalidate, cache.stale_if_error)
+
+class SnapshotStore:
+    """
+    Tabel (kind, key) -> value + stored_at/expires_at. Semua method dipanggil
+    dari thread, bukan dari event loop.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("MYXL_SNAPSHOT_PATH") or state_path("catalog_snapshot.sqlite3")
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._purged_at = 0.0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = connect_sqlite(self.path)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SNAPSHOT_VERSION:
+                if version:
+                    log.info("snapshot versi %s dibuang (versi sekarang %s)", version, SNAPSHOT_VERSION)
+                conn.execute("DROP TABLE IF EXISTS catalog_snapshot")
+                conn.execute(f"PRAGMA user_version = {SNAPSHOT_VERSION}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS catalog_snapshot ("
+                "kind TEXT NOT NULL, key TEXT NOT NULL, stored_at REAL NOT NULL, expires_at REAL NOT NULL, "
+                "value TEXT NOT NULL, PRIMARY KEY (kind, key))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def read(self, kind: str, limit: int) -> List[Tuple[str, float, str]]:
+        """
+        Entry yang belum kedaluwarsa, paling baru dulu: (key, stored_at, value).
+        """
+        with self._lock:
+            return self._db().execute(
+                "SELECT key, stored_at, value FROM catalog_snapshot WHERE kind = ? AND expires_at > ? "
+                "ORDER BY stored_at DESC LIMIT ?",
+                (kind, time.time(), limit),
+            ).fetchall()
+
+    def write(self, pending: Pending):
+        rows, removed = [], []
+        for (kind, key), (stored_at, expires_at, value) in pending.items():
+            if value is None:
+                removed.append((kind, key, stored_at))
+            else:
+                rows.append((kind, key, stored_at, expires_at, dumps(value).decode()))
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                # worker lain mungkin sudah menulis versi yang lebih baru
+                db.executemany(
+                    "INSERT INTO catalog_snapshot (kind, key, stored_at, expires_at, value) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (kind, key) DO UPDATE SET stored_at = excluded.stored_at, "
+                    "expires_at = excluded.expires_at, value = excluded.value "
+                    "WHERE excluded.stored_at > catalog_snapshot.stored_at",
+                    rows,
+                )
+                db.executemany(
+                    "DELETE FROM catalog_snapshot WHERE kind = ? AND key = ? AND stored_at <= ?", removed
+                )
+                if now - self._purged_at >= PURGE_INTERVAL:
+                    self._purged_at = now
+                    db.execute("DELETE FROM catalog_snapshot WHERE expires_at <= ?", (now,))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+class CatalogSnapshot:
+    """
+    Menghubungkan cache di memori dengan SnapshotStore: mencatat nilai baru
+    lewat TTLCache.on_change, menulisnya berkala, dan memulihkan saat startup.
+    """
+
+    def __init__(self, store: SnapshotStore, flush_interval: float, details: bool = True):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.caches: Dict[str, Tuple[TTLCache, float]] = {}
+        self._pending: Pending = {}
+        self._task: Optional[asyncio.Task] = None
+        self.restored: Dict[str, int] = {}
+        self.attach(FAMILY, family_cache, _cache_window(family_cache))
+        if details and PURCHASE_DETAIL_TTL > 0:
+            self.attach(DETAIL, recent_package_details, PURCHASE_DETAIL_TTL)
+
+    @property
+    def enabled(self) -> bool:
+        return self.flush_interval > 0
+
+    def attach(self, kind: str, cache: TTLCache, window: float):
+        self.caches[kind] = (cache, window)
+
+        def record(key: Hashable, stored_at: float, value: Any):
+            self._pending[(kind, dumps(list(key)).decode())] = (stored_at, stored_at + window, value)
+
+        if self.enabled:
+            cache.on_change = record
+
+    # ----- lifecycle -----
+    async def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        # startup tidak menunggu snapshot: request pertama yang datang lebih
+        # dulu cukup MISS seperti biasa
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    # ----- internal -----
+    async def _run(self):
+        clear_deadline()
+        try:
+            await self.restore()
+        except Exception:
+            log.exception("gagal memulihkan snapshot katalog")
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def restore(self):
+        for kind, (cache, _) in self.caches.items():
+            rows = await asyncio.to_thread(self.store.read, kind, cache.maxsize)
+            restored, families = 0, []
+            # paling lama dulu, supaya LRU menyisakan yang paling baru
+            for raw_key, stored_at, value in reversed(rows):
+                # entry yang sudah diisi/dihapus request sejak startup lebih baru
+                if (kind, raw_key) in self._pending:
+                    continue
+                key, value = tuple(loads(raw_key)), loads(value)
+                current = cache.get(key)
+                if current is not None and current[0] >= stored_at:
+                    continue
+                cache.set(key, value, stored_at=stored_at, notify=False)
+                restored += 1
+                if kind == FAMILY:
+                    families.append((key[1], value, stored_at))
+            if families:
+                catalog_index.load_families(families)
+            self.restored[kind] = restored
+            SNAPSHOT_ENTRIES.inc(restored, kind=kind, op="restored")
+        log.info("snapshot katalog dipulihkan", extra={"restored": self.restored, **catalog_index.stats()})
+
+    async def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(self.store.write, pending)
+        except Exception:
+            log.exception("gagal menulis snapshot katalog")
+            # coba lagi di putaran berikutnya; nilai yang lebih baru menang
+            for k, entry in pending.items():
+                self._pending.setdefault(k, entry)
+            return
+        for kind, _ in pending:
+            SNAPSHOT_ENTRIES.inc(kind=kind, op="written")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "pending": len(self._pending), "restored": self.restored}
+
+catalog_snapshot = CatalogSnapshot(
+    SnapshotStore(),
+    flush_interval=float(os.getenv("MYXL_SNAPSHOT_FLUSH_INTERVAL", "5")),
+    details=os.getenv("MYXL_SNAPSHOT_DETAILS", "1").strip().lower() in ("1", "true", "yes", "on"),
+)
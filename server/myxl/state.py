@@ -0,0 +1,19 @@
+import os, sqlite3
+
+def state_path(filename: str) -> str:
+    """
+    Lokasi file state lokal (memo, token store, dll). Direktori diatur lewat
+    ENV MYXL_STATE_DIR, default direktori kerja.
+    """
+    state_dir = os.getenv("MYXL_STATE_DIR", ".")
+    os.makedirs(state_dir, exist_ok=True)
+    return os.path.join(state_dir, filename)
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """
+    Koneksi SQLite yang aman dipakai beberapa worker uvicorn sekaligus (WAL).
+    """
+    conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
@@ -0,0 +1,311 @@
+"""
+Token manager sisi server: menyimpan token per subscriber, refresh proaktif
+sebelum id_token kedaluwarsa, dan menggabungkan refresh paralel untuk
+refresh_token yang sama.
+
+Konfigurasi ENV:
+  MYXL_TOKEN_STORE            memory (default) | sqlite | file
+  MYXL_TOKEN_STORE_PATH       lokasi file store (default di MYXL_STATE_DIR)
+  MYXL_TOKEN_REFRESH_MARGIN   refresh kalau exp tinggal kurang dari ini, detik (120)
+  MYXL_TOKEN_SWEEP_INTERVAL   interval pengecekan token hampir kedaluwarsa, detik (30)
+  MYXL_TOKEN_FLUSH_INTERVAL   interval write-behind ke store, detik (2)
+  MYXL_TOKEN_IDLE_TTL         subject yang tidak dipakai request selama ini
+                              dilupakan dan tidak di-refresh lagi, detik (86400)
+  MYXL_TOKEN_MAX_SUBJECTS     subject maksimum yang dipegang, LRU (100000)
+
+Token hanya dipakai menggantikan token dari client kalau id_token yang
+dikirim client persis token yang pernah disimpan manager (dicocokkan lewat
+fingerprint), bukan sekadar claim `sub` yang sama: JWT tidak diverifikasi
+secara lokal, jadi claim saja tidak cukup sebagai bukti identitas.
+"""
+import asyncio, json, os, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .api_request import get_new_token_async
+from .jwt_util import subject_key, token_expiry, token_fingerprint
+from .log import get_logger
+from .singleflight import SingleFlight
+from .state import connect_sqlite, state_path
+
+log = get_logger("token_manager")
+
+# ---------- Stores ----------
+class TokenStore:
+    """
+    Persistensi token per subject. Dipanggil dari thread (write-behind),
+    bukan dari event loop.
+    """
+
+    def load_all(self) -> Dict[str, dict]:
+        return {}
+
+    def save_many(self, changes: Dict[str, Optional[dict]]):
+        """changes: subject -> tokens, atau None untuk menghapus."""
+
+class MemoryTokenStore(TokenStore):
+    pass
+
+class SQLiteTokenStore(TokenStore):
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tokens (subject TEXT PRIMARY KEY, tokens TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def load_all(self) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT subject, tokens FROM tokens").fetchall()
+        return {subject: json.loads(tokens) for subject, tokens in rows}
+
+    def save_many(self, changes: Dict[str, Optional[dict]]):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            for subject, tokens in changes.items():
+                if tokens is None:
+                    self._conn.execute("DELETE FROM tokens WHERE subject = ?", (subject,))
+                else:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO tokens (subject, tokens, updated_at) VALUES (?, ?, ?)",
+                        (subject, json.dumps(tokens), now),
+                    )
+            self._conn.execute("COMMIT")
+
+class FileTokenStore(TokenStore):
+    """
+    Satu file JSON {subject: tokens}. Ditulis ulang utuh (tmp + rename) tiap flush.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data: Dict[str, dict] = {}
+
+    def load_all(self) -> Dict[str, dict]:
+        with self._lock:
+            try:
+                with open(self.path, "r", encoding="utf8") as f:
+                    self._data = json.load(f)
+            except FileNotFoundError:
+                self._data = {}
+            return dict(self._data)
+
+    def save_many(self, changes: Dict[str, Optional[dict]]):
+        with self._lock:
+            for subject, tokens in changes.items():
+                if tokens is None:
+                    self._data.pop(subject, None)
+                else:
+                    self._data[subject] = tokens
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf8") as f:
+                json.dump(self._data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+def make_token_store() -> TokenStore:
+    kind = os.getenv("MYXL_TOKEN_STORE", "memory").strip().lower()
+    path = os.getenv("MYXL_TOKEN_STORE_PATH")
+    if kind == "memory":
+        return MemoryTokenStore()
+    if kind == "sqlite":
+        return SQLiteTokenStore(path or state_path("tokens.sqlite3"))
+    if kind == "file":
+        return FileTokenStore(path or state_path("tokens_store.json"))
+    raise RuntimeError(f"MYXL_TOKEN_STORE tidak dikenal: {kind} (pilihan: memory, sqlite, file)")
+
+# ---------- Manager ----------
+class TokenManager:
+    def __init__(self, store: Optional[TokenStore] = None):
+        self.store = store
+        self.refresh_margin = float(os.getenv("MYXL_TOKEN_REFRESH_MARGIN", "120"))
+        self.sweep_interval = float(os.getenv("MYXL_TOKEN_SWEEP_INTERVAL", "30"))
+        self.flush_interval = float(os.getenv("MYXL_TOKEN_FLUSH_INTERVAL", "2"))
+        self.idle_ttl = float(os.getenv("MYXL_TOKEN_IDLE_TTL", "86400"))
+        self.max_subjects = int(os.getenv("MYXL_TOKEN_MAX_SUBJECTS", "100000"))
+        self._tokens: Dict[str, dict] = {}
+        # subject -> terakhir dipakai request (bukan refresh background), urut LRU
+        self._last_used: "OrderedDict[str, float]" = OrderedDict()
+        # fingerprint id_token -> subject; per subject disimpan token sekarang
+        # dan satu sebelumnya (client yang belum menerima token baru)
+        self._known: Dict[str, str] = {}
+        self._fingerprints: Dict[str, list] = {}
+        self._dirty: Dict[str, Optional[dict]] = {}
+        self._flight = SingleFlight()
+        self._tasks: list = []
+
+    # ----- lifecycle -----
+    async def start(self):
+        if self.store is None:
+            self.store = make_token_store()
+        loaded = await asyncio.to_thread(self.store.load_all)
+        for subject, tokens in loaded.items():
+            self._index(subject, tokens)
+            self._touch(subject)
+        self._evict_over_limit()
+        self._tasks = [asyncio.create_task(self._flush_loop()), asyncio.create_task(self._sweep_loop())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        await self.flush()
+
+    # ----- state -----
+    def _index(self, subject: str, tokens: dict, previous_id_token: Optional[str] = None):
+        self._tokens[subject] = tokens
+        fps = [token_fingerprint(tokens["id_token"])]
+        if previous_id_token:
+            fps.append(token_fingerprint(previous_id_token))
+        for fp in self._fingerprints.get(subject, []):
+            if fp not in fps:
+                self._known.pop(fp, None)
+        for fp in fps:
+            self._known[fp] = subject
+        self._fingerprints[subject] = fps
+
+    def _touch(self, subject: str):
+        self._last_used[subject] = time.monotonic()
+        self._last_used.move_to_end(subject)
+
+    def _evict_over_limit(self):
+        while len(self._last_used) > self.max_subjects:
+            subject = next(iter(self._last_used))
+            self.forget(subject)
+
+    def remember(self, tokens: dict, previous_id_token: Optional[str] = None, touch: bool = True) -> Optional[str]:
+        """
+        Simpan token set (hasil login/refresh). Return subject-nya. touch=False
+        untuk refresh background: tidak dihitung sebagai pemakaian.
+        """
+        if not tokens or "id_token" not in tokens:
+            return None
+        subject = subject_key(tokens["id_token"])
+        old = self._tokens.get(subject)
+        if old is None and not touch:
+            # subject sudah dilupakan selagi refresh background berjalan
+            return subject
+        if old and not tokens.get("refresh_token"):
+            tokens = {**tokens, "refresh_token": old.get("refresh_token")}
+        self._index(subject, tokens, previous_id_token)
+        self._dirty[subject] = tokens
+        if touch:
+            self._touch(subject)
+            self._evict_over_limit()
+        return subject
+
+    def forget(self, subject: str):
+        self._last_used.pop(subject, None)
+        tokens = self._tokens.pop(subject, None)
+        for fp in self._fingerprints.pop(subject, []):
+            self._known.pop(fp, None)
+        if tokens:
+            self._dirty[subject] = None
+
+    def subject_for(self, id_token: str) -> Optional[str]:
+        """
+        Subject untuk id_token yang persis token yang disimpan manager (hasil
+        login/refresh yang berhasil), atau None. Claim `sub` dari token yang
+        tidak dikenal tidak dipakai karena tidak diverifikasi.
+        """
+        return self._known.get(token_fingerprint(id_token or ""))
+
+    def scope(self, id_token: str) -> str:
+        """
+        Kunci per pemanggil yang tidak bisa dipalsukan: subject_for, atau
+        fingerprint token itu sendiri kalau token tidak dikenal.
+        """
+        return self.subject_for(id_token) or f"tok:{token_fingerprint(id_token or '')}"
+
+    def _needs_refresh(self, tokens: dict) -> bool:
+        exp = token_expiry(tokens.get("id_token", ""))
+        return exp is not None and exp - time.time() < self.refresh_margin and bool(tokens.get("refresh_token"))
+
+    # ----- refresh -----
+    async def refresh(self, refresh_token: str, previous_id_token: Optional[str] = None,
+                      touch: bool = True) -> Dict[str, Any]:
+        """
+        Refresh token; refresh paralel dengan refresh_token yang sama berbagi
+        satu panggilan ke CIAM.
+        """
+        async def run():
+            tokens = await get_new_token_async(refresh_token)
+            self.remember(tokens, previous_id_token, touch=touch)
+            return tokens
+
+        return await self._flight.do(token_fingerprint(refresh_token), run, label="refresh")
+
+    async def _refresh_or_forget(self, subject: str, tokens: dict, touch: bool = True) -> Optional[Dict[str, Any]]:
+        try:
+            return await self.refresh(tokens["refresh_token"], tokens["id_token"], touch=touch)
+        except Exception as e:
+            log.warning("refresh %s gagal: %s", subject, e)
+            exp = token_expiry(tokens["id_token"])
+            if exp is not None and exp <= time.time():
+                # refresh_token juga sudah tidak berlaku; client harus login ulang
+                self.forget(subject)
+                return None
+            return tokens
+
+    async def current_tokens(self, id_token: str) -> Optional[Dict[str, Any]]:
+        """
+        Token set terbaru untuk id_token yang dikenal manager (refresh dulu
+        kalau hampir kedaluwarsa). None kalau id_token tidak dikenal.
+        """
+        subject = self._known.get(token_fingerprint(id_token))
+        tokens = self._tokens.get(subject) if subject else None
+        if not tokens:
+            return None
+        self._touch(subject)
+        if self._needs_refresh(tokens):
+            tokens = await self._refresh_or_forget(subject, tokens)
+        return tokens
+
+    # ----- background -----
+    async def flush(self):
+        if not self._dirty or self.store is None:
+            return
+        changes, self._dirty = self._dirty, {}
+        try:
+            await asyncio.to_thread(self.store.save_many, changes)
+        except Exception as e:
+            log.error("flush gagal: %s", e)
+            for subject, tokens in changes.items():
+                self._dirty.setdefault(subject, tokens)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def evict_idle(self) -> int:
+        """
+        Lupakan subject yang tidak dipakai request selama idle_ttl. Client
+        masih memegang tokennya sendiri dan bisa refresh/login lagi.
+        """
+        cutoff = time.monotonic() - self.idle_ttl
+        idle = []
+        for subject, used_at in self._last_used.items():
+            if used_at >= cutoff:
+                break
+            idle.append(subject)
+        for subject in idle:
+            self.forget(subject)
+        return len(idle)
+
+    async def sweep(self):
+        if self.idle_ttl > 0:
+            self.evict_idle()
+        due = [(subject, tokens) for subject, tokens in list(self._tokens.items()) if self._needs_refresh(tokens)]
+        for subject, tokens in due:
+            if subject in self._tokens:
+                await self._refresh_or_forget(subject, tokens, touch=False)
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            await self.sweep()
+
+token_manager = TokenManager()
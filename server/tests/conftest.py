@@ -0,0 +1,18 @@
+import os, sys
+
+# test dijalankan dari server/ atau root repo; modul app dan myxl ada di server/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import base64, json, time
+
+import pytest
+
+@pytest.fixture
+def make_jwt():
+    """JWT tanpa tanda tangan valid; bridge memang tidak memverifikasinya."""
+    def make(sub: str, exp_in: float = 3600, **claims) -> str:
+        def part(obj) -> str:
+            return base64.urlsafe_b64encode(json.dumps(obj).encode()).decode().rstrip("=")
+        payload = {"sub": sub, "exp": int(time.time() + exp_in), **claims}
+        return f"{part({'alg': 'none'})}.{part(payload)}.sig"
+    return make
@@ -0,0 +1,106 @@
+"""
+Respons yang dibuat middleware admission/deadline harus tetap membawa header
+CORS, supaya browser bisa membaca status dan Retry-After-nya.
+"""
+import asyncio, json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as appmod
+from myxl.admission import inflight, subscriber_limiter
+from myxl.token_manager import token_manager
+
+ORIGIN = "http://localhost:5173"
+ID_TOKEN = "test.admission.token"
+
+@pytest.fixture
+def client():
+    # tanpa `with`: lifespan (token manager, crawler, snapshot) tidak perlu jalan
+    return TestClient(appmod.app)
+
+def assert_cors(response):
+    assert response.headers["access-control-allow-origin"] == ORIGIN
+    exposed = {name.strip().lower() for name in response.headers["access-control-expose-headers"].split(",")}
+    assert "retry-after" in exposed
+
+def test_rate_limited_response_has_cors_and_retry_after_seconds(client, monkeypatch):
+    monkeypatch.setattr(subscriber_limiter, "rate", 0.5)
+    monkeypatch.setattr(subscriber_limiter, "burst", 1.0)
+    # habiskan satu-satunya token supaya request berikut ditolak tanpa ke upstream;
+    # token yang tidak dikenal token manager dibatasi per IP client
+    assert subscriber_limiter.acquire("ip:testclient") is None
+
+    response = client.get("/balance", headers={"Authorization": f"Bearer {ID_TOKEN}", "Origin": ORIGIN})
+
+    assert response.status_code == 429
+    assert_cors(response)
+    # 1 token / 0.5 per detik = 2 detik, bukan milidetik
+    assert response.headers["retry-after"] == "2"
+
+def test_shed_response_has_cors(client, monkeypatch):
+    monkeypatch.setattr(inflight, "limit", 1)
+    monkeypatch.setattr(inflight, "inflight", 1)
+
+    response = client.get("/balance", headers={"Origin": ORIGIN})
+
+    assert response.status_code == 503
+    assert_cors(response)
+    assert response.headers["retry-after"] == "1"
+
+def test_deadline_response_has_cors(client):
+    response = client.get("/balance", headers={"Origin": ORIGIN, "X-Request-Deadline": "-1"})
+
+    assert response.status_code == 504
+    assert response.headers["access-control-allow-origin"] == ORIGIN
+
+def test_forged_sub_cannot_drain_known_subscriber_bucket(client, monkeypatch, make_jwt):
+    monkeypatch.setattr(subscriber_limiter, "rate", 0.5)
+    monkeypatch.setattr(subscriber_limiter, "burst", 1.0)
+    monkeypatch.setattr(token_manager, "_known", {})
+    victim = make_jwt("victim")
+    subject = token_manager.remember({"id_token": victim, "refresh_token": "r"})
+    forged = make_jwt("victim", forged=True)
+
+    for _ in range(3):
+        client.get("/balance", headers={"Authorization": f"Bearer {forged}"})
+
+    assert subscriber_limiter.acquire(subject) is None
+    token_manager.forget(subject)
+
+def test_streaming_response_holds_inflight_slot_until_body_ends(monkeypatch):
+    async def slow_fleet(api_key, accounts, include):
+        yield {"label": "first", "ok": True, "errors": {}}
+        await asyncio.sleep(0.05)
+        yield {"label": "second", "ok": True, "errors": {}}
+
+    monkeypatch.setattr(appmod, "iter_fleet", slow_fleet)
+    before = inflight.inflight
+    during = []
+
+    async def main():
+        # ASGI langsung: TestClient menampung body utuh sebelum mengembalikan respons
+        body = json.dumps({"accounts": [{"id_token": "a"}], "include": ["balance"]}).encode()
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                during.append(inflight.inflight)
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": "/fleet/poll", "raw_path": b"/fleet/poll", "query_string": b"",
+            "headers": [(b"content-type", b"application/json")], "client": ("127.0.0.1", 1), "server": ("test", 80),
+        }
+        await appmod.app(scope, receive, send)
+
+    asyncio.run(main())
+
+    # baris pertama terkirim saat generator masih berjalan (sebelum sleep)
+    assert len(during) == 3 and during[0] == before + 1
+    assert inflight.inflight == before
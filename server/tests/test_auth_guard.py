@@ -0,0 +1,40 @@
+"""
+Penolakan API key dari service xdata: key milik client diingat sebentar,
+key default server tidak (satu 401/403 sesaat tidak boleh mematikan semua
+request tanpa X-API-Key).
+"""
+import asyncio
+
+import pytest
+
+import myxl.api_request as api_request
+from myxl.auth_guard import api_key_rejection, rejected_api_keys
+from myxl.crypto_helper import API_KEY as DEFAULT_API_KEY, XDataAuthError
+
+class RejectingCodec:
+    async def encryptsign_async(self, **kwargs):
+        raise XDataAuthError("encrypt failed: API key rejected (401)")
+
+@pytest.fixture(autouse=True)
+def rejecting_codec(monkeypatch):
+    monkeypatch.setattr(api_request, "get_codec", lambda: RejectingCodec())
+    rejected_api_keys._cache.clear()
+    yield
+    rejected_api_keys._cache.clear()
+
+def call(api_key):
+    return asyncio.run(api_request.send_api_request_async(api_key, api_request.BALANCE_PATH, {}, "id.token.x"))
+
+@pytest.mark.parametrize("api_key", [None, DEFAULT_API_KEY])
+def test_default_key_is_not_negative_cached(api_key):
+    assert call(api_key)["http_status"] == 401
+    assert api_key_rejection(DEFAULT_API_KEY) is None
+
+def test_configured_server_key_is_not_negative_cached(monkeypatch):
+    monkeypatch.setenv("MYXL_API_KEY", "server-configured-key")
+    call("server-configured-key")
+    assert api_key_rejection("server-configured-key") is None
+
+def test_client_key_is_negative_cached():
+    assert call("client-key")["http_status"] == 401
+    assert api_key_rejection("client-key") is not None
@@ -0,0 +1,68 @@
+"""
+Cache katalog family dipisah per pemanggil yang tidak bisa dipalsukan, dan
+penolakan kredensial dari upstream tidak ditutupi stale-if-error.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import myxl.catalog as catalog
+from myxl.api_request import UpstreamAuthError
+from myxl.cache import HIT, MISS, STALE, TTLCache
+from myxl.catalog_index import CatalogIndex
+
+FAMILY = {"package_family": {"name": "Xtra"}, "package_variants": []}
+
+@pytest.fixture
+def upstream(monkeypatch):
+    # calls: id_token per panggilan upstream; failures: exception berikutnya
+    upstream = SimpleNamespace(calls=[], failures=[])
+
+    async def fake_get_family(api_key, tokens, family_code, scope=None):
+        upstream.calls.append(tokens["id_token"])
+        if upstream.failures:
+            raise upstream.failures.pop(0)
+        return FAMILY
+
+    monkeypatch.setattr(catalog, "get_family_async", fake_get_family)
+    monkeypatch.setattr(catalog, "catalog_index", CatalogIndex())
+    monkeypatch.setattr(catalog, "family_cache", TTLCache(
+        maxsize=16, ttl=300, stale_while_revalidate=0, stale_if_error=3600, fatal_errors=(UpstreamAuthError,),
+    ))
+    return upstream
+
+def get(id_token):
+    return asyncio.run(catalog.get_family_cached("key", {"id_token": id_token}, "FAM"))
+
+def expire(cache: TTLCache):
+    for key, (stored_at, value) in list(cache._data.items()):
+        cache._data[key] = (stored_at - 600, value)
+
+def test_forged_token_with_same_sub_misses_cache(upstream, make_jwt):
+    victim, forged = make_jwt("victim"), make_jwt("victim", forged=True)
+
+    assert get(victim) == (FAMILY, MISS)
+    assert get(victim) == (FAMILY, HIT)
+    assert get(forged) == (FAMILY, MISS)
+    assert upstream.calls == [victim, forged]
+
+def test_auth_failure_is_not_served_stale(upstream, make_jwt):
+    id_token = make_jwt("victim")
+    get(id_token)
+    expire(catalog.family_cache)
+    upstream.failures.append(UpstreamAuthError(401, "ditolak"))
+
+    with pytest.raises(UpstreamAuthError):
+        get(id_token)
+    assert len(catalog.family_cache) == 0
+
+def test_transient_failure_is_served_stale(upstream, make_jwt):
+    id_token = make_jwt("victim")
+    get(id_token)
+    expire(catalog.family_cache)
+    upstream.failures.append(RuntimeError("upstream 503"))
+
+    data, status = get(id_token)
+
+    assert (data, status) == (FAMILY, STALE)
@@ -0,0 +1,54 @@
+"""
+Update index per family harus menghasilkan index yang sama dengan rebuild
+utuh dari family yang sama.
+"""
+import random
+
+from myxl.catalog_index import CatalogIndex
+
+NAMES = ["Xtra Combo", "Kuota Harian", "Akrab", "Xtra Edukasi", "Unlimited Turbo"]
+
+def make_family(rng: random.Random, family_code: str) -> dict:
+    variants = []
+    for v in range(rng.randint(0, 3)):
+        options = [{
+            # kode sengaja sering bentrok antar family
+            "package_option_code": f"OPT{rng.randint(0, 40)}",
+            "name": f"{rng.choice(NAMES)} {rng.randint(1, 50)}GB",
+            "price": rng.choice([None, rng.randint(1, 20) * 5000]),
+        } for _ in range(rng.randint(0, 4))]
+        variants.append({"name": f"Varian {v}", "package_options": options})
+    return {"package_family": {"name": f"Family {family_code}"}, "package_variants": variants}
+
+def snapshot(index: CatalogIndex) -> tuple:
+    return (
+        index._by_code, index._by_word, index._by_price, index._prices,
+        index._ordered, index._vocab, index._holders,
+    )
+
+def test_incremental_updates_match_full_rebuild():
+    rng = random.Random(7)
+    index = CatalogIndex()
+    for step in range(300):
+        family_code = f"F{rng.randint(0, 8)}"
+        if rng.random() < 0.2:
+            index.remove_family(family_code)
+        else:
+            index.update_family(family_code, make_family(rng, family_code), fetched_at=float(step + 1))
+        rebuilt = CatalogIndex()
+        rebuilt._families = dict(index._families)
+        rebuilt._rebuild()
+        assert snapshot(index) == snapshot(rebuilt), step
+
+def test_code_falls_back_to_other_family_on_remove():
+    index = CatalogIndex()
+    option = {"package_option_code": "SAME", "name": "Akrab", "price": 10000}
+    index.update_family("A", {"package_variants": [{"name": "a", "package_options": [option]}]}, fetched_at=1.0)
+    index.update_family("B", {"package_variants": [{"name": "b", "package_options": [{**option, "price": 20000}]}]}, fetched_at=2.0)
+    assert index.search(q="SAME")["items"][0]["family_code"] == "B"
+
+    index.remove_family("B")
+
+    assert index.search(q="SAME")["items"][0]["family_code"] == "A"
+    assert index.search(max_price=15000)["total"] == 1
+    assert index.search(q="akr")["total"] == 1
@@ -0,0 +1,33 @@
+"""
+Representasi katalog dengan content-coding berbeda harus punya ETag kuat
+yang berbeda (RFC 9110 8.8.3), dan 304 hanya untuk representasi yang sama.
+"""
+import pytest
+from fastapi import Request, Response
+
+from app import catalog_response
+
+DATA = {"package_variants": [{"name": f"Varian {i}", "package_options": []} for i in range(100)]}
+
+def make_request(**headers) -> Request:
+    raw = [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": raw})
+
+def test_etag_differs_per_content_coding():
+    etags = {
+        encoding: catalog_response(make_request(accept_encoding=encoding), Response(), DATA).headers["etag"]
+        for encoding in ("br", "gzip", "identity")
+    }
+    assert len(set(etags.values())) == 3
+    assert etags["br"].endswith('-br"') and etags["gzip"].endswith('-gzip"')
+
+@pytest.mark.parametrize("encoding", ["br", "gzip", "identity"])
+def test_not_modified_only_for_same_representation(encoding):
+    etag = catalog_response(make_request(accept_encoding=encoding), Response(), DATA).headers["etag"]
+
+    same = catalog_response(make_request(accept_encoding=encoding, if_none_match=etag), Response(), DATA)
+    other = catalog_response(make_request(accept_encoding="gzip" if encoding == "br" else "br", if_none_match=etag),
+                             Response(), DATA)
+
+    assert same.status_code == 304 and same.headers["etag"] == etag
+    assert other.status_code == 200
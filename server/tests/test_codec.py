@@ -0,0 +1,47 @@
+"""
+LocalCodec harus menghasilkan xdata dan x-signature yang sama persis dengan
+korpus vektor (lihat myxl.codec).
+
+- tests/data/xdata_reference.json: korpus referensi dengan key/secret uji,
+  dibuat implementasi terpisah; mengunci derivasi IV (sha256(xtime)[:16]),
+  padding, base64 urlsafe dan kunci HMAC x-signature
+- MYXL_XDATA_CORPUS: rekaman service remote (python -m myxl.codec record);
+  diverifikasi dengan XDATA_KEY / X_API_BASE_SECRET dari ENV
+"""
+import json, os
+from pathlib import Path
+
+import pytest
+
+from myxl.codec import LocalCodec, verify_corpus
+
+REFERENCE = Path(__file__).parent / "data" / "xdata_reference.json"
+
+@pytest.fixture(scope="module")
+def reference():
+    with open(REFERENCE, encoding="utf-8") as f:
+        return json.load(f)
+
+@pytest.fixture(scope="module")
+def codec(reference):
+    return LocalCodec(key=reference["key"], secret=reference["secret"])
+
+def test_local_codec_matches_reference_corpus(reference, codec):
+    assert verify_corpus(reference["corpus"], codec) == []
+
+def test_reference_corpus_detects_wrong_key(reference):
+    wrong = LocalCodec(key="fedcba9876543210", secret=reference["secret"] + "x")
+    failures = verify_corpus(reference["corpus"][:1], wrong)
+    assert any("xdata" in line for line in failures)
+    assert any("x_signature" in line for line in failures)
+
+@pytest.mark.parametrize("index", range(3))
+def test_encryptsign_roundtrip(codec, reference, index):
+    entry = reference["corpus"][index]
+    encrypted = codec.encryptsign("", entry["method"], entry["path"], entry["id_token"], entry["payload"])
+    assert codec.decrypt("", encrypted["encrypted_body"]) == entry["payload"]
+
+@pytest.mark.skipif(not os.getenv("MYXL_XDATA_CORPUS"), reason="MYXL_XDATA_CORPUS (rekaman remote) tidak diisi")
+def test_local_codec_matches_recorded_remote_corpus():
+    with open(os.environ["MYXL_XDATA_CORPUS"], encoding="utf-8") as f:
+        assert verify_corpus(json.load(f)) == []
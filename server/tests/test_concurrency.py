@@ -0,0 +1,160 @@
+"""
+SingleFlight (coalescing panggilan identik) dan helper gather_bounded /
+iter_bounded.
+"""
+import asyncio
+
+import pytest
+
+from myxl.concurrency import gather_bounded, iter_bounded
+from myxl.singleflight import SingleFlight
+
+# ---------- SingleFlight ----------
+def test_concurrent_calls_share_one_execution():
+    flight, calls = SingleFlight(), []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"value": 1}
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", fn, label="test") for _ in range(5)))
+
+    results = asyncio.run(main())
+
+    assert calls == [1]
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {"inflight": 0, "by_label": {"test": {"calls": 1, "coalesced": 4}}}
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight, calls = SingleFlight(), []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def main():
+        leader = asyncio.create_task(flight.do("k", fn))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("k", fn))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == "done"
+    assert calls == [1]
+
+def test_cancelled_shared_call_cancels_all_waiters():
+    flight = SingleFlight()
+
+    async def fn():
+        raise asyncio.CancelledError()
+
+    async def main():
+        return await asyncio.gather(flight.do("k", fn), flight.do("k", fn), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+
+def test_exception_is_shared_and_key_released():
+    flight, calls = SingleFlight(), []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        first = await asyncio.gather(flight.do("k", failing), flight.do("k", failing), return_exceptions=True)
+        # key sudah dilepas: panggilan berikutnya menjalankan fungsi lagi
+        second = await asyncio.gather(flight.do("k", failing), return_exceptions=True)
+        return first + second
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert calls == [1, 1]
+
+def test_different_keys_are_not_coalesced():
+    flight, calls = SingleFlight(), []
+
+    async def fn(key):
+        calls.append(key)
+        await asyncio.sleep(0)
+        return key
+
+    async def main():
+        return await asyncio.gather(flight.do("a", lambda: fn("a")), flight.do("b", lambda: fn("b")))
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert sorted(calls) == ["a", "b"]
+
+# ---------- gather_bounded / iter_bounded ----------
+def tracked(delays):
+    state = {"active": 0, "peak": 0}
+
+    async def fn(item):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        try:
+            await asyncio.sleep(delays[item])
+            if item == "bad":
+                raise ValueError(item)
+            return item.upper()
+        finally:
+            state["active"] -= 1
+
+    return fn, state
+
+def test_gather_bounded_keeps_input_order_and_limit():
+    delays = {"a": 0.03, "b": 0.01, "bad": 0.0, "c": 0.02, "d": 0.0}
+    fn, state = tracked(delays)
+
+    results = asyncio.run(gather_bounded(list(delays), fn, 2))
+
+    assert results[:2] == ["A", "B"] and results[3:] == ["C", "D"]
+    assert isinstance(results[2], ValueError)
+    assert state["peak"] == 2
+
+@pytest.mark.parametrize("limit", [0, -1])
+def test_gather_bounded_non_positive_limit_runs_one_at_a_time(limit):
+    fn, state = tracked({"a": 0.0, "b": 0.0})
+
+    assert asyncio.run(gather_bounded(["a", "b"], fn, limit)) == ["A", "B"]
+    assert state["peak"] == 1
+
+def test_iter_bounded_yields_in_completion_order():
+    delays = {"slow": 0.03, "fast": 0.0, "bad": 0.01}
+    fn, _ = tracked(delays)
+
+    async def main():
+        return [pair async for pair in iter_bounded(list(delays), fn, 3)]
+
+    results = asyncio.run(main())
+
+    assert [item for item, _ in results] == ["fast", "bad", "slow"]
+    assert isinstance(results[1][1], ValueError)
+
+def test_iter_bounded_cancels_remaining_on_break():
+    started, finished = [], []
+
+    async def fn(item):
+        started.append(item)
+        await asyncio.sleep(0 if item == 0 else 1)
+        finished.append(item)
+        return item
+
+    async def main():
+        stream = iter_bounded(range(4), fn, 2)
+        async for first in stream:
+            break
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+        return first
+
+    assert asyncio.run(main()) == (0, 0)
+    assert finished == [0]
+    assert 1 in started and len(started) <= 3
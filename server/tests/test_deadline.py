@@ -0,0 +1,91 @@
+"""
+Budget request dari X-Request-Deadline (myxl.deadline) dan aturan
+SEND_MIN_BUDGET untuk request non-idempotent di ResilientTransport.
+"""
+import asyncio, time
+
+import httpx
+import pytest
+from fastapi import Request
+from fastapi.testclient import TestClient
+
+import app as appmod
+from myxl.deadline import DeadlineExceeded, reset_deadline, set_deadline
+from myxl.resilience import ResilientTransport, request_flags
+
+def budget_for(path: str = "/balance", header=None) -> float:
+    headers = [] if header is None else [(b"x-request-deadline", header.encode())]
+    return appmod.request_budget(Request({"type": "http", "method": "GET", "path": path, "headers": headers}))
+
+def test_default_and_route_budgets():
+    assert budget_for() == appmod.REQUEST_DEADLINE
+    assert budget_for("/purchase/PKG1") == appmod.ROUTE_DEADLINES["/purchase/"]
+
+@pytest.mark.parametrize("header, expected", [
+    ("3.5", 3.5),
+    ("-1", -1.0),
+    (str(time.time() + 10), 10.0),
+    (str((time.time() + 10) * 1000), 10.0),
+])
+def test_header_relative_and_epoch(header, expected):
+    assert budget_for(header=header) == pytest.approx(expected, abs=0.5)
+
+@pytest.mark.parametrize("header", ["abc", "", "nan", "NaN", "inf", "-inf", "1e400", "-1e400"])
+def test_invalid_or_non_finite_header_uses_default(header):
+    assert budget_for(header=header) == appmod.REQUEST_DEADLINE
+
+def test_budget_is_clamped_to_max():
+    assert budget_for(header="100000") == appmod.MAX_REQUEST_DEADLINE
+    assert budget_for(header=str(time.time() + 100000)) == appmod.MAX_REQUEST_DEADLINE
+
+@pytest.mark.parametrize("header", ["nan", "-inf", "inf"])
+def test_non_finite_header_does_not_fail_request(header):
+    response = TestClient(appmod.app).get("/health", headers={"X-Request-Deadline": header})
+    assert response.status_code == 200
+
+# ---------- SEND_MIN_BUDGET ----------
+def transport_with(seen: list, monkeypatch) -> ResilientTransport:
+    monkeypatch.setenv("MYXL_SEND_MIN_BUDGET", "2")
+    monkeypatch.setenv("MYXL_RETRY_MAX", "0")
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.extensions.get("timeout"))
+        return httpx.Response(200)
+
+    return ResilientTransport(httpx.MockTransport(handler), "test")
+
+def send(transport: ResilientTransport, budget: float, idempotent: bool) -> httpx.Response:
+    async def main():
+        token = set_deadline(budget)
+        try:
+            request = httpx.Request("POST", "http://upstream/x", extensions={
+                "timeout": {"connect": 10.0, "read": 10.0, "write": 10.0, "pool": 10.0},
+                **request_flags(idempotent=idempotent),
+            })
+            return await transport.handle_async_request(request)
+        finally:
+            reset_deadline(token)
+    return asyncio.run(main())
+
+def test_non_idempotent_request_not_sent_below_min_budget(monkeypatch):
+    seen = []
+    transport = transport_with(seen, monkeypatch)
+
+    with pytest.raises(DeadlineExceeded):
+        send(transport, 1.0, idempotent=False)
+    assert seen == []
+
+def test_non_idempotent_request_keeps_client_timeout(monkeypatch):
+    seen = []
+    transport = transport_with(seen, monkeypatch)
+
+    assert send(transport, 3.0, idempotent=False).status_code == 200
+    # tidak dipotong ke sisa deadline: settlement dibiarkan selesai
+    assert seen[0]["read"] == 10.0
+
+def test_idempotent_request_is_clamped_to_remaining_budget(monkeypatch):
+    seen = []
+    transport = transport_with(seen, monkeypatch)
+
+    assert send(transport, 1.0, idempotent=True).status_code == 200
+    assert seen[0]["read"] <= 1.0
@@ -0,0 +1,132 @@
+"""
+Idempotency-Key pada POST /purchase: satu key = satu settlement, dan record
+key hanya terlihat oleh pemilik token yang sama (claim `sub` tidak
+diverifikasi, jadi tidak boleh dipakai sebagai scope).
+"""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as appmod
+from myxl.api_request import SETTLEMENT_UNKNOWN
+from myxl.idempotency import Idempotency, IdempotencyError, IdempotencyStore
+from myxl.token_manager import token_manager
+
+@pytest.fixture
+def store(tmp_path):
+    return IdempotencyStore(path=str(tmp_path / "idempotency.sqlite3"))
+
+@pytest.fixture
+def purchases(monkeypatch, store):
+    # calls: (id_token, paket) per settlement; outcomes: hasil berikutnya
+    purchases = SimpleNamespace(calls=[], outcomes=[])
+
+    async def fake_purchase(api_key, tokens, package_option_code, reuse_detail=True):
+        purchases.calls.append((tokens["id_token"], package_option_code))
+        if purchases.outcomes:
+            return purchases.outcomes.pop(0)
+        return {"status": "SUCCESS", "code": package_option_code}
+
+    monkeypatch.setattr(appmod, "purchase_package_async", fake_purchase)
+    monkeypatch.setattr(appmod, "purchase_idempotency", Idempotency(store))
+    return purchases
+
+@pytest.fixture
+def client():
+    return TestClient(appmod.app)
+
+def purchase(client, id_token, code="PKG1", key="key-1"):
+    return client.post(f"/purchase/{code}", json={"id_token": id_token, "access_token": "access"},
+                       headers={"Idempotency-Key": key})
+
+def test_same_key_replays_stored_result(client, purchases, make_jwt):
+    id_token = make_jwt("victim")
+
+    first, second = purchase(client, id_token), purchase(client, id_token)
+
+    assert len(purchases.calls) == 1
+    assert second.status_code == first.status_code == 200
+    assert second.json() == first.json()
+    assert second.headers["idempotent-replayed"] == "true"
+
+def test_key_reused_for_other_package_is_rejected(client, purchases, make_jwt):
+    id_token = make_jwt("victim")
+    purchase(client, id_token, code="PKG1")
+
+    response = purchase(client, id_token, code="PKG2")
+
+    assert response.status_code == 422
+    assert len(purchases.calls) == 1
+
+def test_key_stays_consumed_when_settlement_outcome_unknown(client, purchases, make_jwt):
+    id_token = make_jwt("victim")
+    purchases.outcomes.append({"status": SETTLEMENT_UNKNOWN, "deadline": True, "message": "timeout"})
+
+    first, second = purchase(client, id_token), purchase(client, id_token)
+
+    assert first.status_code == second.status_code == 504
+    assert first.json()["outcome"] == "unknown"
+    assert second.headers["idempotent-replayed"] == "true"
+    assert len(purchases.calls) == 1
+
+def test_failure_before_send_releases_key(client, purchases, make_jwt):
+    id_token = make_jwt("victim")
+    purchases.outcomes.append(None)
+
+    first, second = purchase(client, id_token), purchase(client, id_token)
+
+    assert first.status_code == 502
+    assert second.status_code == 200
+    assert len(purchases.calls) == 2
+
+def test_forged_token_with_same_sub_does_not_see_victims_record(client, purchases, make_jwt):
+    victim, forged = make_jwt("victim"), make_jwt("victim", forged=True)
+    purchase(client, victim)
+
+    response = purchase(client, forged)
+
+    assert "idempotent-replayed" not in response.headers
+    assert [id_token for id_token, _ in purchases.calls] == [victim, forged]
+
+def test_refreshed_token_of_known_subject_shares_record(client, purchases, make_jwt, monkeypatch):
+    old, new = make_jwt("victim"), make_jwt("victim", rotated=True)
+    monkeypatch.setattr(token_manager, "_known", {})
+    monkeypatch.setattr(token_manager, "_tokens", {})
+    monkeypatch.setattr(token_manager, "_fingerprints", {})
+    token_manager.remember({"id_token": new, "refresh_token": "r"}, previous_id_token=old)
+
+    purchase(client, old)
+    response = purchase(client, new)
+
+    assert response.headers["idempotent-replayed"] == "true"
+    assert len(purchases.calls) == 1
+
+def test_concurrent_request_attaches_to_inflight_purchase(store):
+    idempotency = Idempotency(store)
+    calls = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def settle():
+            calls.append(1)
+            await release.wait()
+            return 200, {"status": "SUCCESS"}
+
+        first = asyncio.create_task(idempotency.run("tok:a", "key-1", "PKG1", settle))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(idempotency.run("tok:a", "key-1", "PKG1", settle))
+        await asyncio.sleep(0)
+        with pytest.raises(IdempotencyError) as mismatch:
+            await idempotency.run("tok:a", "key-1", "PKG2", settle)
+        release.set()
+        return await first, await second, mismatch.value.status_code
+
+    (first, first_replayed), (second, second_replayed), mismatch_status = asyncio.run(main())
+
+    assert calls == [1]
+    assert first == second == (200, {"status": "SUCCESS"})
+    assert (first_replayed, second_replayed) == (False, True)
+    assert mismatch_status == 422
@@ -0,0 +1,88 @@
+"""
+Antrean job pembelian: job diulang hanya kalau gagal sebelum settlement
+terkirim, tidak pernah setelahnya; pembelian bersamaan dibatasi per host.
+"""
+import asyncio
+
+import pytest
+
+import myxl.jobs as jobs
+from myxl.api_request import SETTLEMENT_UNKNOWN
+from myxl.resilience import CircuitOpenError
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETRY_BACKOFF", 0.01)
+
+def run_batch(monkeypatch, outcomes, items=1, max_attempts=3, host_concurrency=4, delay=0.0):
+    """
+    Jalankan satu batch sampai selesai. outcomes: hasil purchase berurutan
+    (exception di-raise, selain itu dikembalikan; habis = SUCCESS).
+    Return (batch, jumlah panggilan purchase, pembelian bersamaan maksimum).
+    """
+    calls, active, peak = [0], [0], [0]
+
+    async def fake_purchase(api_key, tokens, package_option_code, reuse_detail=True):
+        calls[0] += 1
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+        try:
+            await asyncio.sleep(delay)
+            outcome = outcomes.pop(0) if outcomes else {"status": "SUCCESS"}
+        finally:
+            active[0] -= 1
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(jobs, "purchase_package_async", fake_purchase)
+
+    async def main():
+        queue = jobs.JobQueue(workers=8, host_concurrency=host_concurrency)
+        await queue.start()
+        try:
+            batch = queue.submit("key", [({"id_token": f"t{i}"}, "PKG") for i in range(items)],
+                                 max_attempts=max_attempts)
+            events = [event async for event in batch.follow()]
+            assert events[-1]["type"] == "batch"
+            return batch, queue.stats()["queued"]
+        finally:
+            await queue.stop()
+
+    batch, queued = asyncio.run(asyncio.wait_for(main(), 5))
+    assert queued == 0
+    return batch, calls[0], peak[0]
+
+def test_failure_before_send_is_retried(monkeypatch):
+    outcomes = [CircuitOpenError("myxl", 0.0), None]
+    batch, calls, _ = run_batch(monkeypatch, outcomes)
+
+    job = batch.jobs[0]
+    assert (job.status, job.attempts, calls) == ("succeeded", 3, 3)
+
+def test_unknown_settlement_outcome_is_failed_not_requeued(monkeypatch):
+    outcomes = [{"status": SETTLEMENT_UNKNOWN, "deadline": True, "message": "timeout"}]
+    batch, calls, _ = run_batch(monkeypatch, outcomes)
+
+    job = batch.jobs[0]
+    assert (job.status, job.attempts, calls) == ("failed", 1, 1)
+    assert job.error == "status tidak diketahui"
+    assert job.result["status"] == SETTLEMENT_UNKNOWN
+    assert not any(event.get("status") == "retrying" for event in batch.events)
+
+def test_rejected_settlement_is_not_retried(monkeypatch):
+    batch, calls, _ = run_batch(monkeypatch, [{"status": "FAILED", "message": "saldo kurang"}])
+
+    assert (batch.jobs[0].status, calls) == ("failed", 1)
+
+def test_retries_stop_at_max_attempts(monkeypatch):
+    batch, calls, _ = run_batch(monkeypatch, [None, None, None], max_attempts=2)
+
+    assert (batch.jobs[0].status, calls) == ("failed", 2)
+
+def test_host_concurrency_bounds_parallel_purchases(monkeypatch):
+    batch, calls, peak = run_batch(monkeypatch, [], items=6, host_concurrency=2, delay=0.02)
+
+    assert calls == 6
+    assert peak == 2
+    assert all(job.status == "succeeded" for job in batch.jobs)
@@ -0,0 +1,176 @@
+"""
+CircuitBreaker, RetryBudget dan ResilientTransport (retry + hedging) dengan
+transport palsu (httpx.MockTransport).
+"""
+import asyncio, time
+
+import httpx
+import pytest
+
+from myxl.resilience import CircuitBreaker, CircuitOpenError, ResilientTransport, RetryBudget, request_flags
+
+def make_breaker(**overrides) -> CircuitBreaker:
+    options = dict(window=30.0, min_calls=4, failure_ratio=0.5, slow_call=5.0, open_seconds=0.05)
+    options.update(overrides)
+    return CircuitBreaker("test", **options)
+
+# ---------- Breaker ----------
+def test_breaker_opens_at_failure_ratio():
+    breaker = make_breaker()
+    for failed in (False, True, False):
+        breaker.before_call()
+        breaker.record(failed, 0.01)
+    assert breaker.state == "closed"
+
+    breaker.before_call()
+    breaker.record(True, 0.01)
+
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_slow_calls_count_as_failures():
+    breaker = make_breaker(min_calls=2, slow_call=0.5)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record(False, 1.0)
+    assert breaker.state == "open"
+
+def test_half_open_allows_one_probe_and_success_closes():
+    breaker = make_breaker(min_calls=1)
+    breaker.before_call()
+    breaker.record(True, 0.01)
+    time.sleep(0.06)
+
+    breaker.before_call()
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record(False, 0.01)
+    assert breaker.state == "closed"
+    assert breaker.snapshot() == {"state": "closed", "calls": 0, "failures": 0}
+
+def test_failed_probe_reopens():
+    breaker = make_breaker(min_calls=1)
+    breaker.before_call()
+    breaker.record(True, 0.01)
+    time.sleep(0.06)
+
+    breaker.before_call()
+    breaker.record(True, 0.01)
+
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_cancelled_probe_frees_half_open_slot():
+    breaker = make_breaker(min_calls=1)
+    breaker.before_call()
+    breaker.record(True, 0.01)
+    time.sleep(0.06)
+    breaker.before_call()
+
+    breaker.cancel_probe()
+
+    breaker.before_call()
+    assert breaker.state == "half_open"
+
+# ---------- Retry budget ----------
+def test_retry_budget_exhausts_and_grows_with_requests():
+    budget = RetryBudget(ratio=0.5, min_retries=1, window=30.0)
+    assert budget.try_spend()
+    assert not budget.try_spend()
+
+    for _ in range(2):
+        budget.on_request()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+
+# ---------- Transport ----------
+@pytest.fixture
+def env(monkeypatch):
+    monkeypatch.setenv("MYXL_RETRY_BACKOFF", "0.001")
+    monkeypatch.setenv("MYXL_BREAKER_MIN_CALLS", "1000")
+    return monkeypatch
+
+def make_transport(handler) -> ResilientTransport:
+    return ResilientTransport(httpx.MockTransport(handler), "test")
+
+def send(transport: ResilientTransport, **flags) -> httpx.Response:
+    request = httpx.Request("POST", "http://upstream/x", content=b"{}", extensions=request_flags(**flags))
+    return asyncio.run(transport.handle_async_request(request))
+
+def test_idempotent_request_retried_until_budget_runs_out(env):
+    env.setenv("MYXL_RETRY_MAX", "5")
+    env.setenv("MYXL_RETRY_BUDGET_MIN", "1")
+    env.setenv("MYXL_RETRY_BUDGET_RATIO", "0")
+    calls = []
+
+    async def handler(request):
+        calls.append(1)
+        return httpx.Response(503)
+
+    response = send(make_transport(handler), idempotent=True)
+
+    assert response.status_code == 503
+    assert len(calls) == 2
+
+def test_non_idempotent_request_never_retried_or_hedged(env):
+    env.setenv("MYXL_HEDGE_DELAY", "0.01")
+    statuses = [503]
+    calls = []
+
+    async def handler(request):
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        if statuses:
+            return httpx.Response(statuses.pop())
+        raise httpx.ConnectError("down", request=request)
+
+    transport = make_transport(handler)
+    assert send(transport).status_code == 503
+    with pytest.raises(httpx.ConnectError):
+        send(transport)
+    assert len(calls) == 2
+
+def test_hedge_sent_after_delay_and_loser_cancelled(env):
+    env.setenv("MYXL_HEDGE_DELAY", "0.05")
+    started, cancelled = [], []
+
+    async def handler(request):
+        index = len(started)
+        started.append(time.monotonic())
+        try:
+            # request pertama macet, hedge-nya cepat
+            await asyncio.sleep(5 if index == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+        return httpx.Response(200, json={"attempt": index})
+
+    async def main():
+        transport = make_transport(handler)
+        request = httpx.Request("POST", "http://upstream/x", content=b"{}", extensions=request_flags(hedge=True))
+        response = await transport.handle_async_request(request)
+        await asyncio.sleep(0.01)
+        return response
+
+    start = time.monotonic()
+    response = asyncio.run(main())
+
+    assert response.json() == {"attempt": 1}
+    assert len(started) == 2
+    assert started[1] - start >= 0.05
+    assert cancelled == [0]
+
+def test_fast_primary_is_not_hedged(env):
+    env.setenv("MYXL_HEDGE_DELAY", "0.05")
+    calls = []
+
+    async def handler(request):
+        calls.append(1)
+        return httpx.Response(200)
+
+    assert send(make_transport(handler), hedge=True).status_code == 200
+    assert len(calls) == 1
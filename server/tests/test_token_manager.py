@@ -0,0 +1,66 @@
+"""
+Subject yang tidak lagi dipakai request dilupakan token manager: tidak
+di-refresh lagi oleh sweep dan tidak ditahan di memori selamanya.
+"""
+import asyncio
+
+import pytest
+
+import myxl.token_manager as tm
+from myxl.jwt_util import subject_key
+
+@pytest.fixture
+def make_tokens(make_jwt):
+    def make(sub: str, exp_in: float) -> dict:
+        return {"id_token": make_jwt(sub, exp_in), "access_token": f"access-{sub}", "refresh_token": f"refresh-{sub}"}
+    return make
+
+@pytest.fixture
+def manager(monkeypatch, make_tokens):
+    refreshed = []
+
+    async def fake_refresh(refresh_token):
+        sub = refresh_token.split("-", 1)[1]
+        refreshed.append(sub)
+        return make_tokens(sub, 3600)
+
+    monkeypatch.setattr(tm, "get_new_token_async", fake_refresh)
+    manager = tm.TokenManager(store=tm.MemoryTokenStore())
+    manager.refreshed = refreshed
+    return manager
+
+def test_sweep_forgets_idle_subjects_instead_of_refreshing(manager, make_tokens):
+    manager.idle_ttl = 60
+    idle, active = make_tokens("idle", 30), make_tokens("active", 30)
+    manager.remember(idle)
+    manager.remember(active)
+    manager._last_used[subject_key(idle["id_token"])] -= 120
+    manager._last_used.move_to_end(subject_key(active["id_token"]))
+
+    asyncio.run(manager.sweep())
+
+    assert manager.refreshed == ["active"]
+    assert subject_key(idle["id_token"]) not in manager._tokens
+    assert asyncio.run(manager.current_tokens(idle["id_token"])) is None
+    assert manager._dirty[subject_key(idle["id_token"])] is None
+
+def test_background_refresh_does_not_count_as_use(manager, make_tokens):
+    tokens = make_tokens("quiet", 30)
+    subject = manager.remember(tokens)
+    used_at = manager._last_used[subject]
+
+    asyncio.run(manager.sweep())
+
+    assert manager.refreshed == ["quiet"]
+    assert manager._last_used[subject] == used_at
+
+def test_subject_limit_evicts_least_recently_used(manager, make_tokens):
+    manager.max_subjects = 2
+    first, second, third = (make_tokens(sub, 3600) for sub in ("a", "b", "c"))
+    manager.remember(first)
+    manager.remember(second)
+    # a dipakai lagi, jadi b yang paling lama tidak dipakai
+    assert asyncio.run(manager.current_tokens(first["id_token"])) is not None
+    manager.remember(third)
+
+    assert set(manager._tokens) == {subject_key(t["id_token"]) for t in (first, third)}
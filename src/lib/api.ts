@@ -52,6 +52,16 @@ async function api<T>(
 
   const res = await fetch(`${BASE}${path}`, { ...opts, headers });
 
+  // server sudah refresh token yang hampir kedaluwarsa
+  const refreshedIdToken = res.headers.get("X-Refreshed-Id-Token");
+  if (refreshedIdToken && t) {
+    setTokens({
+      ...t,
+      id_token: refreshedIdToken,
+      access_token: res.headers.get("X-Refreshed-Access-Token") ?? t.access_token,
+    });
+  }
+
   // auto-refresh kalau 401
   if (res.status === 401 && retryOn401 && t?.refresh_token) {
     const rr = await fetch(`${BASE}/auth/token/refresh`, {